@@ -0,0 +1,226 @@
+import json
+import logging
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlunparse
+
+PAGE_PARAMS = ('page', 'p', 'pageNumber', 'page_number')
+TARGET_FIELDS = ('name', 'address', 'phone', 'url')
+
+# Key fragments used to map JSON fields when there are no cards to match values against
+FIELD_HINTS = {
+    'name': ('name', 'title'),
+    'address': ('address', 'street', 'location'),
+    'phone': ('phone', 'tel', 'contact_number'),
+    'url': ('url', 'link', 'href', 'slug', 'permalink'),
+}
+
+# Request headers worth replaying; the rest are set by the HTTP client or the browser
+REPLAY_HEADERS = ('accept', 'accept-language', 'authorization', 'content-type', 'referer',
+                  'user-agent', 'x-requested-with', 'x-api-key')
+
+
+def enable_performance_logging(options):
+    """Ask chromedriver to keep the DevTools network events of the session"""
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+
+def read_json_requests(driver):
+    """Collect the XHR/fetch requests with JSON responses from the driver's performance log
+
+    Returns {request_id: {'url', 'method', 'headers', 'post_data', 'status'}}.
+    Reading the log drains it, so call this once per page load.
+    """
+    sent = {}
+    responses = {}
+    for entry in driver.get_log('performance'):
+        try:
+            message = json.loads(entry['message'])['message']
+        except (KeyError, ValueError):
+            continue
+        params = message.get('params', {})
+        if message.get('method') == 'Network.requestWillBeSent':
+            request = params.get('request', {})
+            sent[params.get('requestId')] = {
+                'url': request.get('url'),
+                'method': request.get('method', 'GET'),
+                'headers': {k: v for k, v in request.get('headers', {}).items() if k.lower() in REPLAY_HEADERS},
+                'post_data': request.get('postData')
+            }
+        elif message.get('method') == 'Network.responseReceived':
+            response = params.get('response', {})
+            if params.get('type') in ('XHR', 'Fetch') and 'json' in response.get('mimeType', ''):
+                responses[params.get('requestId')] = response.get('status')
+
+    requests = {}
+    for request_id, status in responses.items():
+        if request_id in sent:
+            requests[request_id] = dict(sent[request_id], status=status)
+    return requests
+
+
+def _flatten(value, prefix=''):
+    """Map dotted key paths to the scalar values of a nested JSON record"""
+    flat = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flat.update(_flatten(item, f'{prefix}{key}.'))
+    elif not isinstance(value, list):
+        flat[prefix[:-1]] = value
+    return flat
+
+
+def _record_lists(data, path=()):
+    """Yield (path, list) for every list of objects in a JSON document"""
+    if isinstance(data, list):
+        if data and all(isinstance(item, dict) for item in data):
+            yield path, data
+        for index, item in enumerate(data[:1]):
+            yield from _record_lists(item, path + (index,))
+    elif isinstance(data, dict):
+        for key, item in data.items():
+            yield from _record_lists(item, path + (key,))
+
+
+def _follow(data, path):
+    for key in path:
+        data = data[key]
+    return data
+
+
+def _normalise(value):
+    return ' '.join(str(value).split()).lower()
+
+
+def map_fields(records, cards=None):
+    """Find the JSON key path holding each store field
+
+    With cards from the rendered listing, a key maps to a field when its
+    values match the card values; otherwise key names are used as hints.
+    """
+    flat_records = [_flatten(record) for record in records]
+    keys = {key for flat in flat_records for key in flat}
+    field_map = {}
+    for field in TARGET_FIELDS:
+        card_values = {_normalise(card[field]) for card in cards or [] if card.get(field)}
+        best_key, best_hits = None, 0
+        for key in keys:
+            values = {_normalise(flat[key]) for flat in flat_records if flat.get(key) not in (None, '')}
+            if card_values:
+                hits = len(values & card_values)
+                if field == 'url' and not hits:
+                    # Card links are absolute; the API often returns a slug or path
+                    hits = sum(
+                        1 for value in values
+                        if value.strip('/') and any(card.endswith('/' + value.strip('/')) for card in card_values)
+                    )
+            else:
+                leaf = key.rsplit('.', 1)[-1].lower()
+                hits = len(values) if any(hint in leaf for hint in FIELD_HINTS[field]) else 0
+            if hits > best_hits:
+                best_key, best_hits = key, hits
+        if best_key is not None:
+            field_map[field] = best_key
+    return field_map
+
+
+def score_response(data, cards=None):
+    """Return (score, records path, field map) for the best store list in a JSON response"""
+    best = (0, None, {})
+    for path, records in _record_lists(data):
+        field_map = map_fields(records, cards)
+        score = len(field_map) * len(records)
+        if cards:
+            names = {_normalise(card['name']) for card in cards if card.get('name')}
+            name_key = field_map.get('name')
+            score = sum(1 for record in records if name_key and _normalise(_flatten(record).get(name_key, '')) in names)
+        if score > best[0]:
+            best = (score, list(path), field_map)
+    return best
+
+
+def discover_endpoints(driver, cards=None, min_score=1):
+    """Identify the JSON endpoints behind the listing loaded in driver
+
+    Each JSON XHR/fetch response is searched for a list of records that looks
+    like the store cards; matching endpoints are returned best first.
+    """
+    endpoints = []
+    for request_id, request in read_json_requests(driver).items():
+        try:
+            body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            data = json.loads(body.get('body', ''))
+        except Exception as e:
+            logging.debug(f"Could not read JSON response of {request['url']}: {str(e)}")
+            continue
+        score, records_path, field_map = score_response(data, cards)
+        if score >= min_score and 'name' in field_map:
+            endpoints.append(dict(request, records_path=records_path, field_map=field_map, score=score))
+            logging.info(f"Found store API endpoint {request['method']} {request['url']} "
+                         f"({score} matching records, fields: {field_map})")
+    endpoints.sort(key=lambda endpoint: endpoint['score'], reverse=True)
+    return endpoints
+
+
+def save_endpoints(path, endpoints, cookies=None):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'endpoints': endpoints, 'cookies': cookies or {}}, f, indent=2)
+    logging.info(f"Saved {len(endpoints)} API endpoints to {path}")
+
+
+def load_endpoints(path):
+    """Return (endpoints, cookies) saved by save_endpoints"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return data['endpoints'], data.get('cookies', {})
+
+
+def page_url(url, page):
+    """Set the page parameter of url, or None when it has no recognised page parameter"""
+    parts = urlparse(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if not any(key in PAGE_PARAMS for key, _ in query):
+        return None
+    query = [(key, str(page) if key in PAGE_PARAMS else value) for key, value in query]
+    return urlunparse(parts._replace(query=urlencode(query)))
+
+
+def extract_stores(data, endpoint, site_url):
+    """Turn an endpoint's JSON response into store dicts"""
+    try:
+        records = _follow(data, endpoint['records_path'])
+    except (KeyError, IndexError, TypeError):
+        return []
+    stores = []
+    for record in records:
+        flat = _flatten(record)
+        store_info = {field: flat.get(key) or '' for field, key in endpoint['field_map'].items()}
+        if store_info.get('url'):
+            store_info['url'] = urljoin(site_url, str(store_info['url']))
+        stores.append(store_info)
+    return stores
+
+
+def replay_endpoint(session, endpoint, site_url, max_pages=50, timeout=10):
+    """Fetch every page of a discovered endpoint over plain HTTP and yield its stores
+
+    session is anything with a requests-style request(method, url, ...) method.
+    Endpoints without a page parameter are fetched once, and paging stops at
+    the first empty page or one that repeats the previous page.
+    """
+    previous = None
+    for page in range(1, max_pages + 1):
+        url = page_url(endpoint['url'], page) if page > 1 else endpoint['url']
+        if url is None:
+            return
+        response = session.request(
+            endpoint['method'], url,
+            headers=endpoint['headers'],
+            data=endpoint.get('post_data'),
+            timeout=timeout
+        )
+        response.raise_for_status()
+        stores = extract_stores(response.json(), endpoint, site_url)
+        if not stores or stores == previous:
+            return
+        previous = stores
+        logging.info(f"API page {page}: {len(stores)} stores from {url}")
+        yield from stores
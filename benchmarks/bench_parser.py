@@ -0,0 +1,70 @@
+"""Micro-benchmark of the store page parser engines over saved HTML fixtures
+
+Usage:
+    python benchmarks/bench_parser.py [--repeat N] [files...]
+
+Without files it runs over benchmarks/fixtures/*.html and page_content.html.
+Pages that are not store pages (such as the Cloudflare challenge saved in
+page_content.html) are still timed up to the point the parser gives up.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import store_parser  # noqa: E402
+
+
+def default_fixtures():
+    fixtures = sorted(glob.glob(os.path.join(ROOT, 'benchmarks', 'fixtures', '*.html')))
+    challenge_page = os.path.join(ROOT, 'page_content.html')
+    if os.path.exists(challenge_page):
+        fixtures.append(challenge_page)
+    return fixtures
+
+
+def time_engine(parse, content, repeat):
+    """Return (mean milliseconds per page, error message or None)"""
+    error = None
+    start = time.perf_counter()
+    for _ in range(repeat):
+        try:
+            parse(content)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+    return (time.perf_counter() - start) * 1000 / repeat, error
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('files', nargs='*', help='HTML files to parse')
+    parser.add_argument('--repeat', type=int, default=200, help='parses per engine and file')
+    args = parser.parse_args()
+
+    files = args.files or default_fixtures()
+    engines = store_parser.available_engines()
+    print(f"Engines: {', '.join(engines)}; {args.repeat} parses per file\n")
+    print(f"{'file':<28} {'KB':>6} " + ' '.join(f'{engine:>12}' for engine in engines) + '   speedup')
+
+    for path in files:
+        with open(path, 'rb') as f:
+            content = f.read()
+        timings = {}
+        errors = {}
+        for engine in engines:
+            timings[engine], errors[engine] = time_engine(store_parser.ENGINES[engine][0], content, args.repeat)
+
+        speedup = timings['bs4'] / min(timings.values())
+        cells = ' '.join(f'{timings[engine]:>9.3f} ms' for engine in engines)
+        print(f"{os.path.basename(path):<28} {len(content) / 1024:>6.1f} {cells}   {speedup:>6.1f}x")
+        for engine, error in errors.items():
+            if error:
+                print(f"    {engine}: {error}")
+
+
+if __name__ == '__main__':
+    main()
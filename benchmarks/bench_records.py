@@ -0,0 +1,100 @@
+"""Memory and serialization cost of store dicts vs StoreRecord
+
+Usage:
+    python benchmarks/bench_records.py [--stores 100000] [--output records_results.json]
+
+Builds synthetic stores the way the scrapers do (every string a fresh
+object, chains sharing websites, social links and boilerplate text) and
+reports the memory held by the list of stores, measured with tracemalloc,
+and the seconds taken to turn them into JSONL and indented JSON text: with
+json.dumps per dict as the sinks used to, and with RecordSerializer.
+"""
+import argparse
+import json
+import os
+import sys
+import textwrap
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from result_sinks import RecordSerializer  # noqa: E402
+from store_record import RECORD_FIELDS, StoreRecord  # noqa: E402
+
+CHAINS = 200
+
+
+def make_store(i):
+    """A store dict whose strings are built at runtime, as parsed HTML text is"""
+    chain = i % CHAINS
+    return {
+        'name': f"Green Leaf {i}",
+        'address': f"{i} Long Street, Cape Town, 8001",
+        'phone': f"+27 21 {i % 1000:03d} {i % 10000:04d}",
+        'website': ''.join(['https://chain', str(chain), '.co.za']),
+        'social_media': ', '.join([f"https://instagram.com/chain{chain}", f"https://facebook.com/chain{chain}"]),
+        'additional_info': ' '.join(['Open', 'daily', 'from', '9am', 'to', '6pm']),
+        'url': f"https://www.askmaryj.com/store/{i}"
+    }
+
+
+def measure_memory(build, count):
+    """Bytes still allocated after building count stores"""
+    tracemalloc.start()
+    stores = [build(i) for i in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del stores
+    return current
+
+
+def measure_seconds(func, stores):
+    start = time.perf_counter()
+    for store in stores:
+        func(store)
+    return time.perf_counter() - start
+
+
+def bench(count):
+    dicts = [make_store(i) for i in range(count)]
+    records = [StoreRecord.from_dict(store) for store in dicts]
+    serializer = RecordSerializer(RECORD_FIELDS)
+
+    dict_bytes = measure_memory(make_store, count)
+    record_bytes = measure_memory(lambda i: StoreRecord.from_dict(make_store(i)), count)
+    return {
+        'stores': count,
+        'dict_mb': round(dict_bytes / (1024 * 1024), 1),
+        'record_mb': round(record_bytes / (1024 * 1024), 1),
+        'jsonl_dumps_s': round(measure_seconds(json.dumps, dicts), 3),
+        'jsonl_serializer_s': round(measure_seconds(serializer.to_json, records), 3),
+        'json_dumps_s': round(measure_seconds(
+            lambda store: textwrap.indent(json.dumps(store, indent=2), '  '), dicts), 3),
+        'json_serializer_s': round(measure_seconds(serializer.to_indented_json, records), 3)
+    }
+
+
+def print_results(result):
+    print(f"{result['stores']} stores")
+    print(f"{'':<12} {'dict':>10} {'StoreRecord':>12}")
+    print(f"{'memory MB':<12} {result['dict_mb']:>10} {result['record_mb']:>12}")
+    print(f"{'jsonl s':<12} {result['jsonl_dumps_s']:>10} {result['jsonl_serializer_s']:>12}")
+    print(f"{'json s':<12} {result['json_dumps_s']:>10} {result['json_serializer_s']:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stores', type=int, default=100000)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    result = bench(max(1, args.stores))
+    print_results(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
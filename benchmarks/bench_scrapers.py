@@ -0,0 +1,242 @@
+"""End-to-end throughput benchmark of both scrapers against the local mock site
+
+Usage:
+    python benchmarks/bench_scrapers.py [--target all|http|selenium] [--stores 120]
+                                        [--latency 0.02] [--block-rate 0] [--challenge-rate 0]
+                                        [--output bench_results.json]
+
+Each target runs in its own subprocess and working directory, so peak RSS,
+checkpoints and result files do not leak between runs. 'http' runs
+cannabis_scraper.scrape_all_stores with the listings page served from its
+response cache; 'selenium' runs CannabisScraper.scrape_stores with a plain
+headless Chrome and is reported as skipped when no browser can be started.
+Reported latency is per store page: fetch and parse for 'http', page load,
+readiness wait and extraction for 'selenium'.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from mock_server import MockSite, start_mock_server  # noqa: E402
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+TARGETS = ('http', 'selenium')
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class PeakRssSampler:
+    """Peak resident memory of this process, plus its children (browsers) when psutil is installed"""
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak_tree_bytes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        process = psutil.Process()
+        while not self._stop.is_set():
+            total = 0
+            for proc in [process] + process.children(recursive=True):
+                try:
+                    total += proc.memory_info().rss
+                except psutil.Error:
+                    pass
+            self.peak_tree_bytes = max(self.peak_tree_bytes, total)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if psutil is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        # ru_maxrss is in kilobytes on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return max(peak, self.peak_tree_bytes)
+
+
+def timed(latencies, func):
+    """Wrap func so each call's duration is appended to latencies"""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    return wrapper
+
+
+def run_http(site, url, latencies):
+    import requests
+    import cannabis_scraper
+
+    cannabis_scraper.BASE_URL = url
+    cannabis_scraper.USE_CLEARANCE_BROKER = False
+    # The listings page is rendered with Selenium in production; serve it from the cache instead
+    cannabis_scraper.get_response_cache().put(url, requests.get(url, timeout=10))
+    cannabis_scraper.scrape_store = timed(latencies, cannabis_scraper.scrape_store)
+    cannabis_scraper.scrape_store_incremental = timed(latencies, cannabis_scraper.scrape_store_incremental)
+
+    sink = cannabis_scraper.open_result_sinks()
+    stores = cannabis_scraper.scrape_all_stores(sink)
+    sink.finalize()
+    return sink.sinks[0].count if sink.sinks else len(stores)
+
+
+def headless_chrome():
+    from selenium import webdriver
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless=new')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    return webdriver.Chrome(options=options)
+
+
+def run_selenium(site, url, latencies, detail_workers=1, card_extraction=False):
+    from cannabis_scraper_improved import CannabisScraper
+
+    # Fail fast (and report the target as skipped) when no browser is available
+    headless_chrome().quit()
+
+    scraper = CannabisScraper(detail_workers=detail_workers, card_extraction=card_extraction)
+    scraper.base_url = url
+    scraper.max_pages = site.pages
+    scraper.setup_driver = headless_chrome
+    scraper.extract_store_details = timed(latencies, scraper.extract_store_details)
+    scraper.scrape_stores()
+    return scraper.store_count
+
+
+def run_target(args):
+    """Run one target in the current process and return its result"""
+    site = MockSite(
+        stores=args.stores,
+        # cannabis_scraper.py only reads the first listings page
+        per_page=args.stores if args.run == 'http' else args.per_page,
+        latency=args.latency,
+        block_rate=args.block_rate,
+        challenge_rate=args.challenge_rate
+    )
+    server, url = start_mock_server(site)
+    latencies = []
+    sampler = PeakRssSampler()
+    sampler.start()
+    start = time.perf_counter()
+    result = {'target': args.run}
+    try:
+        if args.run == 'http':
+            scraped = run_http(site, url, latencies)
+        else:
+            scraped = run_selenium(site, url, latencies, args.detail_workers, args.card_extraction)
+    except Exception as e:
+        sampler.stop()
+        result.update({'skipped': f"{type(e).__name__}: {e}"})
+        return result
+    finally:
+        server.shutdown()
+    seconds = time.perf_counter() - start
+    p50 = percentile(latencies, 0.5)
+    p99 = percentile(latencies, 0.99)
+    result.update({
+        'stores': scraped,
+        'seconds': round(seconds, 3),
+        'stores_per_sec': round(scraped / seconds, 2) if seconds else None,
+        'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+        'p99_ms': round(p99 * 1000, 1) if p99 is not None else None,
+        'peak_rss_mb': round(sampler.stop() / (1024 * 1024), 1),
+        'requests': site.requests,
+        'blocked': site.blocked,
+        'challenged': site.challenged
+    })
+    return result
+
+
+def spawn_target(target, args):
+    """Run a target in a fresh interpreter and working directory"""
+    with tempfile.TemporaryDirectory(prefix=f'bench_{target}_') as workdir:
+        result_path = os.path.join(workdir, 'result.json')
+        command = [
+            sys.executable, os.path.abspath(__file__), '--run', target, '--result-file', result_path,
+            '--stores', str(args.stores), '--per-page', str(args.per_page), '--latency', str(args.latency),
+            '--block-rate', str(args.block_rate), '--challenge-rate', str(args.challenge_rate),
+            '--detail-workers', str(args.detail_workers)
+        ]
+        if args.card_extraction:
+            command.append('--card-extraction')
+        completed = subprocess.run(command, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                   text=True)
+        if not os.path.exists(result_path):
+            errors = completed.stderr.strip().splitlines()
+            return {'target': target, 'skipped': errors[-1] if errors else 'crashed'}
+        with open(result_path) as f:
+            return json.load(f)
+
+
+def print_results(results):
+    print(f"{'target':<10} {'stores':>7} {'seconds':>8} {'stores/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'peak RSS MB':>12}")
+    for result in results:
+        if 'skipped' in result:
+            print(f"{result['target']:<10} skipped: {result['skipped']}")
+            continue
+        cells = [
+            '-' if result[key] is None else str(result[key])
+            for key in ('stores', 'seconds', 'stores_per_sec', 'p50_ms', 'p99_ms', 'peak_rss_mb')
+        ]
+        print(f"{result['target']:<10} {cells[0]:>7} {cells[1]:>8} {cells[2]:>9} {cells[3]:>8} {cells[4]:>8} {cells[5]:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--target', choices=('all',) + TARGETS, default='all')
+    parser.add_argument('--stores', type=int, default=120)
+    parser.add_argument('--per-page', type=int, default=12, help='store cards per listing page (selenium)')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds added to every response')
+    parser.add_argument('--block-rate', type=float, default=0.0)
+    parser.add_argument('--challenge-rate', type=float, default=0.0)
+    parser.add_argument('--detail-workers', type=int, default=1)
+    parser.add_argument('--card-extraction', action='store_true')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--run', choices=TARGETS, help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        result = run_target(args)
+        with open(args.result_file, 'w') as f:
+            json.dump(result, f)
+        return
+
+    targets = TARGETS if args.target == 'all' else (args.target,)
+    results = [spawn_target(target, args) for target in targets]
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
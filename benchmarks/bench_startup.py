@@ -0,0 +1,108 @@
+"""Startup time of cannabis_scraper.py with lazy imports, per engine
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat 5] [--output startup_results.json]
+
+Every scenario runs in a fresh interpreter so nothing is already imported.
+'import' is what a short-lived run pays before it does any work; 'eager'
+adds the browser stacks, retry and HTML libraries that cannabis_scraper.py
+used to import at module level, which is the cost the lazy imports avoid.
+The engine rows add the modules each --engine loads when it first starts.
+Reported are the median seconds spent importing (inside the interpreter),
+the median wall time of the whole process and the number of loaded modules.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EAGER_IMPORTS = (
+    'import selenium.webdriver, selenium.webdriver.support.ui, selenium.webdriver.support.expected_conditions; '
+    'import playwright.sync_api, cloudscraper, backoff, bs4, pyarrow.parquet'
+)
+
+SCENARIOS = {
+    'import': 'import cannabis_scraper',
+    'eager': f'import cannabis_scraper; {EAGER_IMPORTS}',
+    'engine http': "import cannabis_scraper; cannabis_scraper.parse_args(['--engine', 'http']); import backoff",
+    'engine playwright': "import cannabis_scraper; cannabis_scraper.parse_args(['--engine', 'playwright']); "
+                         "import browser_pool",
+    'engine selenium': "import cannabis_scraper; cannabis_scraper.parse_args(['--engine', 'selenium']); "
+                       "import selenium.webdriver, selenium.webdriver.support.ui",
+    'engine uc': "import cannabis_scraper; cannabis_scraper.parse_args(['--engine', 'uc']); "
+                 "import cannabis_scraper_improved",
+}
+
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+{code}
+print(json.dumps({{'seconds': time.perf_counter() - start, 'modules': len(sys.modules)}}))
+"""
+
+
+def run_scenario(code, workdir):
+    """Run code in a fresh interpreter; returns (import seconds, wall seconds, modules)"""
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-c', CHILD.format(root=ROOT, code=code)],
+        cwd=workdir, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+    if completed.returncode != 0:
+        errors = completed.stderr.strip().splitlines()
+        raise RuntimeError(errors[-1] if errors else 'crashed')
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return result['seconds'], wall, result['modules']
+
+
+def bench(repeat):
+    results = []
+    # A scratch directory keeps any files written at startup out of the repository
+    with tempfile.TemporaryDirectory(prefix='bench_startup_') as workdir:
+        for name, code in SCENARIOS.items():
+            try:
+                runs = [run_scenario(code, workdir) for _ in range(repeat)]
+            except RuntimeError as e:
+                results.append({'scenario': name, 'skipped': str(e)})
+                continue
+            results.append({
+                'scenario': name,
+                'import_ms': round(statistics.median(run[0] for run in runs) * 1000, 1),
+                'wall_ms': round(statistics.median(run[1] for run in runs) * 1000, 1),
+                'modules': runs[-1][2]
+            })
+    return results
+
+
+def print_results(results):
+    print(f"{'scenario':<18} {'import ms':>10} {'wall ms':>9} {'modules':>8}")
+    for result in results:
+        if 'skipped' in result:
+            print(f"{result['scenario']:<18} skipped: {result['skipped']}")
+            continue
+        print(f"{result['scenario']:<18} {result['import_ms']:>10} {result['wall_ms']:>9} {result['modules']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = bench(max(1, args.repeat))
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
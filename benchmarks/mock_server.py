@@ -0,0 +1,201 @@
+"""Local stand-in for the listings site, for benchmarks that must not touch the network
+
+Usage:
+    python benchmarks/mock_server.py [--port 8000] [--stores 120] [--per-page 12]
+                                     [--latency 0.05] [--block-rate 0.05] [--challenge-rate 0.02]
+
+Serves /en-za/listings/cannabis?page=N with `listing-cardboard` cards (also
+matching the `div.store-listing > a` selector of cannabis_scraper.py) and a
+store detail page per card built from benchmarks/fixtures/store_page.html.
+Every response is delayed by --latency seconds, and a seeded fraction of store
+page requests is answered with a 403 or with a Cloudflare "Just a moment..."
+page, so blocking and back-off paths can be exercised repeatably. Pages carry
+an ETag and a matching If-None-Match is answered with 304 Not Modified, for
+incremental crawls.
+"""
+import argparse
+import os
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'store_page.html')
+LISTING_PATH = '/en-za/listings/cannabis'
+STORE_PATH = '/en-za/listing/'
+
+CHALLENGE_PAGE = (
+    '<!DOCTYPE html><html lang="en-US"><head><title>Just a moment...</title></head>'
+    '<body><div id="challenge-running">Verifying you are human.</div>'
+    '<script>window._cf_chl_opt={cType: "managed"};</script></body></html>'
+)
+
+CARD_TEMPLATE = """
+<div class="listing-cardboard store-listing"><a href="{url}"><span class="listing-title">{name}</span></a>
+  <div class="listing-address">{address}</div>
+  <div class="listing-phone">{phone}</div>
+  <div class="listing-social"><a href="https://www.instagram.com/{slug}">Instagram</a></div>
+</div>"""
+
+
+def store_fields(index):
+    """Deterministic listing fields for store number index"""
+    return {
+        'slug': f'store-{index}',
+        'name': f'Mock Dispensary {index}',
+        'address': f'{index} Long Street, Cape Town, 8001',
+        'phone': f'021 555 {index:04d}',
+        'website': f'https://store-{index}.example.co.za'
+    }
+
+
+class MockSite:
+    """Synthetic listing and store pages with configurable latency and blocking"""
+
+    def __init__(self, stores=120, per_page=12, latency=0.0, block_rate=0.0, challenge_rate=0.0, seed=0):
+        self.stores = stores
+        self.per_page = max(1, per_page)
+        self.latency = latency
+        self.block_rate = block_rate
+        self.challenge_rate = challenge_rate
+        self.requests = 0
+        self.blocked = 0
+        self.challenged = 0
+        self.conditional = 0
+        self.not_modified = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        with open(FIXTURE, 'r', encoding='utf-8') as f:
+            self._store_template = f.read()
+
+    @property
+    def pages(self):
+        return (self.stores + self.per_page - 1) // self.per_page
+
+    def listing_page(self, page):
+        first = (page - 1) * self.per_page
+        cards = []
+        for index in range(first, min(first + self.per_page, self.stores)):
+            fields = store_fields(index)
+            cards.append(CARD_TEMPLATE.format(url=STORE_PATH + fields['slug'], **fields))
+        return (
+            '<!DOCTYPE html><html><head><title>Cannabis Dispensaries | AskMaryJ</title></head><body>'
+            f'<main class="listings">{"".join(cards)}</main>'
+            f'<nav class="pagination">Page {page} of {self.pages}</nav></body></html>'
+        )
+
+    def store_page(self, index):
+        fields = store_fields(index)
+        return (
+            self._store_template
+            .replace('Green Leaf Dispensary', fields['name'])
+            .replace('12 Long Street, Cape Town City Centre, Cape Town, 8001', fields['address'])
+            .replace('021 555 0142', fields['phone'])
+            .replace('https://greenleaf.example.co.za', fields['website'])
+        )
+
+    def _roll(self):
+        """Pick 'blocked', 'challenge' or None for a store page request"""
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+            if roll < self.block_rate:
+                self.blocked += 1
+                return 'blocked'
+            if roll < self.block_rate + self.challenge_rate:
+                self.challenged += 1
+                return 'challenge'
+        return None
+
+    def respond(self, path, query):
+        """Return (status, html) for a request"""
+        if path == LISTING_PATH:
+            page = int(query.get('page', ['1'])[0])
+            if not 1 <= page <= self.pages:
+                return 404, '<h1>Not found</h1>'
+            return 200, self.listing_page(page)
+        if path.startswith(STORE_PATH + 'store-'):
+            try:
+                index = int(path[len(STORE_PATH + 'store-'):])
+            except ValueError:
+                return 404, '<h1>Not found</h1>'
+            if not 0 <= index < self.stores:
+                return 404, '<h1>Not found</h1>'
+            outcome = self._roll()
+            if outcome == 'blocked':
+                return 403, CHALLENGE_PAGE
+            if outcome == 'challenge':
+                return 200, CHALLENGE_PAGE
+            return 200, self.store_page(index)
+        return 404, '<h1>Not found</h1>'
+
+
+def make_handler(site):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if site.latency:
+                time.sleep(site.latency)
+            url = urlparse(self.path)
+            status, html = site.respond(url.path, parse_qs(url.query))
+            body = html.encode('utf-8')
+            etag = f'"{zlib.crc32(body):08x}"'
+            not_modified = status == 200 and self.headers.get('If-None-Match') == etag
+            with site._lock:
+                site.conditional += 'If-None-Match' in self.headers
+                site.not_modified += not_modified
+            if not_modified:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(status)
+            if status == 200:
+                self.send_header('ETag', etag)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_mock_server(site, host='127.0.0.1', port=0):
+    """Serve site on a background thread; returns (server, listings URL)"""
+    server = ThreadingHTTPServer((host, port), make_handler(site))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_port}{LISTING_PATH}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--stores', type=int, default=120, help='number of stores')
+    parser.add_argument('--per-page', type=int, default=12, help='store cards per listing page')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--block-rate', type=float, default=0.0, help='fraction of store pages answered with 403')
+    parser.add_argument('--challenge-rate', type=float, default=0.0,
+                        help='fraction of store pages answered with a Cloudflare challenge')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    site = MockSite(args.stores, args.per_page, args.latency, args.block_rate, args.challenge_rate, args.seed)
+    server, url = start_mock_server(site, args.host, args.port)
+    print(f"Serving {site.stores} stores on {site.pages} pages at {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Classify fetched pages as real content or a block before they are parsed
+
+classify() looks only at the status code and the raw bytes of a response, so
+a Cloudflare interstitial, a captcha wall, a rate-limit page or an empty body
+is recognised with a handful of substring searches instead of a parse that
+fails halfway. route() turns the verdict into what the caller should do:
+
+    parse    the page is worth parsing
+    retry    try the same request again after backing off
+    browser  escalate to a browser (clearance cookies or a rendered fetch)
+    skip     give up on this URL for this run
+
+A page that was already rendered by a browser has nowhere left to escalate,
+so its blocks are skipped. classify_page() gives the same verdict for the
+page loaded in a Selenium driver with a single script call.
+"""
+
+OK = 'ok'
+CHALLENGE = 'challenge'
+CAPTCHA = 'captcha'
+RATE_LIMIT = 'rate_limit'
+BLOCKED = 'blocked'
+EMPTY = 'empty'
+
+PARSE = 'parse'
+RETRY = 'retry'
+BROWSER = 'browser'
+SKIP = 'skip'
+
+# Kinds that mean the site is pushing back, as opposed to a page that failed to load
+BLOCK_KINDS = (CHALLENGE, CAPTCHA, RATE_LIMIT, BLOCKED)
+
+# Both appear in the Cloudflare interstitial (see page_content.html) but not in normal pages
+CHALLENGE_MARKERS = (b'<title>Just a moment...</title>', b'window._cf_chl_opt')
+# Cloudflare challenges that need a human instead of a browser that runs their script
+INTERACTIVE_MARKERS = (b"cType: 'interactive'", b'cType: "interactive"')
+# Captcha walls of other bot managers (PerimeterX, DataDome)
+CAPTCHA_MARKERS = (b'px-captcha', b'captcha-delivery.com')
+# Captcha widgets only mean a wall on a block page; a store page may have one on a contact form
+CAPTCHA_WIDGETS = (b'h-captcha', b'g-recaptcha', b'cf-turnstile')
+BLOCK_TITLES = (b'<title>Attention Required!', b'<title>Access denied', b'Sorry, you have been blocked')
+# Cloudflare error 1015
+RATE_LIMIT_MARKERS = (b'You are being rate limited', b'error code: 1015')
+
+# Page titles and selectors of the same pages once rendered
+CHALLENGE_TITLES = ('Just a moment...',)
+BLOCK_PAGE_TITLES = ('Attention Required!', 'Access denied')
+CHALLENGE_SELECTOR = '#challenge-running, #challenge-form, #challenge-stage'
+CAPTCHA_SELECTOR = ("iframe[src*='hcaptcha'], iframe[src*='recaptcha'], .h-captcha, .g-recaptcha, "
+                    "#px-captcha, iframe[src*='captcha-delivery.com']")
+
+# A 2xx body shorter than this once stripped has nothing to parse
+MIN_PAGE_BYTES = 64
+# Block pages are small and carry their markers early (the interstitial's last one is at
+# byte ~12k), so only this much of a body is searched and large store pages cost no more
+SCAN_BYTES = 64 * 1024
+
+ROUTES = {
+    OK: PARSE,
+    CHALLENGE: BROWSER,
+    CAPTCHA: BROWSER,
+    BLOCKED: BROWSER,
+    RATE_LIMIT: RETRY,
+    EMPTY: RETRY,
+}
+# Routes for a page a browser already rendered
+RENDERED_ROUTES = {
+    OK: PARSE,
+    CHALLENGE: SKIP,
+    CAPTCHA: SKIP,
+    BLOCKED: SKIP,
+    RATE_LIMIT: RETRY,
+    EMPTY: SKIP,
+}
+
+_PAGE_SCRIPT = (
+    "var chl = window._cf_chl_opt;"
+    "var code = document.querySelector('.cf-error-code');"
+    "return [document.title || '',"
+    "        chl ? String(chl.cType || 'managed') : '',"
+    "        !!document.querySelector(arguments[0]),"
+    "        !!document.querySelector(arguments[1]),"
+    "        code ? code.textContent.trim() : '',"
+    "        document.body ? document.body.textContent.trim().length : 0];"
+)
+
+
+class PageBlocked(Exception):
+    """Raised for a URL that served a block or an empty page instead of its content"""
+
+    def __init__(self, url, kind, action):
+        super().__init__(f"{kind} page at {url} ({action})")
+        self.url = url
+        self.kind = kind
+        self.action = action
+
+
+def _contains_any(content, markers):
+    return any(marker in content for marker in markers)
+
+
+def classify(status_code, content):
+    """Return the kind of page behind a status code and raw body, without parsing it
+
+    Anything that is not recognisably a block or an empty body is OK, so HTTP
+    errors such as a 404 or a bare 503 are left to raise_for_status.
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8', 'replace')
+    if status_code == 304:
+        return OK
+    head = (content or b'')[:SCAN_BYTES]
+    if status_code == 429 or _contains_any(head, RATE_LIMIT_MARKERS):
+        return RATE_LIMIT
+    if _contains_any(head, CHALLENGE_MARKERS):
+        return CAPTCHA if _contains_any(head, INTERACTIVE_MARKERS) else CHALLENGE
+    if _contains_any(head, CAPTCHA_MARKERS):
+        return CAPTCHA
+    if _contains_any(head, BLOCK_TITLES):
+        return CAPTCHA if _contains_any(head, CAPTCHA_WIDGETS) else BLOCKED
+    if status_code == 403:
+        return BLOCKED
+    if status_code < 300 and len(head.strip()) < MIN_PAGE_BYTES:
+        return EMPTY
+    return OK
+
+
+def classify_response(response):
+    return classify(response.status_code, response.content)
+
+
+def route(kind, rendered=False):
+    """What to do with a page of this kind: PARSE, RETRY, BROWSER or SKIP"""
+    return (RENDERED_ROUTES if rendered else ROUTES)[kind]
+
+
+def check_response(url, response, rendered=False):
+    """Return the kind of response, raising PageBlocked unless it should be parsed"""
+    kind = classify_response(response)
+    action = route(kind, rendered)
+    if action != PARSE:
+        raise PageBlocked(url, kind, action)
+    return kind
+
+
+def classify_page(driver):
+    """Return the kind of page loaded in a Selenium driver, using one script call"""
+    title, challenge_type, challenge_shown, captcha_shown, error_code, text_length = driver.execute_script(
+        _PAGE_SCRIPT, CHALLENGE_SELECTOR, CAPTCHA_SELECTOR
+    )
+    if error_code == '1015':
+        return RATE_LIMIT
+    if challenge_type:
+        return CAPTCHA if challenge_type == 'interactive' else CHALLENGE
+    if title in CHALLENGE_TITLES or challenge_shown:
+        return CAPTCHA if captcha_shown else CHALLENGE
+    if error_code or title.startswith(BLOCK_PAGE_TITLES):
+        return CAPTCHA if captcha_shown else BLOCKED
+    if not text_length:
+        return EMPTY
+    return OK
@@ -0,0 +1,393 @@
+import json
+import logging
+import os
+import signal
+import tempfile
+import threading
+import weakref
+
+from metrics import METRICS
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Every scraper process records the browser processes it launches in <pid>.json here;
+# only processes found in these files are ever reaped
+PIDFILE_DIR = os.path.join(tempfile.gettempdir(), 'scraper_browsers')
+
+# Lifecycles whose browsers are alive and must not be reaped as orphans
+_live = weakref.WeakSet()
+# Held while a driver is launched and registered and while orphans are reaped, so a
+# reap never sees the processes of a driver that is still being registered
+_live_lock = threading.RLock()
+
+
+def process_table():
+    """Return {pid: (ppid, name)} for every running process, from psutil or /proc
+
+    Zombies have already exited and are left out.
+    """
+    table = {}
+    if psutil is not None:
+        for proc in psutil.process_iter(['ppid', 'name', 'status']):
+            if proc.info['status'] != psutil.STATUS_ZOMBIE:
+                table[proc.pid] = (proc.info['ppid'] or 0, proc.info['name'] or '')
+        return table
+    if not os.path.isdir('/proc'):
+        return table
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The name is in parentheses and may itself contain spaces
+        name = stat[stat.find('(') + 1:stat.rfind(')')]
+        fields = stat[stat.rfind(')') + 2:].split()
+        if fields[0] != 'Z':
+            table[int(entry)] = (int(fields[1]), name)
+    return table
+
+
+def process_start_time(pid):
+    """When pid started, to tell it from a later process that reused its pid; None if it is not running"""
+    try:
+        if psutil is not None:
+            return psutil.Process(pid).create_time()
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            stat = f.read()
+        # Field 22, counted after the parenthesized name, in clock ticks since boot
+        return float(stat[stat.rfind(')') + 2:].split()[19])
+    except Exception:
+        return None
+
+
+def _pidfile_path(pid):
+    return os.path.join(PIDFILE_DIR, f'{pid}.json')
+
+
+def _read_pidfile(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_pidfile(browsers):
+    """Record {pid: start time} of the browser processes this process launched"""
+    os.makedirs(PIDFILE_DIR, exist_ok=True)
+    path = _pidfile_path(os.getpid())
+    if not browsers:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return
+    owner = {'owner': os.getpid(), 'owner_started': process_start_time(os.getpid()),
+             'browsers': {str(pid): started for pid, started in browsers.items()}}
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(owner, f)
+    os.replace(tmp_path, path)
+
+
+def _record_browsers(pids):
+    """Add pids, with their start times, to this process's pidfile"""
+    data = _read_pidfile(_pidfile_path(os.getpid())) or {}
+    browsers = {int(pid): started for pid, started in data.get('browsers', {}).items()}
+    for pid in pids:
+        started = process_start_time(pid)
+        if started is not None:
+            browsers[pid] = started
+    _write_pidfile(browsers)
+
+
+def _forget_browsers(pids):
+    data = _read_pidfile(_pidfile_path(os.getpid()))
+    if data is None:
+        return
+    browsers = {int(pid): started for pid, started in data.get('browsers', {}).items() if int(pid) not in pids}
+    _write_pidfile(browsers)
+
+
+def process_tree(roots, table=None):
+    """Return the pids of roots and all their descendants that are still running"""
+    table = process_table() if table is None else table
+    children = {}
+    for pid, (ppid, _) in table.items():
+        children.setdefault(ppid, []).append(pid)
+    tree = set()
+    stack = [pid for pid in roots if pid in table]
+    while stack:
+        pid = stack.pop()
+        if pid not in tree:
+            tree.add(pid)
+            stack.extend(children.get(pid, []))
+    return tree
+
+
+def process_rss(pid):
+    """Resident memory of one process in bytes, or 0 if it cannot be read"""
+    try:
+        if psutil is not None:
+            return psutil.Process(pid).memory_info().rss
+        with open(f'/proc/{pid}/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except Exception:
+        return 0
+
+
+def kill_processes(pids):
+    """Kill pids, ignoring ones that already exited; returns how many were killed"""
+    killed = 0
+    for pid in pids:
+        try:
+            if psutil is not None:
+                psutil.Process(pid).kill()
+            else:
+                os.kill(pid, getattr(signal, 'SIGKILL', signal.SIGTERM))
+            killed += 1
+        except Exception:
+            continue
+        _reap(pid)
+    return killed
+
+
+def _reap(pid):
+    """Collect the exit status of pid if it is our child, so it does not linger as a zombie"""
+    try:
+        os.waitpid(pid, os.WNOHANG)
+    except (ChildProcessError, OSError, AttributeError):
+        pass
+
+
+def driver_pids(driver):
+    """Root pids of a Selenium driver: chromedriver and, for undetected_chromedriver, Chrome"""
+    pids = []
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    if process is not None and getattr(process, 'pid', None):
+        pids.append(process.pid)
+    # undetected_chromedriver starts Chrome itself instead of through chromedriver
+    browser_pid = getattr(driver, 'browser_pid', None)
+    if browser_pid:
+        pids.append(browser_pid)
+    return pids
+
+
+def reap_orphaned_drivers():
+    """Kill Chrome and chromedriver processes left behind by crashed or leaked drivers
+
+    Only processes recorded in a pidfile by a BrowserLifecycle are
+    candidates, so browsers the scraper did not start are never touched.
+    They are reaped when the scraper process that launched them has exited,
+    or, for this process, when no live BrowserLifecycle owns them any more;
+    the browsers of other scrapers that are still running are left alone. A
+    recorded pid whose start time differs has been reused by an unrelated
+    process and is skipped.
+    """
+    if not os.path.isdir(PIDFILE_DIR):
+        return 0
+    killed = 0
+    with _live_lock:
+        table = process_table()
+        protected = set()
+        for lifecycle in list(_live):
+            protected |= lifecycle.process_tree(table)
+        for entry in os.listdir(PIDFILE_DIR):
+            if not entry.endswith('.json'):
+                continue
+            path = os.path.join(PIDFILE_DIR, entry)
+            data = _read_pidfile(path)
+            if data is None:
+                continue
+            owner = data.get('owner')
+            own = owner == os.getpid()
+            if not own and owner in table and process_start_time(owner) == data.get('owner_started'):
+                continue
+            orphans = [
+                int(pid) for pid, started in data.get('browsers', {}).items()
+                if int(pid) in table and int(pid) not in protected and process_start_time(int(pid)) == started
+            ]
+            if orphans:
+                killed += kill_processes(process_tree(orphans, table) - protected)
+            if own:
+                # Keep only the browsers of live lifecycles; the rest are killed or gone
+                _forget_browsers({int(pid) for pid in data.get('browsers', {})} - protected)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    if killed:
+        logging.warning(f"Killed {killed} orphaned browser processes")
+        METRICS.inc('browser_orphans_killed', killed)
+    return killed
+
+
+class BrowserLifecycle:
+    """Owns one Selenium driver and replaces it before it grows too large
+
+    The driver is started lazily by factory() and handed to on_launch (for
+    example to pass the Cloudflare challenge). Callers report each page they
+    load with page_loaded() and call recycle_if_needed() at points where a
+    fresh browser is safe. The driver is recycled after max_pages pages, when
+    the resident memory of its process tree reaches max_rss_mb (checked every
+    check_every pages), or when more than max_tabs tabs are open. Stray tabs
+    are closed at each check. Processes still alive after quit() are killed,
+    and so are orphaned browsers from earlier drivers.
+    """
+
+    def __init__(self, factory, on_launch=None, max_pages=100, max_rss_mb=700, max_tabs=4, check_every=5,
+                 name='browser'):
+        self.factory = factory
+        self.on_launch = on_launch
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.max_tabs = max_tabs
+        self.check_every = max(1, check_every)
+        self.name = name
+        self.pages = 0
+        self.launches = 0
+        self.recycles = 0
+        self.leaked_tabs = 0
+        self.leaked_processes = 0
+        self.last_rss_mb = 0.0
+        self.peak_rss_mb = 0.0
+        self._since_check = 0
+        self._driver = None
+        self._pids = []
+        self._recorded = set()  # Pids written to the pidfile for this driver
+
+    @property
+    def driver(self):
+        if self._driver is None:
+            self._launch()
+        return self._driver
+
+    def _launch(self):
+        with _live_lock:
+            self._driver = self.factory()
+            self._pids = driver_pids(self._driver)
+            _live.add(self)
+            # Chrome has started by now, so the tree holds its main process as well as the driver
+            self._recorded = self.process_tree()
+            _record_browsers(self._recorded)
+        self.pages = 0
+        self._since_check = 0
+        self.launches += 1
+        logging.info(f"{self.name}: launched driver (launch #{self.launches})")
+        if self.on_launch is not None:
+            self.on_launch(self._driver)
+
+    def process_tree(self, table=None):
+        return process_tree(self._pids, table) if self._driver is not None else set()
+
+    def rss_mb(self):
+        """Resident memory of the driver's process tree in MB
+
+        Shared pages are counted once per process, so this overstates what
+        Chrome really uses; it only has to grow when Chrome does.
+        """
+        rss = sum(process_rss(pid) for pid in self.process_tree()) / (1024 * 1024)
+        self.last_rss_mb = rss
+        self.peak_rss_mb = max(self.peak_rss_mb, rss)
+        METRICS.set_gauge(f'browser_rss_mb{{browser="{self.name}"}}', round(rss, 1))
+        return rss
+
+    def page_loaded(self, count=1):
+        self.pages += count
+        self._since_check += count
+
+    def close_extra_tabs(self):
+        """Close every tab but the first; returns how many were closed"""
+        try:
+            handles = self._driver.window_handles
+            for handle in handles[1:]:
+                self._driver.switch_to.window(handle)
+                self._driver.close()
+            self._driver.switch_to.window(handles[0])
+        except Exception as e:
+            logging.warning(f"{self.name}: could not close extra tabs: {str(e)}")
+            return 0
+        return len(handles) - 1
+
+    def recycle_reason(self):
+        """Why the driver should be replaced now, or None"""
+        if self._driver is None:
+            return None
+        if self.max_pages and self.pages >= self.max_pages:
+            return f"{self.pages} pages loaded"
+        try:
+            tabs = len(self._driver.window_handles)
+        except Exception as e:
+            return f"driver unresponsive ({str(e)})"
+        if self.max_tabs and tabs > self.max_tabs:
+            return f"{tabs} tabs open"
+        if tabs > 1:
+            self.leaked_tabs += self.close_extra_tabs()
+            logging.warning(f"{self.name}: closed {tabs - 1} tabs left open")
+        if self._since_check >= self.check_every:
+            self._since_check = 0
+            rss = self.rss_mb()
+            if self.max_rss_mb and rss >= self.max_rss_mb:
+                return f"{rss:.0f} MB resident"
+        return None
+
+    def recycle_if_needed(self):
+        """Replace the driver if it is due and return the driver to use"""
+        reason = self.recycle_reason()
+        if reason is not None:
+            self.recycle(reason)
+        return self.driver
+
+    def recycle(self, reason):
+        logging.info(f"{self.name}: recycling driver after {reason}")
+        self.recycles += 1
+        METRICS.inc('browser_recycles')
+        self._shutdown()
+        reap_orphaned_drivers()
+
+    def _shutdown(self):
+        if self._driver is None:
+            return
+        pids = self.process_tree()
+        try:
+            self._driver.quit()
+        except Exception as e:
+            logging.warning(f"{self.name}: error quitting driver: {str(e)}")
+        self._driver = None
+        leftover = process_tree(pids)
+        if leftover:
+            killed = kill_processes(leftover)
+            self.leaked_processes += killed
+            METRICS.inc('browser_leaked_processes', killed)
+            logging.warning(f"{self.name}: killed {killed} processes still running after quit")
+        with _live_lock:
+            _live.discard(self)
+            _forget_browsers(self._recorded)
+            self._recorded = set()
+
+    def stats(self):
+        return {
+            'launches': self.launches,
+            'recycles': self.recycles,
+            'pages': self.pages,
+            'last_rss_mb': round(self.last_rss_mb, 1),
+            'peak_rss_mb': round(self.peak_rss_mb, 1),
+            'leaked_tabs': self.leaked_tabs,
+            'leaked_processes': self.leaked_processes
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logging.info(f"{self.name}: {stats['launches']} launches, {stats['recycles']} recycles, "
+                     f"peak {stats['peak_rss_mb']} MB, {stats['leaked_tabs']} leaked tabs, "
+                     f"{stats['leaked_processes']} leaked processes")
+
+    def close(self):
+        self._shutdown()
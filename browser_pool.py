@@ -0,0 +1,157 @@
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from playwright.sync_api import sync_playwright
+
+
+class BrowserSlot:
+    """A warm Chromium browser context driven from its own thread
+
+    Playwright's sync API is bound to the thread that started it, so each slot
+    owns a thread that launches the browser on first use and runs every job
+    submitted to it. The browser is relaunched when it stops responding or
+    after max_pages navigations to keep memory in check.
+    """
+
+    def __init__(self, slot_id, max_pages=50, headless=True, resource_policy=None):
+        self.slot_id = slot_id
+        self.max_pages = max_pages
+        self.headless = headless
+        self.resource_policy = resource_policy
+        self.pages_served = 0
+        self.launches = 0
+        self._healthy = True
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"browser-slot-{slot_id}",
+            daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, func):
+        """Run func(context) on the slot thread and return its result"""
+        future = Future()
+        self._jobs.put((func, future))
+        return future.result()
+
+    def _launch(self, playwright):
+        browser = playwright.chromium.launch(headless=self.headless)
+        context = browser.new_context()
+        if self.resource_policy is not None:
+            self.resource_policy.apply_to_context(context)
+        self.pages_served = 0
+        self.launches += 1
+        self._healthy = True
+        logging.info(f"Browser slot {self.slot_id}: launched browser (launch #{self.launches})")
+        return browser, context
+
+    def _close(self, browser):
+        if browser is None:
+            return
+        try:
+            browser.close()
+        except Exception as e:
+            logging.warning(f"Browser slot {self.slot_id}: error closing browser: {str(e)}")
+
+    def _needs_recycle(self, browser):
+        if browser is None:
+            return True
+        if not self._healthy or not browser.is_connected():
+            logging.info(f"Browser slot {self.slot_id}: browser unhealthy, recycling")
+            return True
+        if self.pages_served >= self.max_pages:
+            logging.info(f"Browser slot {self.slot_id}: served {self.pages_served} pages, recycling")
+            return True
+        return False
+
+    def _run(self):
+        try:
+            playwright = sync_playwright().start()
+        except Exception as e:
+            logging.error(f"Browser slot {self.slot_id}: failed to start Playwright: {str(e)}")
+            self._fail_jobs(e)
+            return
+
+        browser = context = None
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                func, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    if self._needs_recycle(browser):
+                        self._close(browser)
+                        browser = None
+                        browser, context = self._launch(playwright)
+                    result = func(context)
+                    self.pages_served += 1
+                    future.set_result(result)
+                except Exception as e:
+                    self._healthy = False
+                    future.set_exception(e)
+        finally:
+            self._close(browser)
+            playwright.stop()
+
+    def _fail_jobs(self, error):
+        """Reject every job submitted to a slot that could not start"""
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            func, future = job
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    def close(self):
+        self._jobs.put(None)
+        self._thread.join(timeout=30)
+
+
+def _load_page(context, url, timeout):
+    page = context.new_page()
+    try:
+        page.goto(url, timeout=timeout)
+        return page.content()
+    finally:
+        page.close()
+
+
+class BrowserPool:
+    """Fixed-size pool of warm browser slots with lease/return semantics"""
+
+    def __init__(self, size=2, max_pages=50, headless=True, resource_policy=None):
+        self._slots = [
+            BrowserSlot(i, max_pages=max_pages, headless=headless, resource_policy=resource_policy)
+            for i in range(size)
+        ]
+        self._idle = queue.Queue()
+        for slot in self._slots:
+            self._idle.put(slot)
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """Borrow a slot for the duration of the with block"""
+        try:
+            slot = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("Timed out waiting for a free browser slot")
+        try:
+            yield slot
+        finally:
+            self._idle.put(slot)
+
+    def fetch(self, url, timeout=30000):
+        """Load url in a warm browser context and return the rendered HTML"""
+        with self.lease() as slot:
+            return slot.submit(lambda context: _load_page(context, url, timeout))
+
+    def close(self):
+        for slot in self._slots:
+            slot.close()
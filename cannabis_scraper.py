@@ -1,42 +1,122 @@
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from bs4 import BeautifulSoup
+import argparse
 import json
-import csv
 import logging
 from urllib.parse import urljoin
 import time
 import random
-import cloudscraper
-from playwright.sync_api import sync_playwright
-import backoff
 import os
+import atexit
+import threading
 from datetime import datetime, timedelta
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
+# Browser stacks (selenium, playwright), backoff and bs4 are imported where they are first needed
+import requests
+from fetch_engine import ConcurrentFetcher
+from rate_limiter import AdaptiveRateLimiter
+from block_detector import (BLOCK_KINDS, BROWSER, CHALLENGE, OK, PARSE, RETRY, PageBlocked, check_response,
+                            classify_page, classify_response, route)
+from metrics import METRICS
+from resource_blocking import ResourcePolicy
+from http_client import get_shared_client
+from clearance import ClearanceBroker
+from crawl_state import PendingMetadataUpdates, UrlMetadataStore, change_status, content_fingerprint
+from response_cache import CacheMiss, ResponseCache
+from checkpoint_journal import CheckpointJournal
+from url_frontier import UrlFrontier
+from crawl_scheduler import CrawlBudgetExceeded, CrawlScheduler
+from result_sinks import open_sinks
+from store_record import StoreRecord
+from store_pipeline import normalize_result_files, streaming_formats
+import store_parser
+
+# Engine configuration
+ENGINE = 'http'  # Overridden by --engine; see SCRAPER_ENGINES
+SCRAPER_ENGINES = {
+    'http': 'Plain HTTP for the listings and store pages; browsers only start when a request is blocked',
+    'playwright': 'Render the listings and store pages in the pooled Playwright browsers',
+    'selenium': 'Render the listings page in headless Selenium Chrome, fetch store pages over HTTP',
+    'uc': 'Run the undetected-chromedriver CannabisScraper from cannabis_scraper_improved.py',
+}
 
 # Checkpoint configuration
 CHECKPOINT_INTERVAL = 10  # Save progress every 10 stores
 CHECKPOINT_DIR = 'checkpoints'
 CHECKPOINT_RETENTION_DAYS = 1  # Keep checkpoints for 1 day
+CHECKPOINT_COMPACT_INTERVAL = 1000  # Rewrite the journal without duplicates every N stores
+URL_FRONTIER_DB = 'checkpoints/url_frontier.db'  # Per-URL pending/in_flight/done/failed state for resuming
+MAX_STORE_ATTEMPTS = 3  # Failed store pages are retried on resume until they have failed this often
+
+# Concurrency configuration
+MAX_CONCURRENCY = 8  # Store pages fetched in parallel
+PER_HOST_CONCURRENCY = 4  # Parallel requests allowed against a single host
+
+# Connection pool configuration
+HTTP_POOL_CONNECTIONS = 10  # Number of hosts to keep connection pools for
+HTTP_POOL_MAXSIZE = MAX_CONCURRENCY  # Keep-alive connections kept per host
+
+# Adaptive rate limiting (per host, concurrency capped at PER_HOST_CONCURRENCY)
+ADAPTIVE_RATE_LIMIT = True  # Speed up while responses are fast, back off hard when blocked
+RATE_LIMIT_INITIAL_RPS = 2.0  # Requests per second to start at
+RATE_LIMIT_MAX_RPS = 10.0
+RATE_LIMIT_SLOW_SECONDS = 3.0  # Responses slower than this stop the ramp-up
+RATE_LIMIT_COOLDOWN = 30  # Seconds to pause a host after a 403/429/503 or challenge page
+
+# Playwright fallback configuration
+BROWSER_POOL_SIZE = 2  # Warm browsers kept for blocked requests
+BROWSER_MAX_PAGES = 50  # Relaunch a browser after this many pages
+
+# Browser request blocking (Selenium through CDP, Playwright through request routing)
+BLOCK_RESOURCES = True
+BLOCKED_RESOURCE_TYPES = ['image', 'media', 'font']  # Playwright resource types; 'stylesheet' is also supported
+BLOCKED_DOMAINS = ['google-analytics.com', 'googletagmanager.com', 'doubleclick.net',
+                   'googlesyndication.com', 'facebook.net', 'hotjar.com', 'static.cloudflareinsights.com']
+ALLOWED_DOMAINS = ['challenges.cloudflare.com']  # Never blocked, the challenge needs them
+
+# Cloudflare clearance configuration
+USE_CLEARANCE_BROKER = True  # Solve the challenge once in a browser and reuse its cookies over HTTP
+CLEARANCE_MAX_AGE = 1800  # Re-solve after this many seconds even if the cookie lives longer
+
+# Incremental crawl configuration
+INCREMENTAL_CRAWL = True  # Send conditional requests and skip parsing unchanged store pages
+METADATA_DB = 'crawl_state.db'  # Per-URL validators and content hashes from previous runs
+
+# Crawl scheduling configuration
+SCHEDULE_CRAWL = True  # Fetch new stores first, then by how often they changed; needs INCREMENTAL_CRAWL
+CRAWL_BUDGET_SECONDS = None  # Stop fetching stores after this long, leaving the rest pending for the next run
+MIN_CHANGE_PROBABILITY = 0.2  # Reuse last run's record for stores less likely than this to have changed
+MAX_REVISIT_DAYS = 7  # but fetch every store at least this often
+
+# Response cache configuration
+USE_RESPONSE_CACHE = True  # Serve repeated fetches (retries, resumes) from disk
+RESPONSE_CACHE_DIR = 'http_cache'
+RESPONSE_CACHE_TTL = 12 * 60 * 60  # Seconds before a cached page is fetched again
+RESPONSE_CACHE_MAX_BYTES = 512 * 1024 * 1024  # Least recently used pages are evicted above this
+CACHE_REPLAY_ONLY = False  # Serve everything from cache and never touch the network
+
+# Parser configuration
+PARSER_ENGINE = 'auto'  # 'selectolax', 'lxml' or 'bs4'; 'auto' uses the fastest installed
+
+# Output configuration
+RESULT_FORMATS = ['json', 'csv', 'jsonl']  # Add 'parquet' if pyarrow is installed
+NORMALIZE_RESULTS = True  # Normalize phones and addresses and merge duplicate stores before writing results
+STORE_FIELDS = ['name', 'address', 'phone', 'website']
+
+# Metrics configuration
+METRICS_FORMAT = None  # 'prometheus' or 'json' to write per-stage timings and counters after a crawl
+METRICS_FILE = 'scraper_metrics'  # Written as scraper_metrics.prom or scraper_metrics.json
 
 # Proxy configuration
 USE_PROXIES = False  # Disabled due to reliability issues
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('scraper.log'),
-        logging.StreamHandler()
-    ]
-)
+def setup_logging():
+    """Log to scraper.log and the console; called by main() rather than on import"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('scraper.log'),
+            logging.StreamHandler()
+        ]
+    )
 
 BASE_URL = "https://askmaryj.com/en-za/listings/cannabis"
 
@@ -58,30 +138,18 @@ def ensure_checkpoint_dir():
         os.makedirs(CHECKPOINT_DIR)
         logging.info(f"Created checkpoint directory: {CHECKPOINT_DIR}")
 
-def get_latest_checkpoint():
-    """Get the most recent checkpoint file"""
+def open_checkpoint_journal(on_commit=None):
+    """Open the append-only journal that records scraped stores for resuming"""
     ensure_checkpoint_dir()
-    checkpoints = [f for f in os.listdir(CHECKPOINT_DIR) if f.endswith('.json')]
-    if not checkpoints:
-        return None
-        
-    # Get the most recent checkpoint
-    latest = max(checkpoints, key=lambda f: os.path.getmtime(os.path.join(CHECKPOINT_DIR, f)))
-    return os.path.join(CHECKPOINT_DIR, latest)
-
-def save_checkpoint(data, store_count):
-    """Save current progress to a checkpoint file"""
-    ensure_checkpoint_dir()
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"checkpoint_{timestamp}_store{store_count}.json"
-    filepath = os.path.join(CHECKPOINT_DIR, filename)
-    
-    try:
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
-        logging.info(f"Saved checkpoint: {filename}")
-    except Exception as e:
-        logging.error(f"Failed to save checkpoint: {str(e)}")
+    return CheckpointJournal(
+        CHECKPOINT_DIR,
+        'scrape_all_stores',
+        fsync_every=CHECKPOINT_INTERVAL,
+        compact_every=CHECKPOINT_COMPACT_INTERVAL,
+        # A store journaled again (a retry, a re-scrape after a resume) replaces its earlier record
+        key=lambda record: record['url'],
+        on_commit=on_commit
+    )
 
 def cleanup_old_checkpoints():
     """Remove checkpoint files older than retention period"""
@@ -110,25 +178,17 @@ HEADERS = {
     'Upgrade-Insecure-Requests': '1'
 }
 
-@backoff.on_exception(
-    backoff.expo,
-    (requests.exceptions.RequestException, requests.exceptions.Timeout),
-    max_tries=3
-)
-def make_request(url):
-    """Make HTTP request with retry logic and fallback to Playwright"""
-    session = requests.Session()
-    retry_strategy = Retry(
-        total=3,
-        backoff_factor=1,
-        status_forcelist=[500, 502, 503, 504]
+def get_http_client():
+    """Get the shared pooled HTTP client used for all store fetches"""
+    return get_shared_client(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE
     )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    
+
+def build_headers(user_agent, extra_headers=None):
+    """Build browser-like request headers for the given User-Agent"""
     headers = HEADERS.copy()
-    headers['User-Agent'] = get_random_user_agent()
+    headers['User-Agent'] = user_agent
     headers['Accept-Language'] = 'en-US,en;q=0.9'
     headers['Sec-Ch-Ua'] = '"Not_A Brand";v="8", "Chromium";v="120"'
     headers['Sec-Ch-Ua-Mobile'] = '?0'
@@ -137,76 +197,331 @@ def make_request(url):
     headers['Sec-Fetch-Mode'] = 'navigate'
     headers['Sec-Fetch-Site'] = 'same-origin'
     headers['Sec-Fetch-User'] = '?1'
+    if extra_headers:
+        headers.update(extra_headers)
+    return headers
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Get the on-disk response cache, or None when caching is disabled"""
+    global _response_cache
+    if not (USE_RESPONSE_CACHE or CACHE_REPLAY_ONLY):
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache(
+                RESPONSE_CACHE_DIR,
+                ttl=RESPONSE_CACHE_TTL,
+                max_bytes=RESPONSE_CACHE_MAX_BYTES,
+                replay_only=CACHE_REPLAY_ONLY
+            )
+        return _response_cache
+
+def make_request(url, extra_headers=None):
+    """Make HTTP request, serving it from the response cache when possible
+
+    Conditional requests (extra_headers with validators from an earlier run)
+    go to the server unless the cache is replay-only: a 304 costs as little as
+    a cache hit and is how an incremental crawl finds out what changed.
+    """
+    cache = get_response_cache()
+    if cache is not None and (cache.replay_only or not extra_headers):
+        cached = cache.get(url)
+        # A block page cached by an older version counts as a miss
+        if cached is not None and classify_response(cached) == OK:
+            return cached
+        if cache.replay_only:
+            raise CacheMiss(f"Not in response cache: {url}")
+    
+    if ENGINE == 'playwright':
+        response = make_request_with_playwright(url)
+        check_response(url, response, rendered=True)
+    else:
+        response = fetch_url(url, extra_headers)
+    if cache is not None:
+        cache.put(url, response)
+    return response
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """Get the adaptive per-host rate limiter, or None when it is disabled"""
+    global _rate_limiter
+    if not ADAPTIVE_RATE_LIMIT:
+        return None
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = AdaptiveRateLimiter(
+                initial_rate=RATE_LIMIT_INITIAL_RPS,
+                max_rate=RATE_LIMIT_MAX_RPS,
+                max_concurrency=PER_HOST_CONCURRENCY,
+                slow_seconds=RATE_LIMIT_SLOW_SECONDS,
+                cooldown=RATE_LIMIT_COOLDOWN
+            )
+        return _rate_limiter
+
+def throttled_get(client, url, headers):
+    """GET url through the rate limiter, reporting how the server responded"""
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return timed_get(client, url, headers)
+    with METRICS.timer('wait'):
+        started = limiter.acquire(url)
+    response = None
+    try:
+        response = timed_get(client, url, headers)
+        return response
+    finally:
+        limiter.release(url, started, response)
+
+def timed_get(client, url, headers):
+    """GET url, recording the full fetch time and the time to the response headers"""
+    with METRICS.timer('fetch'):
+        response = client.get(url, headers=headers, timeout=10)
+    METRICS.observe('ttfb', response.elapsed.total_seconds())
+    return response
+
+def count_retry(details):
+    """backoff handler counting retried requests"""
+    METRICS.inc('retries')
+
+def not_retryable(e):
+    """backoff giveup predicate: blocks are only retried when routed to RETRY"""
+    return isinstance(e, PageBlocked) and e.action != RETRY
+
+_fetch_with_retries = None
+
+def fetch_url(url, extra_headers=None):
+    """Make HTTP request with retry logic and fallback to Playwright"""
+    global _fetch_with_retries
+    if _fetch_with_retries is None:
+        import backoff
+        _fetch_with_retries = backoff.on_exception(
+            backoff.expo,
+            (requests.exceptions.RequestException, requests.exceptions.Timeout, PageBlocked),
+            max_tries=3,
+            giveup=not_retryable,
+            on_backoff=count_retry
+        )(_fetch_url)
+    return _fetch_with_retries(url, extra_headers)
+
+def _fetch_url(url, extra_headers=None):
+    client = get_http_client()
+    
+    # Clearance cookies are only honoured together with the browser's User-Agent
+    clearance = get_clearance()
+    user_agent = clearance.user_agent if clearance else get_random_user_agent()
     
     try:
         # First attempt with requests
-        response = session.get(url, headers=headers, timeout=10)
+        response = throttled_get(client, url, build_headers(user_agent, extra_headers))
+        # Classify the raw bytes before anything parses them
+        kind = classify_response(response)
+        action = route(kind)
+        if action != PARSE:
+            METRICS.inc(f'{kind}_pages')
+        if action == BROWSER:
+            if USE_CLEARANCE_BROKER:
+                try:
+                    logging.info(f"Request got a {kind} page, refreshing browser clearance for {url}")
+                    return make_request_with_clearance(client, url, clearance, extra_headers)
+                except PageBlocked as blocked:
+                    if blocked.action != BROWSER:
+                        raise
+                    logging.warning(f"Clearance was not accepted for {url}, still served a {blocked.kind} page")
+                except Exception as clearance_error:
+                    logging.warning(f"Request with clearance failed for {url}: {str(clearance_error)}")
+            # Fallback to Playwright if blocked
+            logging.info(f"Request got a {kind} page, falling back to Playwright for {url}")
+            response = make_request_with_playwright(url)
+            check_response(url, response, rendered=True)
+            return response
+        if action != PARSE:
+            raise PageBlocked(url, kind, action)
         response.raise_for_status()
         return response
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 403:
-            # Fallback to Playwright if blocked
-            logging.info(f"Request blocked, falling back to Playwright for {url}")
-            return make_request_with_playwright(url)
-        raise
     except Exception as e:
         logging.error(f"Request failed for {url}: {str(e)}")
         raise
 
+_resource_policy = None
+
+def get_resource_policy():
+    """Get the request blocking policy shared by all browsers, or None when blocking is disabled"""
+    global _resource_policy
+    if not BLOCK_RESOURCES:
+        return None
+    if _resource_policy is None:
+        _resource_policy = ResourcePolicy(BLOCKED_RESOURCE_TYPES, BLOCKED_DOMAINS, ALLOWED_DOMAINS)
+    return _resource_policy
+
+_browser_pool = None
+_browser_pool_lock = threading.Lock()
+
+def get_browser_pool():
+    """Get the warm Playwright browser pool, starting it on first use"""
+    global _browser_pool
+    with _browser_pool_lock:
+        if _browser_pool is None:
+            # Importing Playwright is slow, so it only happens once a browser is needed
+            from browser_pool import BrowserPool
+            _browser_pool = BrowserPool(
+                size=BROWSER_POOL_SIZE,
+                max_pages=BROWSER_MAX_PAGES,
+                resource_policy=get_resource_policy()
+            )
+            atexit.register(close_browser_pool)
+        return _browser_pool
+
+def close_browser_pool():
+    """Shut down the Playwright browser pool if it was started"""
+    global _browser_pool, _clearance_broker
+    with _browser_pool_lock:
+        _clearance_broker = None
+        if _browser_pool is not None:
+            _browser_pool.close()
+            _browser_pool = None
+
+_clearance_broker = None
+
+def get_clearance_broker():
+    """Get the Cloudflare clearance broker, creating it on first use"""
+    global _clearance_broker
+    pool = get_browser_pool()
+    with _browser_pool_lock:
+        if _clearance_broker is None:
+            _clearance_broker = ClearanceBroker(pool, BASE_URL, max_age=CLEARANCE_MAX_AGE)
+        return _clearance_broker
+
+def get_clearance():
+    """Get the current browser clearance without starting a browser"""
+    broker = _clearance_broker
+    return broker.current() if broker is not None else None
+
+def make_request_with_clearance(client, url, stale_clearance, extra_headers=None):
+    """Retry a blocked request over HTTP with fresh clearance cookies from a browser"""
+    METRICS.inc('clearance_retries')
+    clearance = get_clearance_broker().refresh(stale_clearance)
+    clearance.apply(client.session)
+    response = throttled_get(client, url, build_headers(clearance.user_agent, extra_headers))
+    check_response(url, response)
+    response.raise_for_status()
+    return response
+
 def make_request_with_playwright(url):
-    """Make request using Playwright to bypass blocks"""
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        
-        try:
-            page.goto(url, timeout=30000)
-            content = page.content()
-            browser.close()
-            return MockResponse(content)
-        except Exception as e:
-            browser.close()
-            raise Exception(f"Playwright request failed: {str(e)}")
+    """Make request using a pooled Playwright browser to bypass blocks"""
+    METRICS.inc('playwright_fallbacks')
+    try:
+        with METRICS.timer('render'):
+            content = get_browser_pool().fetch(url, timeout=30000)
+        return MockResponse(content)
+    except Exception as e:
+        raise Exception(f"Playwright request failed: {str(e)}")
 
 class MockResponse:
     """Mock response object for Playwright content"""
     def __init__(self, content):
         self.content = content.encode('utf-8')
         self.status_code = 200
+        self.headers = {}
+
+def parse_store(content):
+    """Extract store details from a store page"""
+    with METRICS.timer('parse'):
+        return store_parser.parse_store(content, PARSER_ENGINE)
+
+def log_parse_report():
+    """Log the mean parse time per page for each parser engine used"""
+    for engine, (pages, mean_ms) in store_parser.PARSE_STATS.report().items():
+        logging.info(f"Parsed {pages} pages with {engine}: {mean_ms:.2f} ms/page")
 
 def scrape_store(store_url):
     """Scrape individual store details"""
     response = make_request(store_url)
-    soup = BeautifulSoup(response.content, 'html.parser')
-    
-    # Extract store details
-    store_data = {
-        'name': soup.find('h1').text.strip(),
-        'address': soup.select_one('.store-address').text.strip(),
-        'phone': soup.select_one('.store-phone').text.strip(),
-        'website': soup.select_one('.store-website')['href'] if soup.select_one('.store-website') else None
-    }
-    return store_data
+    return parse_store(response.content)
 
-def scrape_all_stores():
-    """Main function to scrape all stores with checkpointing"""
-    # Clean up old checkpoints before starting
-    cleanup_old_checkpoints()
+_metadata_store = None
+_metadata_store_lock = threading.Lock()
+
+def get_metadata_store():
+    """Get the per-URL crawl metadata store, opening it on first use"""
+    global _metadata_store
+    with _metadata_store_lock:
+        if _metadata_store is None:
+            _metadata_store = UrlMetadataStore(METADATA_DB)
+        return _metadata_store
+
+def scrape_store_incremental(store_url):
+    """Scrape a store, skipping parsing when its page has not changed since the last run
+
+    Returns (store_data, status, validators) where status is 'new', 'changed'
+    or 'unchanged'. Nothing is written to the metadata store here: the caller
+    saves validators (None after a 304) once the store itself is persisted.
+    """
+    metadata_store = get_metadata_store()
+    metadata = metadata_store.get(store_url)
+    response = make_request(store_url, metadata_store.conditional_headers(metadata))
     
-    # Check for existing checkpoint
-    checkpoint_file = get_latest_checkpoint()
-    if checkpoint_file:
-        logging.info(f"Resuming from checkpoint: {checkpoint_file}")
-        with open(checkpoint_file, 'r') as f:
-            data = json.load(f)
-        stores = data['stores']
-        start_index = data['last_index'] + 1
+    if response.status_code == 304:
+        return metadata['record'], 'unchanged', None
+    
+    content_hash = content_fingerprint(response.content)
+    if metadata and metadata['record'] is not None and metadata['content_hash'] == content_hash:
+        store_data = metadata['record']
     else:
-        logging.info("Starting new scrape session")
-        stores = []
-        start_index = 0
+        store_data = parse_store(response.content)
+    
+    validators = {
+        'content_hash': content_hash,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified')
+    }
+    return store_data, change_status(metadata, content_hash), validators
+
+def parse_store_links(content):
+    """Extract absolute store URLs from listings page markup"""
+    return [urljoin(BASE_URL, link) for link in store_parser.parse_store_links(content, PARSER_ENGINE)]
+
+def get_store_links():
+    """Collect absolute store URLs from the listings page using the configured engine"""
+    cache = get_response_cache()
+    cached = cache.get(BASE_URL) if cache is not None else None
+    if cached is not None:
+        logging.info("Using cached listings page")
+        return parse_store_links(cached.content)
+    if cache is not None and cache.replay_only:
+        raise CacheMiss(f"Listings page not cached: {BASE_URL}")
     
-    # Get list of store URLs using Selenium to handle JavaScript rendering and bypass Cloudflare
+    if ENGINE in ('http', 'playwright'):
+        try:
+            if ENGINE == 'playwright':
+                response = make_request_with_playwright(BASE_URL)
+            else:
+                response = fetch_url(BASE_URL)
+            store_links = parse_store_links(response.content)
+            if store_links:
+                logging.info(f"Found {len(store_links)} stores to scrape")
+                # Only cache a page that has the listings, not a shell still waiting for its scripts
+                if cache is not None:
+                    cache.put(BASE_URL, response)
+                return store_links
+            logging.info("No store links in the listings page, rendering it with Selenium")
+        except Exception as e:
+            logging.warning(f"Could not load the listings page, rendering it with Selenium: {str(e)}")
+    return get_store_links_with_selenium()
+
+def get_store_links_with_selenium():
+    """Collect store URLs using Selenium to handle JavaScript rendering and bypass Cloudflare"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import TimeoutException
+
+    cache = get_response_cache()
     options = Options()
     options.add_argument("--headless")
     options.add_argument("--disable-blink-features=AutomationControlled")
@@ -217,21 +532,32 @@ def scrape_all_stores():
     
     try:
         driver = webdriver.Chrome(options=options)
+        policy = get_resource_policy()
+        if policy is not None:
+            policy.apply_to_driver(driver)
         driver.get(BASE_URL)
         
-        # Handle Cloudflare challenge if present
-        try:
-            challenge_element = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, '#challenge-running'))
-            )
+        # Handle Cloudflare challenge if present; other blocks do not clear by waiting
+        kind = classify_page(driver)
+        if kind == CHALLENGE:
             logging.info("Cloudflare challenge detected, waiting for completion...")
-            # Solve the challenge automatically if possible
-            WebDriverWait(driver, 60).until(
-                EC.staleness_of(challenge_element)
+            try:
+                WebDriverWait(driver, 60).until(lambda d: classify_page(d) != CHALLENGE)
+                logging.info("Cloudflare challenge completed")
+            except TimeoutException:
+                logging.warning("Cloudflare challenge did not clear in time")
+            kind = classify_page(driver)
+        if kind in BLOCK_KINDS:
+            raise PageBlocked(BASE_URL, kind, route(kind, rendered=True))
+
+        # The listing cards are fetched by XHR after the page loads
+        from page_readiness import all_of, network_idle, selector_present
+        try:
+            WebDriverWait(driver, 30, poll_frequency=0.2).until(
+                all_of(selector_present(By.CSS_SELECTOR, 'div.store-listing > a'), network_idle())
             )
-            logging.info("Cloudflare challenge completed")
         except TimeoutException:
-            logging.info("No Cloudflare challenge detected")
+            logging.warning("Store listings did not finish loading in time, reading what is available")
         
         # Save initial state
         try:
@@ -240,11 +566,16 @@ def scrape_all_stores():
         except Exception as e:
             logging.warning(f"Could not save initial screenshot: {str(e)}")
         
+        if policy is not None:
+            policy.record_driver_page(driver)
+        
         # Extract store links
         try:
             store_links = driver.find_elements(By.CSS_SELECTOR, 'div.store-listing > a')
             store_links = [link.get_attribute('href') for link in store_links]
             logging.info(f"Found {len(store_links)} stores to scrape")
+            if cache is not None:
+                cache.put(BASE_URL, MockResponse(driver.page_source))
         except Exception as e:
             logging.error(f"Failed to extract store links: {str(e)}")
             raise
@@ -255,62 +586,226 @@ def scrape_all_stores():
         raise
     
     # Convert relative URLs to absolute
-    store_links = [urljoin(BASE_URL, link) for link in store_links]
+    return [urljoin(BASE_URL, link) for link in store_links]
+
+def scrape_all_stores(sink=None):
+    """Main function to scrape all stores with checkpointing
+
+    When a result sink is given, each store is written to it as soon as it is
+    scraped instead of being kept in memory, and the returned list is empty.
+    """
+    # Clean up old checkpoints before starting
+    cleanup_old_checkpoints()
     
-    total_stores = len(store_links)
-    logging.info(f"Found {total_stores} stores to scrape")
+    # The crawl budget counts from here
+    scheduler = CrawlScheduler(
+        get_metadata_store() if INCREMENTAL_CRAWL and SCHEDULE_CRAWL else None,
+        CRAWL_BUDGET_SECONDS, MIN_CHANGE_PROBABILITY, MAX_REVISIT_DAYS
+    )
     
-    for i in range(start_index, total_stores):
-        try:
-            store_url = store_links[i]
-            logging.info(f"Scraping store {i+1}/{total_stores}: {store_url}")
-            
-            store_data = scrape_store(store_url)
-            stores.append(store_data)
-            
-            # Save checkpoint every CHECKPOINT_INTERVAL stores
-            if (i + 1) % CHECKPOINT_INTERVAL == 0:
-                save_checkpoint({
-                    'stores': stores,
-                    'last_index': i
-                }, i + 1)
-                
-        except Exception as e:
-            logging.error(f"Failed to scrape store {i+1}: {str(e)}")
+    # Metadata of fetched stores is saved by the journal commit that persists them
+    pending_metadata = PendingMetadataUpdates(get_metadata_store()) if INCREMENTAL_CRAWL else None
+    
+    # Check for existing checkpoint
+    journal = open_checkpoint_journal(pending_metadata.flush if pending_metadata is not None else None)
+    records, state = journal.load()
+    if state and state.get('complete'):
+        # Only an interrupted crawl is resumed; after a finished one every store is due again
+        logging.info("Previous crawl completed, discarding its checkpoint journal")
+        journal.reset()
+        records, state = [], None
+    frontier = UrlFrontier(URL_FRONTIER_DB)
+    stores = []
+    delta = {'new': [], 'changed': []}
+    for record in records:
+        store = StoreRecord.from_dict(record['store'], url=record.get('url', ''))
+        if sink is not None:
+            sink.write(store)
+        else:
+            stores.append(store)
+        if record.get('status') in delta:
+            delta[record['status']].append(record['store'])
+    if state:
+        logging.info(f"Resuming from checkpoint journal with {len(records)} stores")
+        # The journal is the source of truth for what was saved
+        frontier.sync_done(record['url'] for record in records if record.get('url'))
+        frontier.requeue_failed(MAX_STORE_ATTEMPTS)
+    else:
+        logging.info("Starting new scrape session")
+        frontier.reset()
+    
+    store_links = get_store_links()
+    logging.info(f"Found {len(store_links)} store links, {frontier.add(store_links)} not seen before")
+    
+    # Only pending URLs are fetched, so a resume is correct however the listing reorders
+    pending, deferred = scheduler.plan(frontier.pending())
+    start_index = len(records)
+    total_stores = start_index + len(deferred) + len(pending)
+    logging.info(f"Found {len(pending)} stores to scrape")
+    
+    def save_store(i, store_url, store_data, status):
+        with METRICS.timer('persist'):
+            store = StoreRecord.from_dict(store_data, url=store_url)
+            if sink is not None:
+                sink.write(store)
+            else:
+                stores.append(store)
+
+            # Journal every store; it is committed every CHECKPOINT_INTERVAL stores
+            journal.append({'index': i, 'url': store_url, 'store': store_data, 'status': status},
+                           state={'last_index': i})
+        frontier.mark_done(store_url)
+    
+    # Deferred stores keep the record of the run that last fetched them
+    for offset, store_url in enumerate(deferred):
+        save_store(start_index + offset, store_url, get_metadata_store().get(store_url)['record'], 'deferred')
+    start_index += len(deferred)
+    
+    fetcher = ConcurrentFetcher(MAX_CONCURRENCY, PER_HOST_CONCURRENCY)
+    fetch = scrape_store_incremental if INCREMENTAL_CRAWL else scrape_store
+    
+    def fetch_store(store_url):
+        """Fetch a store unless it is already done or being fetched; None when it is skipped"""
+        scheduler.check_budget(store_url)
+        if not frontier.claim(store_url):
+            logging.info(f"Skipping already scraped store: {store_url}")
+            return None
+        return fetch(store_url)
+    
+    results = fetcher.fetch_ordered(pending, fetch_store)
+    unchanged = 0
+    over_budget = 0
+    failed = 0
+    for offset, store_url, result, error in results:
+        i = start_index + offset
+        if isinstance(error, CrawlBudgetExceeded):
+            over_budget += 1
             continue
+        if error is not None:
+            failed += 1
+            METRICS.inc('store_errors')
+            frontier.mark_failed(store_url, error)
+            logging.error(f"Failed to scrape store {i+1}: {str(error)}")
+            continue
+        if result is None:
+            continue
+
+        if INCREMENTAL_CRAWL:
+            store_data, status, validators = result
+            if status == 'unchanged':
+                unchanged += 1
+            else:
+                delta[status].append(store_data)
+            if validators is None:
+                pending_metadata.mark_unchanged(store_url)
+            else:
+                pending_metadata.update(store_url, record=store_data, **validators)
+        else:
+            store_data, status = result, None
+
+        logging.info(f"Scraped store {i+1}/{total_stores}: {store_url}")
+        METRICS.inc('stores_scraped')
+        save_store(i, store_url, store_data, status)
     
-    # Final save after completion
-    save_checkpoint({
-        'stores': stores,
-        'last_index': total_stores - 1
-    }, total_stores)
+    if over_budget:
+        logging.warning(f"Crawl budget of {CRAWL_BUDGET_SECONDS}s used up; "
+                        f"{over_budget} stores are left pending for the next run")
+    scheduler.log_stats()
     
+    if INCREMENTAL_CRAWL:
+        logging.info(f"Incremental crawl: {len(delta['new'])} new, "
+                     f"{len(delta['changed'])} changed, {unchanged} unchanged stores")
+        save_delta(delta)
+    
+    get_http_client().log_pool_stats()
+    if get_rate_limiter() is not None:
+        get_rate_limiter().log_metrics()
+    log_parse_report()
+    if get_response_cache() is not None:
+        get_response_cache().log_stats()
+    if get_resource_policy() is not None:
+        get_resource_policy().stats.log_report()
+    frontier.log_stats()
+    frontier.close()
+    close_browser_pool()
+    
+    # Final save after completion; a run that left stores pending or failed is resumed next time
+    journal.commit(state={'last_index': total_stores - 1, 'complete': not (over_budget or failed)})
+    journal.close()
+    
+    report_metrics()
     return stores
 
+def report_metrics():
+    """Log per-stage timings and write them out in METRICS_FORMAT if set"""
+    limiter = get_rate_limiter()
+    if limiter is not None:
+        for host, host_metrics in limiter.metrics().items():
+            METRICS.set_gauge(f'rate_limit_rps{{host="{host}"}}', host_metrics['rate'])
+            METRICS.set_gauge(f'rate_limit_concurrency{{host="{host}"}}', host_metrics['concurrency'])
+    METRICS.report(METRICS_FORMAT, METRICS_FILE)
+
+def result_base_path():
+    """Base path of this run's result files"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return f'cannabis_stores_{timestamp}'
+
+def open_result_sinks(base_path=None, formats=None):
+    """Open streaming writers for this run's result files"""
+    return open_sinks(base_path or result_base_path(), formats or RESULT_FORMATS, STORE_FIELDS)
+
 def save_results(stores):
-    """Save scraped data to JSON and CSV files"""
+    """Save scraped data to the configured result formats"""
+    sink = open_result_sinks()
+    for store in stores:
+        sink.write(store)
+    sink.finalize()
+
+def save_delta(delta):
+    """Save new and changed stores from an incremental crawl to a JSON file"""
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    
-    # Save to JSON
-    json_file = f'cannabis_stores_{timestamp}.json'
-    with open(json_file, 'w') as f:
-        json.dump(stores, f, indent=2)
-    logging.info(f"Saved results to {json_file}")
-    
-    # Save to CSV
-    csv_file = f'cannabis_stores_{timestamp}.csv'
-    with open(csv_file, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=['name', 'address', 'phone', 'website'])
-        writer.writeheader()
-        writer.writerows(stores)
-    logging.info(f"Saved results to {csv_file}")
+    delta_file = f'cannabis_stores_delta_{timestamp}.json'
+    with open(delta_file, 'w') as f:
+        json.dump(delta, f, indent=2)
+    logging.info(f"Saved delta of {len(delta['new']) + len(delta['changed'])} stores to {delta_file}")
 
-if __name__ == '__main__':
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape cannabis store listings from AskMaryJ.com")
+    parser.add_argument(
+        '--engine', choices=list(SCRAPER_ENGINES), default=ENGINE,
+        help='; '.join(f"{name}: {description}" for name, description in SCRAPER_ENGINES.items())
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    global ENGINE
+    args = parse_args(argv)
+    setup_logging()
+    ENGINE = args.engine
+    logging.info(f"Using the {ENGINE} engine")
+
+    if ENGINE == 'uc':
+        from cannabis_scraper_improved import CannabisScraper
+        CannabisScraper().scrape_stores()
+        return
+
+    # Stores are streamed as scraped; duplicates are only known once every store is in,
+    # so normalizing rewrites the finished files from the streamed JSONL
+    base_path = result_base_path()
+    formats = streaming_formats(RESULT_FORMATS) if NORMALIZE_RESULTS else RESULT_FORMATS
+    sink = open_result_sinks(base_path, formats)
     try:
-        stores = scrape_all_stores()
-        save_results(stores)
+        scrape_all_stores(sink)
+        sink.finalize()
+        if NORMALIZE_RESULTS:
+            normalize_result_files(base_path, RESULT_FORMATS, STORE_FIELDS)
         logging.info("Scraping completed successfully")
     except KeyboardInterrupt:
+        sink.close()
         logging.info("Scraping interrupted by user")
     except Exception as e:
+        sink.close()
         logging.error(f"Scraping failed: {str(e)}")
+
+if __name__ == '__main__':
+    main()
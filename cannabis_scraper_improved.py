@@ -1,178 +1,90 @@
 from packaging import version
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import time
-import csv
 import json
-import os
 import logging
-from datetime import datetime
-from selenium.common.exceptions import TimeoutException
-
-class CannabisScraper:
-    def __init__(self):
-        self.base_url = "https://askmaryj.com/en-za/listings/cannabis"
-        self.stores = []
-        self.checkpoint_interval = 10
-        self.max_retries = 3
-        self.checkpoint_dir = "checkpoints"
-        self.setup_logging()
-        
-    def setup_logging(self):
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('scraper.log'),
-                logging.StreamHandler()
-            ]
-        )
-        
-    def setup_driver(self):
-        options = uc.ChromeOptions()
-        
-        # Basic options
-        options.add_argument('--no-first-run')
-        options.add_argument('--no-service-autorun')
-        options.add_argument('--password-store=basic')
-        options.add_argument('--disable-blink-features=AutomationControlled')
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument('--disable-gpu')
-        options.add_argument('--headless')
-        options.add_argument('--window-size=1920,1080')
-        
-        # Advanced anti-detection options
-        options.add_argument('--disable-web-security')
-        options.add_argument('--disable-blink-features=AutomationControlled')
-        options.add_argument('--disable-infobars')
-        options.add_argument('--disable-popup-blocking')
-        options.add_argument('--disable-notifications')
-        options.add_argument('--disable-extensions')
-        options.add_argument('--disable-default-apps')
-        options.add_argument('--disable-component-update')
-        options.add_argument('--disable-background-networking')
-        options.add_argument('--disable-background-timer-throttling')
-        options.add_argument('--disable-backgrounding-occluded-windows')
-        options.add_argument('--disable-breakpad')
-        options.add_argument('--disable-client-side-phishing-detection')
-        options.add_argument('--disable-component-update')
-        options.add_argument('--disable-domain-reliability')
-        options.add_argument('--disable-features=AudioServiceOutOfProcess')
-        options.add_argument('--disable-hang-monitor')
-        options.add_argument('--disable-ipc-flooding-protection')
-        options.add_argument('--disable-renderer-backgrounding')
-        options.add_argument('--disable-sync')
-        options.add_argument('--force-color-profile=srgb')
-        options.add_argument('--metrics-recording-only')
-        options.add_argument('--safebrowsing-disable-auto-update')
-        options.add_argument('--enable-automation')
-        options.add_argument('--disable-browser-side-navigation')
-        options.add_argument('--disable-webgl')
-        options.add_argument('--disable-threaded-animation')
-        options.add_argument('--disable-threaded-scrolling')
-        options.add_argument('--disable-in-process-stack-traces')
-        options.add_argument('--disable-logging')
-        options.add_argument('--disable-dev-shm-usage')
-        options.add_argument('--disable-remote-fonts')
-        options.add_argument('--disable-software-rasterizer')
-        options.add_argument('--disable-canvas-aa')
-        options.add_argument('--disable-2d-canvas-clip-aa')
-        options.add_argument('--disable-gl-drawing-for-tests')
-        options.add_argument('--disable-accelerated-2d-canvas')
-        options.add_argument('--disable-accelerated-jpeg-decoding')
-        options.add_argument('--disable-accelerated-mjpeg-decode')
-        options.add_argument('--disable-accelerated-video-decode')
-        options.add_argument('--disable-partial-raster')
-        options.add_argument('--disable-permissions-api')
-        options.add_argument('--disable-speech-api')
-        options.add_argument('--disable-webgl2')
-        options.add_argument('--disable-webrtc')
-        options.add_argument('--disable-webrtc-hw-encoding')
-        options.add_argument('--disable-webrtc-hw-decoding')
-        options.add_argument('--disable-webrtc-encryption')
-        options.add_argument('--disable-webrtc-stun-origin')
-        options.add_argument('--disable-webrtc-stun-proxy')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp')
-        options.add_argument('--disable-webrtc-stun-proxy-fallback-to-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-tcp-udp-t
-from packaging import version
-import undetected_chromedriver as uc
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import time
-import csv
-import json
 import os
-import logging
-from datetime import datetime
+import queue
+import threading
 from selenium.common.exceptions import TimeoutException
+from block_detector import BLOCK_KINDS, OK, RETRY, PageBlocked, classify_page, route
+from api_discovery import discover_endpoints, enable_performance_logging, load_endpoints, replay_endpoint, save_endpoints
+from browser_lifecycle import BrowserLifecycle, reap_orphaned_drivers
+from checkpoint_journal import CheckpointJournal
+from http_client import HttpClient
+from metrics import METRICS
+from crawl_scheduler import CrawlScheduler
+from crawl_state import PendingMetadataUpdates, UrlMetadataStore, change_status, record_fingerprint
+from page_readiness import (PageReadiness, all_of, cloudflare_cleared, document_ready, network_idle, ready_or_blocked,
+                            selector_present)
+from resource_blocking import ResourcePolicy
+from result_sinks import open_sinks
+from store_record import StoreRecord
+from store_pipeline import StorePipeline, normalize_result_files, streaming_formats
+from url_frontier import UrlFrontier
+
+STORE_FIELDS = ['name', 'address', 'phone', 'social_media', 'additional_info', 'url']
+
+# Reads every listing card in one WebDriver call, using the same selectors as the detail page
+CARD_EXTRACTION_SCRIPT = """
+var text = function(root, selector) {
+    var el = root.querySelector(selector);
+    return el ? (el.innerText || el.textContent || '').trim() : '';
+};
+var cards = document.getElementsByClassName('listing-cardboard');
+return Array.prototype.map.call(cards, function(card) {
+    var link = card.querySelector('a');
+    var socials = card.querySelectorAll("a[href*='instagram'], a[href*='facebook']");
+    return {
+        name: text(card, '.listing-title'),
+        address: text(card, "[class*='address']"),
+        phone: text(card, "[class*='phone']"),
+        social_media: Array.prototype.map.call(socials, function(a) { return a.href; }).join(', '),
+        additional_info: '',
+        url: link ? link.href : ''
+    };
+});
+"""
 
 class CannabisScraper:
-    def __init__(self):
+    def __init__(self, detail_workers=1, card_extraction=False, stream_results=False, discover_api=False):
         self.base_url = "https://askmaryj.com/en-za/listings/cannabis"
         self.stores = []
+        self.store_count = 0
         self.checkpoint_interval = 10
         self.max_retries = 3
+        self.max_pages = 13  # Listing pages to crawl
         self.checkpoint_dir = "checkpoints"
+        self.journal = None
+        self.frontier_db = "checkpoints/cannabis_scraper_frontier.db"  # Store URLs already scraped this session
+        self.frontier = None
+        self.failed_stores = 0  # Stores that failed this run; the crawl is resumed until there are none
+        self._failed_lock = threading.Lock()  # Detail worker threads count their failures concurrently
+        self.stream_results = stream_results  # Write stores to the result files as they are scraped
+        self.result_formats = ['csv', 'json']
+        self.normalize_results = True  # Normalize phones and addresses and merge duplicates before saving
+        self.sink = None
+        self.detail_workers = detail_workers  # Drivers scraping store pages in parallel
+        self.detail_drivers = []  # BrowserLifecycle per detail worker
+        self.browser = None  # BrowserLifecycle of the listing driver
+        self.browser_max_pages = 100  # Pages a driver loads before it is replaced
+        self.browser_max_rss_mb = 700  # Replace a driver whose Chrome processes use more memory than this
+        self.browser_max_tabs = 4
+        self.card_extraction = card_extraction  # Read stores from listing cards, visit detail pages only to fill gaps
+        self.card_required_fields = ('name', 'address', 'phone')
+        self.discover_api = discover_api  # Record the JSON endpoints behind the listing cards for scrape_stores_via_api
+        self.api_endpoints_file = "api_endpoints.json"
+        self.incremental = True  # Track changes against previous runs and write a delta
+        self.metadata_db = "crawl_state.db"
+        self.metadata = None
+        self.pending_metadata = None  # Metadata updates waiting for the journal commit of their stores
+        self.delta = {'new': [], 'changed': []}
+        self.schedule_crawl = True  # Visit new stores first, then by how often they changed; needs incremental
+        self.crawl_budget_seconds = None  # Stop visiting stores after this long, leaving the rest for the next run
+        self.scheduler = None
+        self.readiness = PageReadiness()
+        self.resource_policy = ResourcePolicy()  # Images, fonts, media and trackers are not downloaded; None loads everything
+        self.metrics_format = None  # 'prometheus' or 'json' to write scraper_metrics.* after a crawl
         self.setup_logging()
         
     def setup_logging(self):
@@ -245,195 +157,637 @@ class CannabisScraper:
         options.add_argument('--disable-webrtc-hw-encoding')
         options.add_argument('--disable-webrtc-hw-decoding')
         options.add_argument('--disable-webrtc-encryption')
+
+        if self.discover_api:
+            enable_performance_logging(options)
         
-        return uc.Chrome(
+        driver = uc.Chrome(
             browser_executable_path='C:/Program Files/Google/Chrome/Application/chrome.exe',
             options=options
         )
+        if self.resource_policy is not None:
+            self.resource_policy.apply_to_driver(driver)
+        return driver
 
-    def save_checkpoint(self):
-        if not os.path.exists(self.checkpoint_dir):
-            os.makedirs(self.checkpoint_dir)
-            
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        checkpoint_file = os.path.join(self.checkpoint_dir, f'checkpoint_{timestamp}.json')
-        
-        with open(checkpoint_file, 'w') as f:
-            json.dump({
-                'stores': self.stores,
-                'timestamp': timestamp
-            }, f)
-            
-        logging.info(f"Checkpoint saved: {checkpoint_file}")
+    def new_browser(self, name):
+        """Lifecycle manager for a driver that passes the Cloudflare challenge on every launch"""
+        return BrowserLifecycle(
+            self.setup_driver,
+            on_launch=self.open_site,
+            max_pages=self.browser_max_pages,
+            max_rss_mb=self.browser_max_rss_mb,
+            max_tabs=self.browser_max_tabs,
+            name=name
+        )
+
+    def record_resources(self, driver):
+        """Add the page loaded in driver to the request blocking stats"""
+        if self.resource_policy is not None:
+            self.resource_policy.record_driver_page(driver)
+
+    def open_site(self, driver):
+        """Load the listings page and wait for the Cloudflare challenge"""
+        with METRICS.timer('render'):
+            driver.get(self.base_url)
+        try:
+            # Wait for the Cloudflare challenge to clear instead of a fixed 10s sleep
+            self.readiness.wait(driver, 'site', all_of(document_ready, cloudflare_cleared), baseline=10)
+        except TimeoutException:
+            logging.warning("Site did not clear the Cloudflare challenge in time")
+        self.record_resources(driver)
+
+    def wait_for_network_idle(self, driver, name):
+        """Wait for the XHR requests that fill in a rendered page to finish
+
+        A page that keeps polling is used as it is once the wait times out.
+        """
+        try:
+            self.readiness.wait(driver, f'{name}_network', network_idle(), baseline=0)
+        except TimeoutException:
+            logging.warning(f"Requests on the {name} page did not settle in time, reading it as it is")
+
+    def extract_store_details(self, driver, url):
+        """Load a store page in the current window and extract its details"""
+        store_info = {
+            'name': '',
+            'address': '',
+            'phone': '',
+            'social_media': '',
+            'additional_info': '',
+            'url': url
+        }
+
+        with METRICS.timer('render'):
+            driver.get(url)
+        try:
+            self.readiness.wait(
+                driver, 'store',
+                ready_or_blocked(all_of(cloudflare_cleared, selector_present(By.CLASS_NAME, "listing-title"))),
+                baseline=3
+            )
+        except TimeoutException:
+            logging.warning(f"Store page not ready, extracting what is available: {url}")
+        else:
+            # The title renders before the XHR that brings in the contact details has returned
+            self.wait_for_network_idle(driver, 'store')
+        self.record_resources(driver)
+
+        # A block page has none of the fields, so fail the store instead of saving it empty
+        kind = classify_page(driver)
+        if kind != OK:
+            METRICS.inc(f'{kind}_pages')
+            raise PageBlocked(url, kind, route(kind, rendered=True))
+
+        with METRICS.timer('parse'):
+            self._read_store_fields(driver, store_info)
+        return store_info
+
+    def _read_store_fields(self, driver, store_info):
+        """Fill store_info from the store page loaded in driver"""
+        try:
+            title = driver.find_element(By.CLASS_NAME, "listing-title")
+            store_info['name'] = title.text.strip()
+        except:
+            logging.warning("Could not find store name")
+
+        try:
+            address = driver.find_element(By.CSS_SELECTOR, "[class*='address']")
+            store_info['address'] = address.text.strip()
+        except:
+            logging.warning("Could not find address")
+
+        try:
+            phone = driver.find_element(By.CSS_SELECTOR, "[class*='phone']")
+            store_info['phone'] = phone.text.strip()
+        except:
+            logging.warning("Could not find phone")
+
+        try:
+            social_links = driver.find_elements(By.CSS_SELECTOR, "a[href*='instagram'], a[href*='facebook']")
+            store_info['social_media'] = ', '.join([link.get_attribute('href') for link in social_links])
+        except:
+            logging.warning("Could not find social media")
+
+    def start_detail_drivers(self, count):
+        """Start extra drivers for parallel detail scraping, reusing ones already open"""
+        # undetected_chromedriver patches its binary on start, so launch one at a time
+        while len(self.detail_drivers) < count:
+            logging.info(f"Starting detail driver {len(self.detail_drivers) + 1}/{count}")
+            browser = self.new_browser(f"detail browser {len(self.detail_drivers) + 1}")
+            self.detail_drivers.append(browser)
+            browser.driver
+
+    def quit_detail_drivers(self):
+        for browser in self.detail_drivers:
+            try:
+                browser.log_stats()
+                browser.close()
+            except Exception as e:
+                logging.warning(f"Error closing detail driver: {str(e)}")
+        self.detail_drivers = []
+
+    def claim_store(self, url):
+        """False when url was already scraped (or is being scraped) this session"""
+        if self.frontier is None or self.frontier.claim(url):
+            return True
+        logging.info(f"Skipping already scraped store: {url}")
+        return False
+
+    def store_failed(self, url, error):
+        with self._failed_lock:
+            self.failed_stores += 1
+        if self.frontier is not None:
+            self.frontier.mark_failed(url, error)
+
+    def budget_exhausted(self):
+        return self.scheduler is not None and self.scheduler.expired()
+
+    def card_links(self, store_cards):
+        """Read the store link of each listing card"""
+        store_urls = []
+        for card in store_cards:
+            try:
+                store_urls.append(card.find_element(By.TAG_NAME, "a").get_attribute('href'))
+            except Exception as e:
+                logging.error(f"Error reading store card link: {str(e)}")
+        return store_urls
+
+    def schedule_stores(self, store_urls):
+        """Claim store URLs and return the ones to visit, most likely to have changed first
+
+        Stores the scheduler defers are saved from the record of the run that last visited them.
+        """
+        store_urls = [url for url in store_urls if self.claim_store(url)]
+        if self.scheduler is None:
+            return store_urls
+        due, deferred = self.scheduler.plan(store_urls)
+        for url in deferred:
+            self.track_store(dict(self.metadata.get(url)['record'], url=url), carried_over=True)
+        return due
+
+    def _detail_worker(self, browser, work, results):
+        while not self.budget_exhausted():
+            try:
+                index, url = work.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                logging.info(f"Processing store {index+1}/{len(results)}: {url}")
+                # Store pages carry no state between them, so the driver can be replaced before any of them
+                driver = browser.recycle_if_needed()
+                browser.page_loaded()
+                results[index] = self.extract_store_details(driver, url)
+                logging.info(f"Successfully processed: {results[index]['name']}")
+            except Exception as e:
+                logging.error(f"Error processing store {url}: {str(e)}")
+                self.store_failed(url, e)
+
+    def scrape_store_details(self, store_urls):
+        """Scrape store pages across detail_workers drivers, keeping the order of store_urls"""
+        if not store_urls:
+            return []
+
+        workers = min(self.detail_workers, len(store_urls))
+        self.start_detail_drivers(workers)
+
+        work = queue.Queue()
+        for index, url in enumerate(store_urls):
+            work.put((index, url))
+        results = [None] * len(store_urls)
+
+        threads = [
+            threading.Thread(target=self._detail_worker, args=(browser, work, results))
+            for browser in self.detail_drivers[:workers]
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return [store_info for store_info in results if store_info is not None]
+
+    def extract_store_details_in_tab(self, driver, url):
+        """Scrape a store page in a new tab and return to the listing tab"""
+        driver.execute_script('window.open()')
+        driver.switch_to.window(driver.window_handles[-1])
+        if self.browser is not None:
+            self.browser.page_loaded()
+        try:
+            return self.extract_store_details(driver, url)
+        finally:
+            # Close store tab and return to main page
+            driver.close()
+            driver.switch_to.window(driver.window_handles[0])
+
+    def scrape_page_serial(self, driver, store_cards):
+        """Scrape the stores of a listing page in a new tab each, one at a time"""
+        store_urls = self.schedule_stores(self.card_links(store_cards))
+        for i, url in enumerate(store_urls):
+            if self.budget_exhausted():
+                break
+            try:
+                # Navigate to store page
+                logging.info(f"\nProcessing store {i+1}/{len(store_urls)}: {url}")
+                store_info = self.extract_store_details_in_tab(driver, url)
+
+                self.track_store(store_info)
+                logging.info(f"Successfully processed: {store_info['name']}")
+
+                # Save checkpoint every N stores
+                if (i + 1) % self.checkpoint_interval == 0:
+                    self.save_checkpoint()
+
+            except Exception as e:
+                logging.error(f"Error processing store {url}: {str(e)}")
+                self.store_failed(url, e)
+
+    def scrape_page_parallel(self, store_cards):
+        """Collect the card links of a listing page, then scrape them on several drivers"""
+        store_urls = self.schedule_stores(self.card_links(store_cards))
+        for store_info in self.scrape_store_details(store_urls):
+            self.track_store(store_info)
+        self.save_checkpoint()
+
+    def extract_cards(self, driver):
+        """Read the store fields of every listing card on the page in one script call"""
+        with METRICS.timer('parse'):
+            cards = driver.execute_script(CARD_EXTRACTION_SCRIPT) or []
+        return [card for card in cards if card.get('url')]
+
+    def scrape_page_from_cards(self, driver):
+        """Build stores from the listing cards, fetching detail pages only for missing fields"""
+        cards = [card for card in self.extract_cards(driver) if self.claim_store(card['url'])]
+        card_hashes = {card['url']: record_fingerprint(card) for card in cards}
+
+        incomplete = []
+        for card in cards:
+            if all(card[field] for field in self.card_required_fields):
+                continue
+            # A card identical to last run's can reuse last run's detail fields
+            previous = self.metadata.get(card['url']) if self.metadata else None
+            if previous and previous['record'] and previous['content_hash'] == card_hashes[card['url']]:
+                card.update(previous['record'])
+                continue
+            incomplete.append(card)
+        if self.scheduler is not None:
+            # Detail pages unlikely to have changed are not visited; last run's detail fields fill the gaps
+            due, deferred = self.scheduler.plan([card['url'] for card in incomplete])
+            cards_by_url = {card['url']: card for card in incomplete}
+            for url in deferred:
+                card = cards_by_url[url]
+                for field, value in self.metadata.get(url)['record'].items():
+                    if not card.get(field):
+                        card[field] = value
+            incomplete = [cards_by_url[url] for url in due]
+        logging.info(f"Read {len(cards)} stores from listing cards, "
+                     f"{len(incomplete)} need their detail page")
+
+        if self.detail_workers > 1:
+            details = self.scrape_store_details([card['url'] for card in incomplete])
+        else:
+            details = []
+            for card in incomplete:
+                if self.budget_exhausted():
+                    break
+                try:
+                    details.append(self.extract_store_details_in_tab(driver, card['url']))
+                except Exception as e:
+                    logging.error(f"Error processing store {card['url']}: {str(e)}")
+                    self.store_failed(card['url'], e)
+
+        details_by_url = {store_info['url']: store_info for store_info in details}
+        for card in incomplete:
+            store_info = details_by_url.get(card['url'])
+            if store_info is None:
+                continue
+            for field, value in store_info.items():
+                if not card.get(field):
+                    card[field] = value
+
+        for card in cards:
+            self.track_store(card, content_hash=card_hashes[card['url']])
+        self.save_checkpoint()
+
+    def track_store(self, store_info, content_hash=None, carried_over=False):
+        """Add a scraped store and note whether it is new or changed since the last run
+
+        Stores carried over from the last run without a visit keep their crawl history.
+        """
+        METRICS.inc('stores_deferred' if carried_over else 'stores_scraped')
+        with METRICS.timer('persist'):
+            self._persist_store(store_info, content_hash, carried_over)
+
+    def _persist_store(self, store_info, content_hash, carried_over=False):
+        # Results are kept as compact records; the journal and metadata still get the dict
+        record = StoreRecord.from_dict(store_info)
+        if self.sink is not None:
+            self.sink.write(record)
+        else:
+            self.stores.append(record)
+        self.store_count += 1
+        if self.metadata is not None and not carried_over:
+            # Queued before the journal append, so the commit that persists the store applies it
+            content_hash = content_hash or record_fingerprint(store_info)
+            status = change_status(self.metadata.get(store_info['url']), content_hash)
+            self.pending_metadata.update(store_info['url'], content_hash, store_info)
+            if status != 'unchanged':
+                self.delta[status].append(store_info)
+        if self.journal is not None:
+            self.journal.append(store_info)
+        elif self.pending_metadata is not None:
+            self.pending_metadata.flush()
+        if self.frontier is not None:
+            self.frontier.mark_done(store_info['url'])
+
+    def open_metadata(self):
+        self.metadata = UrlMetadataStore(self.metadata_db)
+        self.pending_metadata = PendingMetadataUpdates(self.metadata)
+
+    def flush_metadata(self):
+        """Apply the metadata of the stores the journal just committed"""
+        if self.pending_metadata is not None:
+            self.pending_metadata.flush()
+
+    def close_metadata(self):
+        if self.metadata is not None:
+            self.metadata.close()
+        self.metadata = None
+        self.pending_metadata = None
+
+    def save_delta(self):
+        with open('stores_delta.json', 'w', encoding='utf-8') as f:
+            json.dump(self.delta, f, indent=2)
+        logging.info(f"Delta saved to stores_delta.json: {len(self.delta['new'])} new, "
+                     f"{len(self.delta['changed'])} changed stores")
+
+    def save_checkpoint(self, complete=False):
+        """Commit the journaled stores so a crash resumes from this point
+
+        A complete crawl is not resumed: the next run starts a new one.
+        """
+        if self.journal is None:
+            return
+        with METRICS.timer('persist'):
+            self.journal.commit(state={'stores': self.store_count, 'complete': complete})
+        logging.info(f"Checkpoint committed: {self.store_count} stores in {self.journal.journal_path}")
 
     def load_last_checkpoint(self):
-        if not os.path.exists(self.checkpoint_dir):
-            return None
-            
         try:
-            checkpoint_files = sorted(
-                [f for f in os.listdir(self.checkpoint_dir) if f.startswith('checkpoint_')],
-                reverse=True
+            self.journal = CheckpointJournal(
+                self.checkpoint_dir,
+                'cannabis_scraper',
+                fsync_every=self.checkpoint_interval,
+                key=lambda store_info: store_info['url'],
+                on_commit=self.flush_metadata
             )
-            
-            if checkpoint_files:
-                latest_file = os.path.join(self.checkpoint_dir, checkpoint_files[0])
-                with open(latest_file, 'r') as f:
-                    data = json.load(f)
-                    self.stores = data['stores']
-                    logging.info(f"Loaded checkpoint: {latest_file}")
-                    return True
+            records, state = self.journal.load()
+            if state and state.get('complete'):
+                logging.info("Previous crawl completed, starting a new one")
+                self.journal.reset()
+                return False
+            if records:
+                self.stores = [StoreRecord.from_dict(store_info) for store_info in records]
+                self.store_count = len(records)
+                logging.info(f"Loaded checkpoint journal: {self.journal.journal_path}")
+                return True
         except Exception as e:
             logging.error(f"Error loading checkpoint: {str(e)}")
             
         return False
 
+    def listing_url(self, page):
+        return self.base_url if page == 1 else f"{self.base_url}?page={page}"
+
+    def scrape_listing_page(self, driver, page):
+        """Wait for the loaded listing page and scrape every store on it"""
+        # Wait for listings to load with retries
+        listings_ready = all_of(
+            cloudflare_cleared,
+            selector_present(By.CLASS_NAME, "listing-cardboard")
+        )
+        retries = self.max_retries
+        while True:
+            try:
+                self.readiness.wait(driver, 'listing', ready_or_blocked(listings_ready), baseline=5)
+                error = None
+            except TimeoutException as e:
+                error = e
+            kind = classify_page(driver)
+            if kind in BLOCK_KINDS:
+                METRICS.inc(f'{kind}_pages')
+                error = PageBlocked(self.listing_url(page), kind, route(kind, rendered=True))
+                # Only a rate limit is worth reloading for; a captcha or access denied page stays
+                if error.action != RETRY:
+                    raise error
+            if error is None:
+                break
+            retries -= 1
+            if retries == 0:
+                raise error
+            METRICS.inc('retries')
+            logging.warning(f"Retrying page load ({retries} attempts remaining)")
+            driver.refresh()
+        # The first cards appear while later ones are still being fetched
+        self.wait_for_network_idle(driver, 'listing')
+        self.record_resources(driver)
+
+        if self.discover_api and page == 1:
+            self.discover_api_endpoints(driver)
+
+        # Get all store cards
+        store_cards = driver.find_elements(By.CLASS_NAME, "listing-cardboard")
+        logging.info(f"Found {len(store_cards)} stores on page {page}")
+
+        if self.card_extraction:
+            self.scrape_page_from_cards(driver)
+        elif self.detail_workers > 1:
+            self.scrape_page_parallel(store_cards)
+        else:
+            self.scrape_page_serial(driver, store_cards)
+
+    def stop_api_discovery(self):
+        """Relaunch the drivers without the performance log, which grows with every request once discovery is done"""
+        self.discover_api = False
+        self.browser.recycle("API discovery")
+        for browser in self.detail_drivers:
+            browser.recycle("API discovery")
+
+    def discover_api_endpoints(self, driver):
+        """Find the JSON endpoints the loaded listing page used for its cards and save them"""
+        try:
+            endpoints = discover_endpoints(driver, self.extract_cards(driver))
+        except Exception as e:
+            logging.error(f"API discovery failed: {str(e)}")
+            return []
+        if not endpoints:
+            logging.info("No JSON endpoint behind the listing cards was found")
+            return []
+        # Clearance cookies let the endpoints be replayed without the browser
+        cookies = {cookie['name']: cookie['value'] for cookie in driver.get_cookies()}
+        save_endpoints(self.api_endpoints_file, endpoints, cookies)
+        return endpoints
+
+    def scrape_stores_via_api(self):
+        """Scrape the stores by replaying the saved API endpoint over plain HTTP
+
+        Returns False when there is no saved endpoint or it stopped working,
+        in which case scrape_stores() has to be used.
+        """
+        try:
+            endpoints, cookies = load_endpoints(self.api_endpoints_file)
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"No usable API endpoints in {self.api_endpoints_file}: {str(e)}")
+            return False
+        if not endpoints:
+            return False
+
+        client = HttpClient(pool_connections=1, pool_maxsize=1)
+        client.session.cookies.update(cookies)
+        if self.incremental:
+            self.open_metadata()
+        try:
+            # Nothing is tracked until the replay succeeded, so a fallback to scrape_stores() starts clean
+            stores = [
+                {field: store_info.get(field, '') for field in STORE_FIELDS}
+                for store_info in replay_endpoint(client.session, endpoints[0], self.base_url, self.max_pages)
+            ]
+            if not stores:
+                return False
+            for store_info in stores:
+                self.track_store(store_info)
+            self.save_results()
+            if self.incremental:
+                self.save_delta()
+            METRICS.report(self.metrics_format)
+            return True
+        except Exception as e:
+            logging.error(f"API replay failed: {str(e)}")
+            self.stores = []
+            self.store_count = 0
+            self.delta = {'new': [], 'changed': []}
+            return False
+        finally:
+            client.close()
+            self.close_metadata()
+
     def scrape_stores(self):
-        driver = self.setup_driver()
+        reap_orphaned_drivers()
+        self.browser = self.new_browser("listing browser")
         try:
             # Load last checkpoint if exists
+            if self.incremental:
+                self.open_metadata()
+            # The crawl budget counts from here
+            self.scheduler = CrawlScheduler(self.metadata if self.schedule_crawl else None, self.crawl_budget_seconds)
+
+            self.frontier = UrlFrontier(self.frontier_db)
+            self.failed_stores = 0
             if self.load_last_checkpoint():
                 logging.info(f"Resuming from {len(self.stores)} previously scraped stores")
+                self.frontier.sync_done(store_info['url'] for store_info in self.stores)
+                self.frontier.requeue_failed(self.max_retries)
+            else:
+                self.frontier.reset()
+
+            if self.stream_results:
+                formats = streaming_formats(self.result_formats) if self.normalize_results else self.result_formats
+                self.sink = open_sinks('stores', formats, STORE_FIELDS)
+                for store_info in self.stores:
+                    self.sink.write(store_info)
+                self.stores = []
             
             logging.info("Navigating to website...")
-            driver.get(self.base_url)
-            time.sleep(10)  # Wait for Cloudflare challenge
+            driver = self.browser.driver
 
             # Process each page
             page = 1
-            while page <= 13:  # 13 pages total
+            complete = True
+            while page <= self.max_pages:
+                if self.budget_exhausted():
+                    logging.warning(f"Crawl budget of {self.crawl_budget_seconds}s used up before page {page}; "
+                                    f"the remaining stores are left for the next run")
+                    complete = False
+                    break
                 logging.info(f"\nProcessing page {page}")
                 
                 if page > 1:
-                    # Navigate to next page
+                    # Navigate to next page, on a fresh driver if this one has grown too large
                     try:
-                        next_page_url = f"{self.base_url}?page={page}"
-                        driver.get(next_page_url)
-                        time.sleep(5)
+                        driver = self.browser.recycle_if_needed()
+                        with METRICS.timer('render'):
+                            driver.get(self.listing_url(page))
+                        self.browser.page_loaded()
                     except Exception as e:
                         logging.error(f"Error navigating to page {page}: {str(e)}")
+                        complete = False
                         break
 
-                # Extract store links
                 try:
-                    # Wait for listings to load with retries
-                    retries = 3
-                    while retries > 0:
-                        try:
-                            # Check for Cloudflare protection
-                            WebDriverWait(driver, 30).until(
-                                lambda d: "Checking your browser" not in d.page_source
-                            )
-                            
-                            # Wait for listings
-                            WebDriverWait(driver, 30).until(
-                                EC.presence_of_element_located((By.CLASS_NAME, "listing-cardboard"))
-                            )
-                            break
-                        except Exception as e:
-                            retries -= 1
-                            if retries == 0:
-                                raise
-                            logging.warning(f"Retrying page load ({retries} attempts remaining)")
-                            time.sleep(10)
-                            driver.refresh()
-                    
-                    # Get all store cards
-                    store_cards = driver.find_elements(By.CLASS_NAME, "listing-cardboard")
-                    logging.info(f"Found {len(store_cards)} stores on page {page}")
-
-                    # Process each store
-                    for i, card in enumerate(store_cards):
-                        try:
-                            store_info = {
-                                'name': '',
-                                'address': '',
-                                'phone': '',
-                                'social_media': '',
-                                'additional_info': '',
-                                'url': ''
-                            }
-
-                            # Get store link
-                            link = card.find_element(By.TAG_NAME, "a")
-                            store_info['url'] = link.get_attribute('href')
-                            
-                            # Navigate to store page
-                            logging.info(f"\nProcessing store {i+1}/{len(store_cards)}: {store_info['url']}")
-                            driver.execute_script('window.open()')
-                            driver.switch_to.window(driver.window_handles[-1])
-                            driver.get(store_info['url'])
-                            time.sleep(3)
-
-                            # Extract store details
-                            try:
-                                title = driver.find_element(By.CLASS_NAME, "listing-title")
-                                store_info['name'] = title.text.strip()
-                            except:
-                                logging.warning("Could not find store name")
-
-                            try:
-                                address = driver.find_element(By.CSS_SELECTOR, "[class*='address']")
-                                store_info['address'] = address.text.strip()
-                            except:
-                                logging.warning("Could not find address")
-
-                            try:
-                                phone = driver.find_element(By.CSS_SELECTOR, "[class*='phone']")
-                                store_info['phone'] = phone.text.strip()
-                            except:
-                                logging.warning("Could not find phone")
-
-                            try:
-                                social_links = driver.find_elements(By.CSS_SELECTOR, "a[href*='instagram'], a[href*='facebook']")
-                                store_info['social_media'] = ', '.join([link.get_attribute('href') for link in social_links])
-                            except:
-                                logging.warning("Could not find social media")
-
-                            self.stores.append(store_info)
-                            logging.info(f"Successfully processed: {store_info['name']}")
-
-                            # Close store tab and return to main page
-                            driver.close()
-                            driver.switch_to.window(driver.window_handles[0])
-
-                            # Save checkpoint every N stores
-                            if (i + 1) % self.checkpoint_interval == 0:
-                                self.save_checkpoint()
-
-                        except Exception as e:
-                            logging.error(f"Error processing store card: {str(e)}")
-                            continue
-
+                    self.scrape_listing_page(driver, page)
                 except Exception as e:
                     logging.error(f"Error processing page {page}: {str(e)}")
+                    complete = False
+
+                if self.discover_api:
+                    self.stop_api_discovery()
                 
                 page += 1
 
             # Final save
             self.save_results()
+            self.save_checkpoint(complete=complete and not self.failed_stores and not self.budget_exhausted())
+            if self.incremental:
+                self.save_delta()
+            self.readiness.log_report()
+            if self.resource_policy is not None:
+                self.resource_policy.stats.log_report()
+            self.frontier.log_stats()
+            self.scheduler.log_stats()
+            self.browser.log_stats()
+            METRICS.report(self.metrics_format)
 
         except Exception as e:
             logging.error(f"An error occurred: {str(e)}")
         finally:
-            driver.quit()
+            self.quit_detail_drivers()
+            self.browser.close()
+            self.browser = None
+            self.scheduler = None
+            # The journal's last commit applies the metadata still queued, so it is closed first
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+            self.close_metadata()
+            if self.frontier is not None:
+                self.frontier.close()
+                self.frontier = None
+            if self.sink is not None:
+                # Keep whatever was streamed in the .part files
+                self.sink.close()
+                self.sink = None
 
     def save_results(self):
-        if self.stores:
-            # Save CSV
-            with open('stores.csv', 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=self.stores[0].keys())
-                writer.writeheader()
-                writer.writerows(self.stores)
-            logging.info("\nResults saved to stores.csv")
-            
-            # Save JSON
-            with open('stores.json', 'w', encoding='utf-8') as f:
-                json.dump(self.stores, f, indent=2)
-            logging.info("Results saved to stores.json")
-        else:
+        if not self.store_count:
             logging.warning("\nNo stores found!")
+            return
+
+        if self.sink is None:
+            stores = StorePipeline().run(self.stores) if self.normalize_results else self.stores
+            self.sink = open_sinks('stores', self.result_formats, STORE_FIELDS)
+            for store_info in stores:
+                self.sink.write(store_info)
+            self.sink.finalize()
+        else:
+            self.sink.finalize()
+            # Streamed stores are normalized once all of them are in the files
+            if self.normalize_results:
+                normalize_result_files('stores', self.result_formats, STORE_FIELDS)
+        self.sink = None
 
 if __name__ == "__main__":
     scraper = CannabisScraper()
-    scraper.scrape_stores()
+    # Replay the endpoints found by an earlier browser run; fall back to the browser when they stop working
+    if not (os.path.exists(scraper.api_endpoints_file) and scraper.scrape_stores_via_api()):
+        # and record the endpoints again from its first listing page
+        scraper.discover_api = True
+        scraper.scrape_stores()
@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+import threading
+import time
+
+
+def _write_atomic(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class CheckpointJournal:
+    """Append-only JSONL checkpoint journal with batched fsync and compaction
+
+    Each scraped record is appended as one JSON line to <name>.jsonl. Every
+    fsync_every appends the file is flushed and fsynced, and the byte offset
+    it reached is committed to <name>.meta.json together with the caller's
+    resume state. Resuming reads the meta file directly (no directory scan),
+    truncates anything written after the committed offset and replays the
+    committed lines. Compaction rewrites the journal keeping the last record
+    for each key, in the order the keys first appeared. on_commit is called
+    after every commit, once the records appended so far are durable.
+    """
+
+    def __init__(self, directory, name, fsync_every=10, compact_every=1000, key=None, on_commit=None):
+        self.directory = directory
+        self.journal_path = os.path.join(directory, f'{name}.jsonl')
+        self.meta_path = os.path.join(directory, f'{name}.meta.json')
+        self.fsync_every = max(1, fsync_every)
+        self.compact_every = compact_every
+        self.key = key
+        self.on_commit = on_commit
+        self.state = None
+        self._pending = 0
+        self._since_compact = 0
+        self._file = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+
+    def load(self):
+        """Return (records, state) from the last commit, or ([], None) for a new journal"""
+        meta = self._read_meta()
+        if meta is None or not os.path.exists(self.journal_path):
+            self.reset()
+            return [], None
+
+        offset = meta['offset']
+        with open(self.journal_path, 'r+', encoding='utf-8') as f:
+            # Drop records appended after the last commit; they may be torn
+            f.truncate(offset)
+            records = [json.loads(line) for line in f if line.strip()]
+
+        self.state = meta.get('state')
+        logging.info(f"Loaded {len(records)} records from journal {self.journal_path}")
+        return records, self.state
+
+    def reset(self):
+        """Start an empty journal, discarding any previous one"""
+        with self._lock:
+            self._close_file()
+            open(self.journal_path, 'w').close()
+            self.state = None
+            self._pending = 0
+            _write_atomic(self.meta_path, json.dumps({'offset': 0, 'state': None, 'committed_at': time.time()}))
+
+    def append(self, record, state=None):
+        """Append a record; state is committed with it on the next fsync"""
+        with self._lock:
+            self._open()
+            self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+            if state is not None:
+                self.state = state
+            self._pending += 1
+            self._since_compact += 1
+            if self._pending >= self.fsync_every:
+                self._commit()
+        if self.compact_every and self._since_compact >= self.compact_every:
+            self.compact()
+
+    def commit(self, state=None):
+        """fsync the journal and record its length as the resume point"""
+        with self._lock:
+            if state is not None:
+                self.state = state
+            self._commit()
+
+    def _commit(self):
+        self._open()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        meta = {'offset': self._file.tell(), 'state': self.state, 'committed_at': time.time()}
+        _write_atomic(self.meta_path, json.dumps(meta))
+        self._pending = 0
+        if self.on_commit is not None:
+            self.on_commit()
+
+    def compact(self):
+        """Rewrite the journal keeping only the latest record for each key"""
+        if self.key is None:
+            return
+        with self._lock:
+            self._commit()
+            self._close_file()
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                latest = {}
+                lines = 0
+                for line in f:
+                    if line.strip():
+                        lines += 1
+                        # Later records win but keep the position of the first one
+                        latest[self.key(json.loads(line))] = line
+            self._since_compact = 0
+            if len(latest) == lines:
+                # Nothing to collapse, so the journal is not rewritten
+                return
+            tmp_path = self.journal_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(latest.values())
+                f.flush()
+                os.fsync(f.fileno())
+                offset = f.tell()
+            os.replace(tmp_path, self.journal_path)
+            _write_atomic(self.meta_path, json.dumps({'offset': offset, 'state': self.state, 'committed_at': time.time()}))
+        logging.info(f"Compacted journal {self.journal_path} to {len(latest)} records")
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._commit()
+            self._close_file()
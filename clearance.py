@@ -0,0 +1,99 @@
+import logging
+import threading
+import time
+
+CLEARANCE_COOKIE = 'cf_clearance'
+
+
+class Clearance:
+    """Cookies and User-Agent exported from a browser that passed the challenge"""
+
+    def __init__(self, cookies, user_agent, expires_at):
+        self.cookies = cookies
+        self.user_agent = user_agent
+        self.expires_at = expires_at
+
+    def is_valid(self, margin=30):
+        return time.time() + margin < self.expires_at
+
+    def apply(self, session):
+        """Install the clearance cookies into a requests session"""
+        for cookie in self.cookies:
+            session.cookies.set(
+                cookie['name'],
+                cookie['value'],
+                domain=cookie.get('domain'),
+                path=cookie.get('path', '/')
+            )
+
+
+def _solve_in_context(context, url, timeout):
+    page = context.new_page()
+    try:
+        page.goto(url, timeout=timeout * 1000)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            cookies = context.cookies(url)
+            if any(cookie['name'] == CLEARANCE_COOKIE for cookie in cookies):
+                break
+            page.wait_for_timeout(250)
+        else:
+            cookies = context.cookies(url)
+            logging.warning(f"No {CLEARANCE_COOKIE} cookie issued for {url}, exporting session cookies only")
+        user_agent = page.evaluate("navigator.userAgent")
+        return cookies, user_agent
+    finally:
+        page.close()
+
+
+class ClearanceBroker:
+    """Passes the Cloudflare challenge once in a browser and shares the result
+
+    The solve runs in a leased slot of the Playwright BrowserPool. The
+    exported cf_clearance cookie only works together with the User-Agent of
+    the browser that earned it, so callers must send clearance.user_agent with
+    every request. Concurrent callers that hit a block while a solve is in
+    progress wait for it and reuse its result instead of solving again.
+    """
+
+    def __init__(self, browser_pool, url, max_age=1800, solve_timeout=30):
+        self.browser_pool = browser_pool
+        self.url = url
+        self.max_age = max_age
+        self.solve_timeout = solve_timeout
+        self.solves = 0
+        self._clearance = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        """Get the current clearance, or None if there is no valid one"""
+        clearance = self._clearance
+        if clearance is not None and clearance.is_valid():
+            return clearance
+        return None
+
+    def refresh(self, stale=None):
+        """Solve the challenge again unless another thread already replaced stale"""
+        with self._lock:
+            if self._clearance is not stale and self.current() is not None:
+                return self._clearance
+            self._clearance = self._solve()
+            return self._clearance
+
+    def _solve(self):
+        logging.info(f"Solving Cloudflare challenge in browser for {self.url}")
+        start = time.monotonic()
+        with self.browser_pool.lease() as slot:
+            cookies, user_agent = slot.submit(
+                lambda context: _solve_in_context(context, self.url, self.solve_timeout)
+            )
+        self.solves += 1
+
+        expires_at = time.time() + self.max_age
+        for cookie in cookies:
+            if cookie['name'] == CLEARANCE_COOKIE and cookie.get('expires', -1) > 0:
+                expires_at = min(expires_at, cookie['expires'])
+
+        logging.info(f"Obtained clearance in {time.monotonic() - start:.1f}s, "
+                     f"valid for {expires_at - time.time():.0f}s")
+        return Clearance(cookies, user_agent, expires_at)
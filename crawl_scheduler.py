@@ -0,0 +1,91 @@
+import logging
+import math
+import time
+
+DAY = 24 * 60 * 60
+
+# Before a store has a history it is assumed to change about once a week
+PRIOR_CHANGES = 1
+PRIOR_DAYS = 7
+
+
+class CrawlBudgetExceeded(Exception):
+    """Raised for a store that was not fetched because the crawl ran out of time"""
+
+
+class CrawlScheduler:
+    """Orders store URLs by how likely a visit is to find something new
+
+    URLs without a record from an earlier run come first, in the order given.
+    The others are ranked by the probability that they changed since they
+    were last checked, assuming changes arrive at the rate seen in the URL
+    metadata history (changes per day, starting from a prior of one change a
+    week). Stores below min_change_probability that were checked within
+    max_revisit_days are deferred: the caller reuses their last record
+    instead of fetching them. With budget_seconds, expired() turns true that
+    many seconds after the scheduler was created, so a run that is cut short
+    has already covered the most valuable stores.
+    """
+
+    def __init__(self, metadata=None, budget_seconds=None, min_change_probability=0.2, max_revisit_days=7,
+                 clock=time.time):
+        self.metadata = metadata
+        self.budget_seconds = budget_seconds
+        self.min_change_probability = min_change_probability
+        self.max_revisit_days = max_revisit_days
+        self.clock = clock
+        self.started_at = clock()
+        self.stats = {'new': 0, 'due': 0, 'deferred': 0}
+
+    def change_probability(self, history, now=None):
+        """Probability that a URL with this history changed since it was last checked"""
+        now = self.clock() if now is None else now
+        checked_at = now if history['checked_at'] is None else history['checked_at']
+        first_seen_at = checked_at if history['first_seen_at'] is None else history['first_seen_at']
+        observed_days = max(checked_at - first_seen_at, 0) / DAY
+        rate = (history['changes'] + PRIOR_CHANGES) / (observed_days + PRIOR_DAYS)
+        return 1 - math.exp(-rate * max(now - checked_at, 0) / DAY)
+
+    def plan(self, urls):
+        """Split urls into (due, deferred); due is in priority order, new URLs first"""
+        urls = list(urls)
+        history = self.metadata.history() if self.metadata is not None else {}
+        now = self.clock()
+        new, ranked, deferred = [], [], []
+        for url in urls:
+            url_history = history.get(url)
+            if url_history is None:
+                new.append(url)
+                continue
+            probability = self.change_probability(url_history, now)
+            age_days = (now - (url_history['checked_at'] or 0)) / DAY  # Never checked counts as overdue
+            if probability < self.min_change_probability and age_days < self.max_revisit_days:
+                deferred.append(url)
+            else:
+                ranked.append((-probability, len(ranked), url))
+        due = new + [url for _, _, url in sorted(ranked)]
+        self.stats['new'] += len(new)
+        self.stats['due'] += len(ranked)
+        self.stats['deferred'] += len(deferred)
+        if history:
+            logging.info(f"Crawl schedule: {len(new)} new, {len(ranked)} due by change likelihood, "
+                         f"{len(deferred)} deferred as unlikely to have changed")
+        return due, deferred
+
+    def remaining(self):
+        """Seconds left in the crawl budget, or None without a budget"""
+        if self.budget_seconds is None:
+            return None
+        return max(self.budget_seconds - (self.clock() - self.started_at), 0)
+
+    def expired(self):
+        return self.budget_seconds is not None and self.remaining() <= 0
+
+    def check_budget(self, url):
+        """Raise CrawlBudgetExceeded for url once the budget is used up"""
+        if self.expired():
+            raise CrawlBudgetExceeded(f"Crawl budget of {self.budget_seconds}s used up before {url}")
+
+    def log_stats(self):
+        logging.info(f"Crawl schedule: {self.stats['new']} new, {self.stats['due']} due, "
+                     f"{self.stats['deferred']} deferred stores")
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+# Markup that changes on every request without the store details changing
+_VOLATILE_BLOCKS = re.compile(
+    rb'<script\b.*?</script\s*>|<style\b.*?</style\s*>|<noscript\b.*?</noscript\s*>|<!--.*?-->',
+    re.IGNORECASE | re.DOTALL
+)
+_WHITESPACE = re.compile(rb'\s+')
+
+
+def content_fingerprint(content):
+    """Hash the visible body markup of a page without parsing it
+
+    Scripts, styles and comments carry nonces and tracking tokens that change
+    on every request, so they are stripped with a byte-level regex before
+    hashing. This is far cheaper than building a DOM.
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    body_start = content.lower().find(b'<body')
+    if body_start != -1:
+        content = content[body_start:]
+    content = _VOLATILE_BLOCKS.sub(b'', content)
+    content = _WHITESPACE.sub(b' ', content)
+    return hashlib.sha256(content).hexdigest()
+
+
+def record_fingerprint(record):
+    """Hash a store record so edits to any field are detected"""
+    return hashlib.sha256(json.dumps(record, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def change_status(previous, content_hash):
+    """'new', 'changed' or 'unchanged' for content_hash against the stored metadata of a URL"""
+    if previous is None:
+        return 'new'
+    return 'changed' if previous['content_hash'] != content_hash else 'unchanged'
+
+
+HISTORY_COLUMNS = (
+    ('first_seen_at', 'REAL'),
+    ('checks', 'INTEGER NOT NULL DEFAULT 0'),
+    ('changes', 'INTEGER NOT NULL DEFAULT 0')
+)
+
+
+class UrlMetadataStore:
+    """Persistent per-URL crawl metadata backed by SQLite
+
+    Keeps the validators (ETag, Last-Modified) for conditional requests, the
+    fingerprint of the last seen content and the record parsed from it, so an
+    unchanged page can be answered from here without parsing it again. It
+    also counts how often each URL was checked and found changed, which the
+    crawl scheduler uses to estimate how likely a page is to have changed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS url_metadata ("
+            " url TEXT PRIMARY KEY,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " content_hash TEXT,"
+            " record TEXT,"
+            " checked_at REAL,"
+            " changed_at REAL,"
+            " first_seen_at REAL,"
+            " checks INTEGER NOT NULL DEFAULT 0,"
+            " changes INTEGER NOT NULL DEFAULT 0)"
+        )
+        # Databases written before the change history was kept get the new columns
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(url_metadata)")}
+        for column, definition in HISTORY_COLUMNS:
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE url_metadata ADD COLUMN {column} {definition}")
+        self._conn.commit()
+
+    def get(self, url):
+        """Get the stored metadata for url as a dict, or None if never seen"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_hash, record, checked_at, changed_at"
+                " FROM url_metadata WHERE url = ?",
+                (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'etag': row[0],
+            'last_modified': row[1],
+            'content_hash': row[2],
+            'record': json.loads(row[3]) if row[3] else None,
+            'checked_at': row[4],
+            'changed_at': row[5]
+        }
+
+    def conditional_headers(self, metadata):
+        """Build If-None-Match / If-Modified-Since headers from stored metadata"""
+        headers = {}
+        if metadata and metadata.get('record') is not None:
+            if metadata.get('etag'):
+                headers['If-None-Match'] = metadata['etag']
+            if metadata.get('last_modified'):
+                headers['If-Modified-Since'] = metadata['last_modified']
+        return headers
+
+    def history(self):
+        """Return {url: {'checked_at', 'changed_at', 'first_seen_at', 'checks', 'changes'}} for every URL with a record"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, checked_at, changed_at, first_seen_at, checks, changes"
+                " FROM url_metadata WHERE record IS NOT NULL AND record != 'null'"
+            ).fetchall()
+        return {
+            row[0]: {
+                'checked_at': row[1],
+                'changed_at': row[2],
+                # Rows from before the history was kept count from their last change
+                'first_seen_at': row[3] if row[3] is not None else row[2],
+                'checks': row[4],
+                'changes': row[5]
+            }
+            for row in rows
+        }
+
+    def mark_unchanged(self, url):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE url_metadata SET checked_at = ?, checks = checks + 1 WHERE url = ?",
+                (time.time(), url)
+            )
+            self._conn.commit()
+
+    def update(self, url, content_hash, record, etag=None, last_modified=None):
+        """Store the latest content for url and return 'new', 'changed' or 'unchanged'"""
+        now = time.time()
+        previous = self.get(url)
+        status = change_status(previous, content_hash)
+        changed_at = now if status != 'unchanged' else previous['changed_at']
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO url_metadata"
+                " (url, etag, last_modified, content_hash, record, checked_at, changed_at, first_seen_at, checks, changes)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, 0)"
+                " ON CONFLICT(url) DO UPDATE SET"
+                "  etag = excluded.etag, last_modified = excluded.last_modified,"
+                "  content_hash = excluded.content_hash, record = excluded.record,"
+                "  checked_at = excluded.checked_at, changed_at = excluded.changed_at,"
+                "  first_seen_at = COALESCE(first_seen_at, changed_at, excluded.first_seen_at),"
+                "  checks = checks + 1, changes = changes + ?",
+                (url, etag, last_modified, content_hash, json.dumps(record), now, changed_at, now,
+                 1 if status == 'changed' else 0)
+            )
+            self._conn.commit()
+        return status
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class PendingMetadataUpdates:
+    """Metadata updates held back until the records they describe are persisted
+
+    Saving a URL's validators before its record would let a crash in between
+    answer the next run's conditional request with a 304, so a new or changed
+    store would never be saved. Updates are queued before the record is
+    journaled and applied by flush(), which the journal calls after each
+    commit.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._updates = []
+        self._lock = threading.Lock()
+
+    def update(self, url, content_hash, record, etag=None, last_modified=None):
+        with self._lock:
+            self._updates.append((url, content_hash, record, etag, last_modified))
+
+    def mark_unchanged(self, url):
+        with self._lock:
+            self._updates.append((url, None, None, None, None))
+
+    def flush(self):
+        """Apply the queued updates in the order they were made"""
+        with self._lock:
+            updates, self._updates = self._updates, []
+        for url, content_hash, record, etag, last_modified in updates:
+            if content_hash is None:
+                self.store.mark_unchanged(url)
+            else:
+                self.store.update(url, content_hash, record, etag=etag, last_modified=last_modified)
+
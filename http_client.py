@@ -0,0 +1,73 @@
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class HttpClient:
+    """Long-lived HTTP client that reuses pooled connections across fetches
+
+    A single Session and HTTPAdapter are shared by every worker thread. The
+    urllib3 pools behind the adapter are thread-safe, and pool_block keeps the
+    number of open sockets per host at pool_maxsize instead of opening
+    throwaway connections when all of them are busy.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, max_retries=3, pool_block=True):
+        retry_strategy = Retry(
+            total=max_retries,
+            backoff_factor=1,
+            # 503 is left to the caller so the rate limiter sees it and backs off
+            status_forcelist=[500, 502, 504]
+        )
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry_strategy,
+            pool_block=pool_block
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def pool_stats(self):
+        """Return connection reuse counters summed over all host pools"""
+        stats = {'pools': 0, 'requests': 0, 'hits': 0, 'misses': 0}
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats['pools'] += 1
+            stats['requests'] += pool.num_requests
+            # Every new connection is a miss; the remaining requests reused one
+            stats['misses'] += pool.num_connections
+        stats['hits'] = max(0, stats['requests'] - stats['misses'])
+        return stats
+
+    def log_pool_stats(self):
+        stats = self.pool_stats()
+        logging.info(
+            f"HTTP pool: {stats['requests']} requests over {stats['pools']} pools, "
+            f"{stats['hits']} reused connections, {stats['misses']} new connections"
+        )
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_shared_client(pool_connections=10, pool_maxsize=10):
+    """Get the process-wide HttpClient, creating it on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        return _client
@@ -0,0 +1,164 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from a cached parse up to a slow browser render
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside the bucket that holds it"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, bound in enumerate(self.buckets):
+            if self.counts[i] and seen + self.counts[i] >= rank:
+                return lower + (bound - lower) * (rank - seen) / self.counts[i]
+            seen += self.counts[i]
+            lower = bound
+        return self.buckets[-1]
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'p50': round(self.quantile(0.5), 6),
+            'p99': round(self.quantile(0.99), 6),
+            'buckets': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'], self.counts))
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe per-stage timers, counters and gauges for one crawl
+
+    Stages used by the scrapers: fetch (HTTP request), ttfb (time until the
+    response headers arrived), render (browser page loads), wait (rate
+    limiting and readiness waits), parse and persist (journal and sinks).
+    """
+
+    def __init__(self, prefix='scraper'):
+        self.prefix = prefix
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            if stage not in self.stages:
+                self.stages[stage] = Histogram()
+            self.stages[stage].observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        """Time the enclosed block into the histogram for stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def inc(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+            self.gauges = {}
+            self.started = time.time()
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'started': self.started,
+                'elapsed_seconds': round(time.time() - self.started, 3),
+                'stages': {stage: histogram.snapshot() for stage, histogram in self.stages.items()},
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges)
+            }
+
+    def to_prometheus(self):
+        """Render the metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            name = f'{self.prefix}_stage_seconds'
+            lines.append(f'# TYPE {name} histogram')
+            for stage, histogram in sorted(self.stages.items()):
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+            for counter, value in sorted(self.counters.items()):
+                lines.append(f'# TYPE {self.prefix}_{counter}_total counter')
+                lines.append(f'{self.prefix}_{counter}_total {value}')
+            typed = set()
+            for gauge, value in sorted(self.gauges.items()):
+                # Gauge names may carry labels, e.g. rate_limit_rps{host="..."}
+                base = gauge.split('{')[0]
+                if base not in typed:
+                    lines.append(f'# TYPE {self.prefix}_{base} gauge')
+                    typed.add(base)
+                lines.append(f'{self.prefix}_{gauge} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path, fmt='prometheus'):
+        """Write the metrics to path as Prometheus text ('prometheus') or JSON ('json')"""
+        if fmt == 'prometheus':
+            data = self.to_prometheus()
+        elif fmt == 'json':
+            data = json.dumps(self.to_dict(), indent=2)
+        else:
+            raise ValueError(f"Unknown metrics format: {fmt}")
+        with open(path, 'w') as f:
+            f.write(data)
+        logging.info(f"Saved metrics to {path}")
+
+    def report(self, fmt=None, base_path='scraper_metrics'):
+        """Log the summary and, when fmt is set, write <base_path>.prom or <base_path>.json"""
+        self.log_summary()
+        if fmt:
+            extension = 'prom' if fmt == 'prometheus' else fmt
+            self.dump(f'{base_path}.{extension}', fmt)
+
+    def log_summary(self):
+        snapshot = self.to_dict()
+        for stage, histogram in sorted(snapshot['stages'].items()):
+            logging.info(f"Stage {stage}: {histogram['count']} x, total {histogram['sum']:.2f}s, "
+                         f"p50 {histogram['p50'] * 1000:.1f} ms, p99 {histogram['p99'] * 1000:.1f} ms")
+        for counter, value in sorted(snapshot['counters'].items()):
+            logging.info(f"Counter {counter}: {value}")
+
+
+METRICS = MetricsRegistry()
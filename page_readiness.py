@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+from collections import deque
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+from block_detector import CAPTCHA, CHALLENGE, EMPTY, OK, classify_page
+from metrics import METRICS
+
+
+def document_ready(driver):
+    """True once the document and its subresources have finished loading"""
+    return driver.execute_script("return document.readyState") == 'complete'
+
+
+def cloudflare_cleared(driver):
+    """True when no Cloudflare interstitial is showing
+
+    Classifies the page with one script call instead of pulling page_source,
+    which transfers the whole DOM on every poll.
+    """
+    return classify_page(driver) not in (CHALLENGE, CAPTCHA)
+
+
+def selector_present(by, selector):
+    """Condition that is true once an element matching selector exists"""
+    def condition(driver):
+        return bool(driver.find_elements(by, selector))
+    return condition
+
+
+def network_idle(quiet_ms=500, initiator_types=('xmlhttprequest', 'fetch')):
+    """Condition that is true once no XHR/fetch request has finished for quiet_ms
+
+    Only requests started by initiator_types count, so the images and
+    trackers the page keeps loading do not hold the wait open. The resource
+    timing buffer is enlarged on the first poll, since a full buffer drops
+    the newest entries and would make a busy page look idle.
+    """
+    script = (
+        "if (!window.__readinessBuffer) {"
+        "  performance.setResourceTimingBufferSize(10000); window.__readinessBuffer = true;"
+        "}"
+        "var entries = performance.getEntriesByType('resource');"
+        "var last = 0;"
+        "for (var i = 0; i < entries.length; i++) {"
+        "  if (arguments[0].indexOf(entries[i].initiatorType) >= 0 && entries[i].responseEnd > last) {"
+        "    last = entries[i].responseEnd;"
+        "  }"
+        "}"
+        "return performance.now() - last;"
+    )
+    initiator_types = list(initiator_types)
+
+    def condition(driver):
+        return driver.execute_script(script, initiator_types) >= quiet_ms
+    return condition
+
+
+def all_of(*conditions):
+    """Condition that is true once every given condition is true"""
+    def condition(driver):
+        return all(check(driver) for check in conditions)
+    return condition
+
+
+def ready_or_blocked(ready):
+    """Condition that is true once ready is, or as soon as the page is a block that waiting will not clear
+
+    A managed challenge solves itself and an empty page may still be loading,
+    so only those are waited out; a captcha, a rate-limit page or an access
+    denied page ends the wait at once for the caller to classify.
+    """
+    def condition(driver):
+        return ready(driver) or classify_page(driver) not in (OK, CHALLENGE, EMPTY)
+    return condition
+
+
+class PageReadiness:
+    """Event-driven page waits with timeouts learned from observed load times
+
+    Each named wait keeps a window of recent durations. Once enough samples
+    exist the timeout shrinks to headroom x the slowest recent load, clamped to
+    [min_timeout, max_timeout]. Every wait also records how long it took
+    compared to the fixed sleep it replaces, so the saving can be reported.
+    """
+
+    def __init__(self, min_timeout=5, max_timeout=30, headroom=3.0, history=50, min_samples=5):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self.history = history
+        self.samples = {}
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def timeout_for(self, name):
+        """Get the current adaptive timeout in seconds for a named wait"""
+        with self._lock:
+            samples = self.samples.get(name)
+            if not samples or len(samples) < self.min_samples:
+                return self.max_timeout
+            learned = max(samples) * self.headroom
+        return min(self.max_timeout, max(self.min_timeout, learned))
+
+    def _record(self, name, elapsed, baseline, ready):
+        METRICS.observe('wait', elapsed)
+        with self._lock:
+            stats = self.stats.setdefault(name, {
+                'waits': 0, 'timeouts': 0, 'wait_seconds': 0.0, 'saved_seconds': 0.0
+            })
+            stats['waits'] += 1
+            stats['wait_seconds'] += elapsed
+            stats['saved_seconds'] += baseline - elapsed
+            if ready:
+                self.samples.setdefault(name, deque(maxlen=self.history)).append(elapsed)
+            else:
+                stats['timeouts'] += 1
+
+    def wait(self, driver, name, condition, baseline):
+        """Wait until condition(driver) holds, in place of a fixed sleep of baseline seconds
+
+        Raises TimeoutException if the page is not ready within the adaptive timeout.
+        """
+        timeout = self.timeout_for(name)
+        start = time.monotonic()
+        try:
+            WebDriverWait(driver, timeout, poll_frequency=0.2).until(condition)
+        except TimeoutException:
+            self._record(name, time.monotonic() - start, baseline, ready=False)
+            raise
+        self._record(name, time.monotonic() - start, baseline, ready=True)
+
+    def log_report(self):
+        with self._lock:
+            stats = {name: dict(values) for name, values in self.stats.items()}
+        total_saved = 0.0
+        for name, values in sorted(stats.items()):
+            mean = values['wait_seconds'] / values['waits'] if values['waits'] else 0.0
+            total_saved += values['saved_seconds']
+            logging.info(
+                f"Readiness '{name}': {values['waits']} waits, {values['timeouts']} timeouts, "
+                f"mean {mean:.2f}s, saved {values['saved_seconds']:.1f}s vs fixed sleeps"
+            )
+        logging.info(f"Readiness waits saved {total_saved:.1f}s in total")
@@ -0,0 +1,172 @@
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+from block_detector import BLOCK_KINDS, classify_response
+
+BLOCK_STATUSES = (403, 429, 503)
+
+
+class TokenBucket:
+    """Token bucket that hands out wait times instead of sleeping under its lock"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill()
+            self.rate = rate
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """Take a token and return how many seconds to wait before using it"""
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class HostController:
+    """AIMD pacing for one host
+
+    Every fast 2xx response adds 1/concurrency to the concurrency limit and
+    1/rate to the request rate, so each grows by one per round of responses.
+    A block (403/429/503 or a block page, see block_detector) halves both and pauses the host
+    for the cooldown; further blocks inside that cooldown come from requests
+    already in flight and are not counted again.
+    """
+
+    def __init__(self, host, initial_rate, max_rate, min_rate, max_concurrency, cooldown, decrease=0.5):
+        self.host = host
+        self.rate = initial_rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.concurrency = 1.0
+        self.max_concurrency = max_concurrency
+        self.cooldown = cooldown
+        self.decrease = decrease
+        self.in_flight = 0
+        self.requests = 0
+        self.blocks = 0
+        self.slow = 0
+        self.paused_until = 0.0
+        self.bucket = TokenBucket(initial_rate)
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause <= 0 and self.in_flight < int(self.concurrency):
+                    break
+                self._cond.wait(pause if pause > 0 else None)
+            self.in_flight += 1
+        wait = self.bucket.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def release(self, outcome, retry_after=None):
+        with self._cond:
+            self.in_flight -= 1
+            self.requests += 1
+            now = time.monotonic()
+            if outcome == 'blocked':
+                if now >= self.paused_until:
+                    self.blocks += 1
+                    self.concurrency = max(1.0, self.concurrency * self.decrease)
+                    self.rate = max(self.min_rate, self.rate * self.decrease)
+                    self.paused_until = now + max(self.cooldown, retry_after or 0)
+                    logging.warning(f"Blocked by {self.host}, backing off to {self.rate:.2f} req/s "
+                                    f"and {int(self.concurrency)} concurrent for {self.paused_until - now:.1f}s")
+            elif outcome == 'ok':
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+                self.rate = min(self.max_rate, self.rate + 1 / self.rate)
+            elif outcome == 'slow':
+                self.slow += 1
+            self.bucket.set_rate(self.rate)
+            self._cond.notify_all()
+
+    def metrics(self):
+        with self._cond:
+            return {
+                'rate': round(self.rate, 2),
+                'concurrency': int(self.concurrency),
+                'in_flight': self.in_flight,
+                'requests': self.requests,
+                'blocks': self.blocks,
+                'slow': self.slow
+            }
+
+
+class AdaptiveRateLimiter:
+    """Per-host token bucket rate limiting with AIMD concurrency control"""
+
+    def __init__(self, initial_rate=2.0, max_rate=10.0, min_rate=0.1, max_concurrency=4,
+                 slow_seconds=3.0, cooldown=30.0):
+        self.initial_rate = initial_rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.max_concurrency = max(1, max_concurrency)
+        self.slow_seconds = slow_seconds
+        self.cooldown = cooldown
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _controller(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = HostController(
+                    host, self.initial_rate, self.max_rate, self.min_rate,
+                    self.max_concurrency, self.cooldown
+                )
+            return self._hosts[host]
+
+    def acquire(self, url):
+        """Wait for a concurrency slot and a token for the host of url; returns the start time"""
+        self._controller(url).acquire()
+        return time.monotonic()
+
+    def classify(self, response, elapsed):
+        """Return 'blocked', 'slow', 'ok' or 'error' for a response (None if the request failed)"""
+        if response is None:
+            return 'error'
+        if response.status_code in BLOCK_STATUSES or classify_response(response) in BLOCK_KINDS:
+            return 'blocked'
+        if elapsed >= self.slow_seconds:
+            return 'slow'
+        if response.status_code < 400:
+            return 'ok'
+        return 'error'
+
+    def release(self, url, started, response=None):
+        """Feed the outcome of a request back into its host's controller"""
+        outcome = self.classify(response, time.monotonic() - started)
+        retry_after = None
+        if response is not None and outcome == 'blocked':
+            try:
+                retry_after = float(response.headers.get('Retry-After'))
+            except (TypeError, ValueError):
+                pass
+        self._controller(url).release(outcome, retry_after)
+        return outcome
+
+    def metrics(self):
+        """Return {host: {rate, concurrency, in_flight, requests, blocks, slow}}"""
+        with self._lock:
+            hosts = list(self._hosts.values())
+        return {controller.host: controller.metrics() for controller in hosts}
+
+    def log_metrics(self):
+        for host, metrics in self.metrics().items():
+            logging.info(f"Rate limiter {host}: {metrics['rate']} req/s, {metrics['concurrency']} concurrent, "
+                         f"{metrics['requests']} requests, {metrics['blocks']} blocks, {metrics['slow']} slow")
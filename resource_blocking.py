@@ -0,0 +1,172 @@
+import logging
+import threading
+from urllib.parse import urlparse
+
+from metrics import METRICS
+
+DEFAULT_BLOCKED_TYPES = ('image', 'media', 'font')
+DEFAULT_BLOCKED_DOMAINS = (
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googlesyndication.com',
+    'adservice.google.com', 'facebook.net', 'connect.facebook.net', 'hotjar.com',
+    'clarity.ms', 'static.cloudflareinsights.com'
+)
+# The Cloudflare challenge must still load or clearance never arrives
+DEFAULT_ALLOWED_DOMAINS = ('challenges.cloudflare.com',)
+
+# CDP Network.setBlockedURLs only matches URLs, so resource types map to file extensions
+TYPE_EXTENSIONS = {
+    'image': ('png', 'jpg', 'jpeg', 'gif', 'webp', 'avif', 'svg', 'ico'),
+    'media': ('mp4', 'webm', 'ogg', 'mp3', 'wav', 'm4a'),
+    'font': ('woff', 'woff2', 'ttf', 'otf', 'eot'),
+    'stylesheet': ('css',),
+}
+
+# Typical transfer sizes, used to estimate the bytes a blocked request would have cost
+ESTIMATED_BYTES = {
+    'image': 40 * 1024,
+    'media': 500 * 1024,
+    'font': 35 * 1024,
+    'stylesheet': 20 * 1024,
+    'script': 45 * 1024,
+}
+DEFAULT_ESTIMATED_BYTES = 10 * 1024
+
+# Lists the subresources a Selenium-loaded page referenced and the bytes it actually transferred
+PAGE_RESOURCES_SCRIPT = """
+var urls = [];
+var add = function(url, type) { if (url) { urls.push([url, type]); } };
+Array.prototype.forEach.call(document.images, function(img) { add(img.currentSrc || img.src, 'image'); });
+Array.prototype.forEach.call(document.querySelectorAll('video[src], audio[src], source[src]'),
+    function(el) { add(el.src, 'media'); });
+Array.prototype.forEach.call(document.scripts, function(s) { add(s.src, 'script'); });
+Array.prototype.forEach.call(document.querySelectorAll('link[rel~=stylesheet]'),
+    function(l) { add(l.href, 'stylesheet'); });
+Array.prototype.forEach.call(document.querySelectorAll('link[as=font]'), function(l) { add(l.href, 'font'); });
+Array.prototype.forEach.call(document.querySelectorAll('iframe[src]'), function(f) { add(f.src, 'other'); });
+var loaded = 0;
+performance.getEntriesByType('resource').forEach(function(e) { loaded += e.transferSize || 0; });
+return {resources: urls, loaded: loaded};
+"""
+
+
+def _host_matches(host, domains):
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+
+class ResourceStats:
+    """Thread-safe counts of blocked requests and the bytes they would have cost"""
+
+    def __init__(self):
+        self.blocked = {}
+        self.bytes_saved = 0
+        self.bytes_loaded = 0
+        self.pages = 0
+        self._lock = threading.Lock()
+
+    def record_blocked(self, reason, resource_type):
+        saved = ESTIMATED_BYTES.get(resource_type, DEFAULT_ESTIMATED_BYTES)
+        with self._lock:
+            self.blocked[reason] = self.blocked.get(reason, 0) + 1
+            self.bytes_saved += saved
+        METRICS.inc('resources_blocked')
+        METRICS.inc('resource_bytes_saved', saved)
+
+    def record_page(self, bytes_loaded):
+        with self._lock:
+            self.pages += 1
+            self.bytes_loaded += bytes_loaded
+
+    def log_report(self):
+        with self._lock:
+            blocked = dict(self.blocked)
+            saved, loaded, pages = self.bytes_saved, self.bytes_loaded, self.pages
+        if not blocked:
+            return
+        reasons = ', '.join(f"{reason}: {count}" for reason, count in sorted(blocked.items()))
+        logging.info(f"Blocked {sum(blocked.values())} browser requests ({reasons}), "
+                     f"~{saved / (1024 * 1024):.1f} MB saved")
+        if pages:
+            logging.info(f"Browser pages transferred {loaded / (1024 * 1024):.1f} MB over {pages} pages")
+
+
+class ResourcePolicy:
+    """Allow/deny rules for browser subresources by resource type and domain
+
+    Allowed domains always load. Otherwise a request is blocked when its
+    resource type or its host (including subdomains) is on a deny list. The
+    page document itself is never blocked.
+    """
+
+    def __init__(self, blocked_types=DEFAULT_BLOCKED_TYPES, blocked_domains=DEFAULT_BLOCKED_DOMAINS,
+                 allowed_domains=DEFAULT_ALLOWED_DOMAINS):
+        self.blocked_types = set(blocked_types)
+        self.blocked_domains = tuple(blocked_domains)
+        self.allowed_domains = tuple(allowed_domains)
+        self.stats = ResourceStats()
+
+    def block_reason(self, url, resource_type):
+        """Return why a request should be blocked ('type:<type>' or 'domain'), or None to let it load"""
+        if resource_type == 'document':
+            return None
+        host = urlparse(url).hostname or ''
+        if _host_matches(host, self.allowed_domains):
+            return None
+        if resource_type in self.blocked_types:
+            return f'type:{resource_type}'
+        if _host_matches(host, self.blocked_domains):
+            return 'domain'
+        return None
+
+    def url_patterns(self):
+        """Wildcard patterns for CDP Network.setBlockedURLs
+
+        CDP cannot block by resource type or make exceptions, so types become
+        file extension patterns and allowed domains are only honoured by
+        Playwright routing.
+        """
+        patterns = []
+        for resource_type in sorted(self.blocked_types):
+            for extension in TYPE_EXTENSIONS.get(resource_type, ()):
+                patterns.extend([f'*.{extension}', f'*.{extension}?*'])
+        for domain in self.blocked_domains:
+            patterns.extend([f'*://{domain}/*', f'*://*.{domain}/*'])
+        return patterns
+
+    def apply_to_driver(self, driver):
+        """Block matching requests in a Chrome WebDriver through CDP"""
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.url_patterns()})
+        except Exception as e:
+            logging.warning(f"Could not enable request blocking: {str(e)}")
+
+    def record_driver_page(self, driver):
+        """Count what the policy blocked on the page loaded in driver and what it transferred
+
+        CDP does not report blocked requests, so they are counted from the
+        subresources the DOM references.
+        """
+        try:
+            page = driver.execute_script(PAGE_RESOURCES_SCRIPT) or {}
+        except Exception as e:
+            logging.debug(f"Could not read page resources: {str(e)}")
+            return
+        for url, resource_type in page.get('resources', []):
+            reason = self.block_reason(url, resource_type)
+            if reason:
+                self.stats.record_blocked(reason, resource_type)
+        self.stats.record_page(page.get('loaded', 0))
+
+    def route(self, route):
+        """Playwright route handler: abort blocked requests and continue the rest"""
+        request = route.request
+        reason = self.block_reason(request.url, request.resource_type)
+        if reason:
+            self.stats.record_blocked(reason, request.resource_type)
+            route.abort('blockedbyclient')
+        else:
+            route.continue_()
+
+    def apply_to_context(self, context):
+        """Route every request of a Playwright browser context through the policy"""
+        context.route('**/*', self.route)
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+
+
+class CacheMiss(Exception):
+    """Raised in replay-only mode when a URL is not in the cache"""
+
+
+class CachedResponse:
+    """Response object rebuilt from a cache entry"""
+    def __init__(self, url, content, status_code, headers):
+        self.url = url
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers
+        self.from_cache = True
+
+
+class ResponseCache:
+    """On-disk HTTP response cache with TTL and size-bounded LRU eviction
+
+    Entries are addressed by the SHA-256 of the URL and stored as one file
+    holding a JSON metadata line followed by the zlib-compressed body. A read
+    bumps the file's mtime, so eviction removes the least recently used
+    entries first. In replay_only mode expired entries are still served and a
+    miss raises CacheMiss instead of going to the network.
+    """
+
+    def __init__(self, cache_dir, ttl=86400, max_bytes=512 * 1024 * 1024, replay_only=False):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.replay_only = replay_only
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    def _path(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + '.cache')
+
+    def _entries(self):
+        """Yield (path, size, last_used) for every entry on disk"""
+        for root, _, files in os.walk(self.cache_dir):
+            for filename in files:
+                if not filename.endswith('.cache'):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def get(self, url):
+        """Get a cached response for url, or None if missing or expired"""
+        path = self._path(url)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if not self.replay_only and time.time() - meta['stored_at'] > self.ttl:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return CachedResponse(url, zlib.decompress(body), meta['status_code'], meta['headers'])
+
+    def put(self, url, response):
+        """Store a successful response"""
+        if response.status_code != 200:
+            return
+        meta = {
+            'url': url,
+            'status_code': response.status_code,
+            'headers': dict(getattr(response, 'headers', {}) or {}),
+            'stored_at': time.time()
+        }
+        data = json.dumps(meta).encode('utf-8') + b'\n' + zlib.compress(response.content, 6)
+
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self._lock:
+            try:
+                previous_size = os.path.getsize(path)
+            except OSError:
+                previous_size = 0
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._total_bytes += len(data) - previous_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until under 90% of max_bytes"""
+        target = self.max_bytes * 0.9
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        removed = 0
+        for path, size, _ in entries:
+            if self._total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._total_bytes -= size
+            removed += 1
+        logging.info(f"Response cache evicted {removed} entries, {self._total_bytes / 1e6:.1f} MB in use")
+
+    def log_stats(self):
+        logging.info(f"Response cache: {self.hits} hits, {self.misses} misses, "
+                     f"{self._total_bytes / 1e6:.1f} MB on disk")
@@ -0,0 +1,236 @@
+import csv
+import json
+import logging
+import os
+from json.encoder import encode_basestring_ascii
+from operator import attrgetter
+
+# pyarrow takes a while to import, so it is loaded only when Parquet output is requested
+pa = None
+pq = None
+
+
+def _load_pyarrow():
+    """Import pyarrow on first use; False when it is not installed"""
+    global pa, pq
+    if pa is None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            return False
+        pa, pq = pyarrow, pyarrow.parquet
+    return True
+
+
+def _encode_value(value):
+    if type(value) is str:
+        return encode_basestring_ascii(value)
+    if value is None:
+        return 'null'
+    return json.dumps(value)
+
+
+class RecordSerializer:
+    """Schema-driven CSV rows and JSON text shared by every sink
+
+    Records are dicts or objects with an attribute per field (StoreRecord).
+    Only the schema's fields are written, in schema order. JSON keys are
+    encoded once, and each value goes straight to the C string encoder.
+    The text is the same as json.dumps gives for a dict of those fields,
+    and with indent=2 the same as an indented element of a json.dump array.
+    """
+
+    def __init__(self, fieldnames):
+        self.fieldnames = tuple(fieldnames)
+        getter = attrgetter(*self.fieldnames)
+        self._getter = getter if len(self.fieldnames) > 1 else lambda record: (getter(record),)
+        self._keys = [encode_basestring_ascii(field) + ': ' for field in self.fieldnames]
+
+    def values(self, record):
+        """Field values in schema order; None for fields a dict does not have"""
+        if isinstance(record, dict):
+            return tuple([record.get(field) for field in self.fieldnames])
+        return self._getter(record)
+
+    def _members(self, record):
+        return [key + _encode_value(value) for key, value in zip(self._keys, self.values(record))]
+
+    def to_json(self, record):
+        """One-line JSON object, as written to JSONL"""
+        return '{' + ', '.join(self._members(record)) + '}'
+
+    def to_indented_json(self, record):
+        """JSON object indented as an element of a top-level array"""
+        return '  {\n    ' + ',\n    '.join(self._members(record)) + '\n  }'
+
+
+class StreamingSink:
+    """Writes records to <path>.part as they arrive and renames it on finalize
+
+    Records are buffered up to buffer_size and then written out, so memory
+    stays bounded and a crash leaves every flushed record in the .part file.
+    finalize() fsyncs and atomically renames the file into place.
+    """
+
+    def __init__(self, path, buffer_size=100):
+        self.path = path
+        self.part_path = path + '.part'
+        self.buffer_size = buffer_size
+        self.count = 0
+        self._buffer = []
+        self._file = self._open()
+
+    def _open(self):
+        return open(self.part_path, 'w', newline='', encoding='utf-8')
+
+    def write(self, record):
+        self._buffer.append(record)
+        self.count += 1
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._write_records(self._buffer)
+            self._buffer = []
+        self._file.flush()
+
+    def _write_records(self, records):
+        raise NotImplementedError
+
+    def _write_footer(self):
+        pass
+
+    def finalize(self):
+        """Flush, fsync and move the finished file to its final path"""
+        self.flush()
+        self._write_footer()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.part_path, self.path)
+        logging.info(f"Saved {self.count} results to {self.path}")
+
+    def close(self):
+        """Flush and close without finalizing, keeping the .part file"""
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+class JsonlSink(StreamingSink):
+    def __init__(self, path, fieldnames, buffer_size=100):
+        self.serializer = RecordSerializer(fieldnames)
+        super().__init__(path, buffer_size)
+
+    def _write_records(self, records):
+        to_json = self.serializer.to_json
+        self._file.write(''.join([to_json(record) + '\n' for record in records]))
+
+
+class JsonSink(StreamingSink):
+    """Streams a JSON array formatted like json.dump(records, f, indent=2)"""
+
+    def __init__(self, path, fieldnames, buffer_size=100):
+        self.serializer = RecordSerializer(fieldnames)
+        self._started = False
+        super().__init__(path, buffer_size)
+
+    def _write_records(self, records):
+        to_json = self.serializer.to_indented_json
+        parts = []
+        for record in records:
+            parts.append(',\n' if self._started else '[\n')
+            parts.append(to_json(record))
+            self._started = True
+        self._file.write(''.join(parts))
+
+    def _write_footer(self):
+        self._file.write('\n]' if self.count else '[]')
+
+
+class CsvSink(StreamingSink):
+    def __init__(self, path, fieldnames, buffer_size=100):
+        self.fieldnames = fieldnames
+        self.serializer = RecordSerializer(fieldnames)
+        super().__init__(path, buffer_size)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(fieldnames)
+
+    def _write_records(self, records):
+        values = self.serializer.values
+        self._writer.writerows([values(record) for record in records])
+
+
+class ParquetSink(StreamingSink):
+    """Writes each buffered batch as a Parquet row group (requires pyarrow)"""
+
+    def __init__(self, path, fieldnames, buffer_size=1000):
+        if not _load_pyarrow():
+            raise ImportError("pyarrow is required for Parquet output")
+        self.fieldnames = fieldnames
+        self.serializer = RecordSerializer(fieldnames)
+        self.schema = pa.schema([(field, pa.string()) for field in fieldnames])
+        super().__init__(path, buffer_size)
+        self._writer = pq.ParquetWriter(self._file, self.schema)
+
+    def _open(self):
+        return open(self.part_path, 'wb')
+
+    def _write_records(self, records):
+        rows = [self.serializer.values(record) for record in records]
+        columns = {
+            field: [None if row[index] is None else str(row[index]) for row in rows]
+            for index, field in enumerate(self.fieldnames)
+        }
+        self._writer.write_table(pa.table(columns, schema=self.schema))
+
+    def _write_footer(self):
+        self._writer.close()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._writer.close()
+            self._file.close()
+
+
+class MultiSink:
+    """Fans records out to several sinks"""
+
+    def __init__(self, sinks):
+        self.sinks = sinks
+
+    def write(self, record):
+        for sink in self.sinks:
+            sink.write(record)
+
+    def finalize(self):
+        for sink in self.sinks:
+            sink.finalize()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def open_sinks(base_path, formats, fieldnames, buffer_size=100):
+    """Open one streaming sink per format ('json', 'jsonl', 'csv', 'parquet') under base_path"""
+    sinks = []
+    for fmt in formats:
+        path = f'{base_path}.{fmt}'
+        if fmt == 'json':
+            sinks.append(JsonSink(path, fieldnames, buffer_size))
+        elif fmt == 'jsonl':
+            sinks.append(JsonlSink(path, fieldnames, buffer_size))
+        elif fmt == 'csv':
+            sinks.append(CsvSink(path, fieldnames, buffer_size))
+        elif fmt == 'parquet':
+            if not _load_pyarrow():
+                logging.warning("pyarrow is not installed, skipping Parquet output")
+                continue
+            sinks.append(ParquetSink(path, fieldnames))
+        else:
+            raise ValueError(f"Unknown result format: {fmt}")
+    return MultiSink(sinks)
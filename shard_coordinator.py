@@ -0,0 +1,317 @@
+"""Sharded crawl of the listing pages across processes or containers
+
+The listing pages are the shards. A coordinator seeds a SQLite work queue
+with pages 1..N; any number of workers (local processes, or containers of
+the docker-compose scraper-worker service sharing the ./data volume) claim
+pages, scrape them with their own CannabisScraper driver and store the
+results. Results are keyed by store URL, so a store that appears on several
+pages or is scraped twice after a retry is only kept once.
+
+Usage:
+    python shard_coordinator.py coordinator --workers 4      # local process pool
+    python shard_coordinator.py coordinator --resume         # finish an interrupted crawl
+    python shard_coordinator.py init --pages 13              # seed the queue for container workers
+    python shard_coordinator.py worker                       # run one worker
+    python shard_coordinator.py merge                        # write merged stores.csv / stores.json
+    python shard_coordinator.py merge --partial              # ... even if some pages are not done
+    python shard_coordinator.py status
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time
+
+from cannabis_scraper_improved import CannabisScraper, STORE_FIELDS
+from result_sinks import open_sinks
+from store_pipeline import StorePipeline
+
+DEFAULT_QUEUE = os.path.join('data', 'work_queue.db')
+
+
+class IncompleteCrawl(Exception):
+    """Raised when merging a crawl whose pages are not all done"""
+
+
+class WorkQueue:
+    """SQLite work queue of listing pages shared by all workers"""
+
+    def __init__(self, path, lease_timeout=1800, max_attempts=3):
+        self.path = path
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS shards ("
+            " page INTEGER PRIMARY KEY,"
+            " state TEXT NOT NULL DEFAULT 'pending',"
+            " worker TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT,"
+            " updated_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " url TEXT PRIMARY KEY,"
+            " page INTEGER NOT NULL,"
+            " position INTEGER NOT NULL,"
+            " record TEXT NOT NULL,"
+            " seen INTEGER NOT NULL DEFAULT 1)"
+        )
+
+    def reset(self):
+        """Drop every shard and result of the previous crawl"""
+        with self._conn:
+            self._conn.execute("DELETE FROM shards")
+            self._conn.execute("DELETE FROM results")
+
+    def requeue(self):
+        """Return pages a previous crawl left unfinished to pending; returns how many
+
+        Pages still in_progress belong to workers that are gone, so they are
+        not left to wait out their lease. Failed pages get another
+        max_attempts tries.
+        """
+        with self._conn:
+            interrupted = self._conn.execute(
+                "UPDATE shards SET state = 'pending', worker = NULL, updated_at = ? WHERE state = 'in_progress'",
+                (time.time(),)
+            ).rowcount
+            failed = self._conn.execute(
+                "UPDATE shards SET state = 'pending', worker = NULL, attempts = 0, updated_at = ?"
+                " WHERE state = 'failed'",
+                (time.time(),)
+            ).rowcount
+        return interrupted + failed
+
+    def add_pages(self, pages):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO shards (page, updated_at) VALUES (?, ?)",
+                [(page, time.time()) for page in pages]
+            )
+
+    def claim(self, worker):
+        """Take the next pending page (or one whose lease expired), or None when done"""
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(
+                "SELECT page FROM shards"
+                " WHERE state = 'pending' OR (state = 'in_progress' AND updated_at < ?)"
+                " ORDER BY page LIMIT 1",
+                (now - self.lease_timeout,)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE shards SET state = 'in_progress', worker = ?, attempts = attempts + 1,"
+                    " updated_at = ? WHERE page = ?",
+                    (worker, now, row[0])
+                )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return row[0] if row is not None else None
+
+    def complete(self, page, stores):
+        """Store a page's results and mark it done
+
+        A URL seen on several pages keeps the record from the earliest page.
+        """
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO results (url, page, position, record) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(url) DO UPDATE SET"
+                "  seen = seen + 1,"
+                "  record = CASE WHEN excluded.page < page THEN excluded.record ELSE record END,"
+                "  position = CASE WHEN excluded.page < page THEN excluded.position ELSE position END,"
+                "  page = MIN(page, excluded.page)",
+                [
+                    (store['url'], page, position, json.dumps(dict(store)))
+                    for position, store in enumerate(stores)
+                    if store.get('url')
+                ]
+            )
+            self._conn.execute(
+                "UPDATE shards SET state = 'done', error = NULL, updated_at = ? WHERE page = ?",
+                (time.time(), page)
+            )
+
+    def fail(self, page, error):
+        """Return a page to the queue, or mark it failed after max_attempts"""
+        with self._conn:
+            self._conn.execute(
+                "UPDATE shards SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,"
+                " error = ?, updated_at = ? WHERE page = ?",
+                (self.max_attempts, error, time.time(), page)
+            )
+
+    def status(self):
+        counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM shards GROUP BY state").fetchall())
+        stores, seen = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(seen), 0) FROM results").fetchone()
+        counts['stores'] = stores
+        counts['duplicates'] = seen - stores
+        return counts
+
+    def unfinished(self):
+        """Return the pages that are not done, with their state"""
+        return self._conn.execute("SELECT page, state FROM shards WHERE state != 'done' ORDER BY page").fetchall()
+
+    def results(self):
+        """Yield merged store records in listing order"""
+        for (record,) in self._conn.execute("SELECT record FROM results ORDER BY page, position"):
+            yield json.loads(record)
+
+    def close(self):
+        self._conn.close()
+
+
+def run_worker(queue_path=DEFAULT_QUEUE, worker_id=None, **scraper_options):
+    """Claim and scrape listing pages until the queue is empty"""
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    work = WorkQueue(queue_path)
+    scraper = CannabisScraper(**scraper_options)
+    scraper.browser = scraper.new_browser(f"worker {worker_id}")
+    try:
+        while True:
+            page = work.claim(worker_id)
+            if page is None:
+                logging.info(f"Worker {worker_id}: no pages left")
+                break
+
+            logging.info(f"Worker {worker_id}: scraping page {page}")
+            try:
+                # Also replaces a driver that died on the previous page
+                driver = scraper.browser.recycle_if_needed()
+                driver.get(scraper.listing_url(page))
+                scraper.browser.page_loaded()
+                before = len(scraper.stores)
+                scraper.scrape_listing_page(driver, page)
+                work.complete(page, scraper.stores[before:])
+            except Exception as e:
+                logging.error(f"Worker {worker_id}: page {page} failed: {str(e)}")
+                work.fail(page, str(e))
+    finally:
+        scraper.quit_detail_drivers()
+        scraper.browser.log_stats()
+        scraper.browser.close()
+        work.close()
+
+
+def merge_results(queue_path=DEFAULT_QUEUE, output='stores', formats=('csv', 'json'), normalize=True,
+                  partial=False):
+    """Write the deduplicated stores from the work queue to the result files
+
+    With normalize, stores listed under different URLs are merged too (see store_pipeline).
+    Raises IncompleteCrawl if any page is not done, unless partial is set.
+    """
+    work = WorkQueue(queue_path)
+    try:
+        unfinished = work.unfinished()
+        if unfinished:
+            pages = ', '.join(f"{page} ({state})" for page, state in unfinished)
+            if not partial:
+                raise IncompleteCrawl(f"{len(unfinished)} listing pages are not done: {pages}; "
+                                      f"finish them with --resume or merge with --partial")
+            logging.warning(f"Merging a partial crawl, {len(unfinished)} listing pages are not done: {pages}")
+        status = work.status()
+        stores = work.results()
+        if normalize:
+            stores = StorePipeline().run(stores)
+        sink = open_sinks(output, formats, STORE_FIELDS)
+        for store_info in stores:
+            sink.write(store_info)
+        sink.finalize()
+        logging.info(f"Merged {status['stores']} stores, dropped {status['duplicates']} duplicates; "
+                     f"pages done: {status.get('done', 0)}, failed: {status.get('failed', 0)}")
+    finally:
+        work.close()
+
+
+def seed_queue(queue_path=DEFAULT_QUEUE, pages=13, resume=False):
+    """Queue listing pages 1..pages for a new crawl, or keep the previous crawl's progress with resume"""
+    work = WorkQueue(queue_path)
+    try:
+        if resume:
+            logging.info(f"Resuming crawl: {work.status()}")
+            requeued = work.requeue()
+            if requeued:
+                logging.info(f"Requeued {requeued} interrupted or failed pages")
+        else:
+            work.reset()
+        work.add_pages(range(1, pages + 1))
+    finally:
+        work.close()
+
+
+def run_coordinator(queue_path=DEFAULT_QUEUE, pages=13, workers=4, output='stores', normalize=True,
+                    resume=False, **scraper_options):
+    """Scrape all listing pages with a local pool of worker processes and merge the results"""
+    seed_queue(queue_path, pages, resume)
+
+    processes = [
+        multiprocessing.Process(
+            target=run_worker,
+            args=(queue_path, f"{socket.gethostname()}-worker{i}"),
+            kwargs=scraper_options
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    merge_results(queue_path, output, normalize=normalize)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded listing crawl")
+    parser.add_argument('command', choices=['coordinator', 'init', 'worker', 'merge', 'status'])
+    parser.add_argument('--queue', default=DEFAULT_QUEUE, help='SQLite work queue path')
+    parser.add_argument('--pages', type=int, default=13, help='listing pages to crawl')
+    parser.add_argument('--workers', type=int, default=4, help='local worker processes')
+    parser.add_argument('--output', default='stores', help='base path of the merged result files')
+    parser.add_argument('--detail-workers', type=int, default=1, help='drivers per worker for store pages')
+    parser.add_argument('--card-extraction', action='store_true', help='read stores from listing cards')
+    parser.add_argument('--resume', action='store_true',
+                        help='coordinator/init: keep the pages and results of the previous crawl instead of starting over')
+    parser.add_argument('--partial', action='store_true',
+                        help='merge: write the results even if some pages are not done')
+    parser.add_argument('--no-normalize', action='store_true',
+                        help='only drop repeated URLs when merging, without normalizing or merging near-duplicates')
+    args = parser.parse_args()
+
+    scraper_options = {
+        'detail_workers': args.detail_workers,
+        'card_extraction': args.card_extraction
+    }
+    try:
+        if args.command == 'coordinator':
+            run_coordinator(args.queue, args.pages, args.workers, args.output, not args.no_normalize, args.resume,
+                            **scraper_options)
+        elif args.command == 'init':
+            seed_queue(args.queue, args.pages, args.resume)
+        elif args.command == 'worker':
+            run_worker(args.queue, **scraper_options)
+        elif args.command == 'merge':
+            merge_results(args.queue, args.output, normalize=not args.no_normalize, partial=args.partial)
+        else:
+            work = WorkQueue(args.queue)
+            print(json.dumps(work.status(), indent=2))
+            work.close()
+    except IncompleteCrawl as e:
+        logging.error(f"Not merging: {str(e)}")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
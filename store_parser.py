@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+_LXML_ADDRESS = f"//*[{_has_class('store-address')}]"
+_LXML_PHONE = f"//*[{_has_class('store-phone')}]"
+_LXML_WEBSITE = f"//*[{_has_class('store-website')}]"
+_LXML_STORE_LINKS = f"//div[{_has_class('store-listing')}]/a/@href"
+
+
+def _require(node, field):
+    if node is None:
+        raise ValueError(f"Store page has no {field}")
+    return node
+
+
+def parse_with_selectolax(content):
+    tree = LexborHTMLParser(content)
+    website = tree.css_first('.store-website')
+    return {
+        'name': _require(tree.css_first('h1'), 'name').text().strip(),
+        'address': _require(tree.css_first('.store-address'), 'address').text().strip(),
+        'phone': _require(tree.css_first('.store-phone'), 'phone').text().strip(),
+        'website': website.attributes.get('href') if website is not None else None
+    }
+
+
+def parse_with_lxml(content):
+    doc = lxml.html.fromstring(content)
+
+    def first(xpath):
+        nodes = doc.xpath(xpath)
+        return nodes[0] if nodes else None
+
+    website = first(_LXML_WEBSITE)
+    return {
+        'name': _require(first('//h1'), 'name').text_content().strip(),
+        'address': _require(first(_LXML_ADDRESS), 'address').text_content().strip(),
+        'phone': _require(first(_LXML_PHONE), 'phone').text_content().strip(),
+        'website': website.get('href') if website is not None else None
+    }
+
+
+def parse_with_bs4(content):
+    # Imported on first use; BeautifulSoup is only the fallback when no faster parser is installed
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+    website = soup.select_one('.store-website')
+    return {
+        'name': _require(soup.find('h1'), 'name').text.strip(),
+        'address': _require(soup.select_one('.store-address'), 'address').text.strip(),
+        'phone': _require(soup.select_one('.store-phone'), 'phone').text.strip(),
+        'website': website.get('href') if website is not None else None
+    }
+
+
+def links_with_selectolax(content):
+    return [node.attributes.get('href') for node in LexborHTMLParser(content).css('div.store-listing > a')]
+
+
+def links_with_lxml(content):
+    return [str(href) for href in lxml.html.fromstring(content).xpath(_LXML_STORE_LINKS)]
+
+
+def links_with_bs4(content):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+    return [link.get('href') for link in soup.select('div.store-listing > a')]
+
+
+LINK_PARSERS = {
+    'selectolax': links_with_selectolax,
+    'lxml': links_with_lxml,
+    'bs4': links_with_bs4,
+}
+
+
+# Fastest first; 'auto' picks the first one whose library is installed
+ENGINES = {
+    'selectolax': (parse_with_selectolax, lambda: LexborHTMLParser is not None),
+    'lxml': (parse_with_lxml, lambda: lxml is not None),
+    'bs4': (parse_with_bs4, lambda: True),
+}
+
+
+def available_engines():
+    return [name for name, (_, available) in ENGINES.items() if available()]
+
+
+_warned_bs4_fallback = False
+
+
+def _warn_bs4_fallback():
+    """Warn once per process that pages are parsed with the slow bs4 engine"""
+    global _warned_bs4_fallback
+    if not _warned_bs4_fallback:
+        _warned_bs4_fallback = True
+        logging.warning("Neither selectolax nor lxml is installed, parsing with bs4, which is much slower; "
+                        "install them from requirements.txt")
+
+
+def resolve_engine(engine='auto'):
+    """Get the name of the parser engine to use, falling back to bs4"""
+    if engine == 'auto':
+        engine = available_engines()[0]
+    elif engine not in ENGINES:
+        raise ValueError(f"Unknown parser engine: {engine}")
+    elif not ENGINES[engine][1]():
+        engine = 'bs4'
+    if engine == 'bs4' and not _warned_bs4_fallback and len(available_engines()) == 1:
+        _warn_bs4_fallback()
+    return engine
+
+
+class ParseStats:
+    """Thread-safe parse timings per engine"""
+
+    def __init__(self):
+        self.pages = {}
+        self.seconds = {}
+        self._lock = threading.Lock()
+
+    def record(self, engine, elapsed):
+        with self._lock:
+            self.pages[engine] = self.pages.get(engine, 0) + 1
+            self.seconds[engine] = self.seconds.get(engine, 0.0) + elapsed
+
+    def report(self):
+        """Return {engine: (pages, mean milliseconds per page)}"""
+        with self._lock:
+            return {
+                engine: (pages, self.seconds[engine] * 1000 / pages)
+                for engine, pages in self.pages.items()
+            }
+
+
+PARSE_STATS = ParseStats()
+
+
+def parse_store(content, engine='auto'):
+    """Extract name, address, phone and website from a store page"""
+    engine = resolve_engine(engine)
+    start = time.perf_counter()
+    try:
+        return ENGINES[engine][0](content)
+    finally:
+        PARSE_STATS.record(engine, time.perf_counter() - start)
+
+
+def parse_store_links(content, engine='auto'):
+    """Extract the store page links, as written in the page, from a listings page"""
+    links = LINK_PARSERS[resolve_engine(engine)](content)
+    return [link for link in links if link]
@@ -0,0 +1,442 @@
+"""Post-scrape normalization and deduplication of store records
+
+Phone numbers are rewritten to E.164 (South African numbers by default) and
+addresses to one canonical spelling. Duplicates are then found without
+comparing every pair of stores: candidate pairs come from blocking keys
+(same URL, same phone number) and from MinHash/LSH buckets over the
+character shingles of name and address, and each candidate is confirmed by
+the exact Jaccard similarity of the shingles. Duplicates are merged into
+the most complete record, with its empty fields filled from the others.
+
+Usage:
+    python store_pipeline.py cannabis_stores_20240101_120000.jsonl --output stores_clean
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import random
+import re
+import time
+import unicodedata
+import zlib
+from collections import Counter, defaultdict
+
+from metrics import METRICS
+from result_sinks import open_sinks
+from store_record import RECORD_FIELDS, StoreRecord
+
+ZA_COUNTRY_CODE = '27'
+ZA_NATIONAL_LENGTH = 9  # Digits after the country code, without the trunk 0
+
+# Abbreviations written out in canonical addresses
+STREET_TYPES = {
+    'st': 'Street', 'str': 'Street', 'rd': 'Road', 'ave': 'Avenue', 'av': 'Avenue', 'dr': 'Drive',
+    'blvd': 'Boulevard', 'cres': 'Crescent', 'ln': 'Lane', 'pl': 'Place', 'hwy': 'Highway',
+    'sq': 'Square', 'ct': 'Court', 'ctr': 'Centre', 'cntr': 'Centre', 'ext': 'Extension'
+}
+CORNER_WORDS = {'cnr': 'Corner', 'crn': 'Corner', 'c/o': 'Corner'}
+PROVINCES = {
+    'wc': 'Western Cape', 'ec': 'Eastern Cape', 'nc': 'Northern Cape', 'gp': 'Gauteng', 'gt': 'Gauteng',
+    'kzn': 'KwaZulu-Natal', 'fs': 'Free State', 'nw': 'North West', 'lp': 'Limpopo', 'mp': 'Mpumalanga'
+}
+COUNTRY_NAMES = {'south africa', 'za', 'rsa'}
+
+# Words that say what a store is rather than which store it is
+NAME_STOPWORDS = {
+    'the', 'and', 'dispensary', 'cannabis', 'club', 'store', 'shop', 'co', 'pty', 'ltd', 'cc', 'sa'
+}
+
+_PHONE_EXTENSION = re.compile(r'\s*(?:ext\.?|extension|x)\s*\d+\s*$', re.IGNORECASE)
+_PHONE_SEPARATORS = re.compile(r'[/;,|]|\bor\b', re.IGNORECASE)
+_ADDRESS_BREAKS = re.compile(r'\s*(?:[,;|\n\r\t]|\s-\s)\s*')
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+_NUMBER = re.compile(r'\d+')
+_WHITESPACE = re.compile(r'\s+')
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_phone(raw, country_code=ZA_COUNTRY_CODE, national_length=ZA_NATIONAL_LENGTH):
+    """Return a phone number in E.164 form (+27215550142), or None if it is not a valid number
+
+    Numbers without a country code are read as national numbers of
+    country_code. When the field holds several numbers the first one is used.
+    """
+    if not raw:
+        return None
+    text = _PHONE_SEPARATORS.split(_PHONE_EXTENSION.sub('', unicodedata.normalize('NFKC', raw)))[0].strip()
+    digits = re.sub(r'\D', '', text)
+    international = text.startswith('+')
+    if not international and digits.startswith('00'):
+        digits, international = digits[2:], True
+    if digits.startswith(country_code) and (international or len(digits) == len(country_code) + national_length):
+        national = digits[len(country_code):]
+        # "+27 (0)21 ..." keeps the trunk prefix after the country code
+        if len(national) == national_length + 1 and national.startswith('0'):
+            national = national[1:]
+    elif international:
+        return f'+{digits}' if 8 <= len(digits) <= 15 else None
+    elif len(digits) == national_length + 1 and digits.startswith('0'):
+        national = digits[1:]
+    else:
+        national = digits
+    if len(national) != national_length or national.startswith('0'):
+        return None
+    return f'+{country_code}{national}'
+
+
+def _fold(text):
+    """Lowercase ASCII text with accents removed"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def _canonical_part(part):
+    words = part.split(' ')
+    if part.islower() or part.isupper():
+        words = [word if any(c.isdigit() for c in word) else word.capitalize() for word in words]
+    for i, word in enumerate(words):
+        key = word.lower().rstrip('.')
+        if key in CORNER_WORDS:
+            words[i] = CORNER_WORDS[key]
+        # "St" leading a street name is Saint (St Georges Mall), so only later words are expanded
+        elif key in STREET_TYPES and i > 0 and not words[i - 1][:1].isdigit():
+            words[i] = STREET_TYPES[key]
+    return ' '.join(words)
+
+
+def canonicalize_address(raw):
+    """One spelling of an address: comma-separated parts, abbreviations written out, no country"""
+    if not raw:
+        return raw
+    parts = []
+    for part in _ADDRESS_BREAKS.split(unicodedata.normalize('NFKC', raw)):
+        part = _WHITESPACE.sub(' ', part).strip(' .')
+        if not part:
+            continue
+        if part.lower() in PROVINCES:
+            part = PROVINCES[part.lower()]
+        else:
+            part = _canonical_part(part)
+        if parts and parts[-1].lower() == part.lower():
+            continue
+        parts.append(part)
+    while parts and parts[-1].lower() in COUNTRY_NAMES:
+        parts.pop()
+    return ', '.join(parts)
+
+
+def name_key(name):
+    """A store name reduced to the words that identify it"""
+    words = _NON_ALNUM.sub(' ', _fold(name or '')).split()
+    significant = [word for word in words if word not in NAME_STOPWORDS]
+    return ' '.join(significant or words)
+
+
+def address_key(address):
+    return ' '.join(_NON_ALNUM.sub(' ', _fold(address or '')).split())
+
+
+def shingles(text, size=3, prefix=''):
+    """Character shingles of text, padded so short strings still have some"""
+    text = f' {text} '
+    if len(text) <= size:
+        return {prefix + text}
+    return {prefix + text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    common = len(a & b)
+    return common / (len(a) + len(b) - common)
+
+
+def numbers_agree(a, b):
+    """True when the numbers of one store are all among the other's, counting repeats"""
+    if a == b:
+        return True
+    distinct_a, distinct_b = frozenset(a), frozenset(b)
+    if not (distinct_a <= distinct_b or distinct_b <= distinct_a):
+        return False
+    counts_a, counts_b = Counter(a), Counter(b)
+    return counts_a <= counts_b or counts_b <= counts_a
+
+
+class MinHasher:
+    """MinHash signatures over sets of strings
+
+    Each of num_perm hash functions is a random affine map modulo a Mersenne
+    prime applied to the CRC32 of a shingle, so signatures are the same in
+    every run. Stores share most of their shingles (street and city names),
+    so the hash values of each shingle are computed once and a signature is
+    the element-wise minimum of its shingles' values.
+    """
+
+    def __init__(self, num_perm=32, seed=1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._perms = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                       for _ in range(num_perm)]
+        self._values = {}
+
+    def _hash_values(self, item):
+        values = self._values.get(item)
+        if values is None:
+            h = zlib.crc32(item.encode('utf-8'))
+            values = self._values[item] = tuple([(a * h + b) % _MERSENNE_PRIME for a, b in self._perms])
+        return values
+
+    def signature(self, items):
+        if not items:
+            return (0,) * self.num_perm
+        return tuple(map(min, zip(*[self._hash_values(item) for item in items])))
+
+    def clear(self):
+        self._values.clear()
+
+
+class StorePipeline:
+    """Normalizes store records and merges duplicates
+
+    Two stores are duplicates when they share a URL, or when the numbers in
+    their names and addresses do not conflict and either the Jaccard
+    similarity of their name and address shingles reaches threshold (with
+    the names alone reaching field_threshold), or they share a phone number
+    and their names or addresses reach field_threshold. Candidates are drawn
+    from blocks (URL, phone) and from LSH buckets of bands MinHash bands. In
+    blocks larger than max_block_size (a call centre number shared by a
+    chain, a bucket of stores on one street) each store is only compared
+    with the next window stores in sorted order, so no key makes the run
+    quadratic.
+    """
+
+    def __init__(self, threshold=0.7, field_threshold=0.5, num_perm=32, bands=8, max_block_size=50, window=10,
+                 country_code=ZA_COUNTRY_CODE):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.field_threshold = field_threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_block_size = max_block_size
+        self.window = window
+        self.country_code = country_code
+        self.hasher = MinHasher(num_perm)
+        self.stats = {}
+
+    def normalize(self, record):
+        """A normalized copy of a store record; numbers that are not valid are kept as they were"""
+        store = StoreRecord.from_dict(record)
+        phone = normalize_phone(store.phone, self.country_code)
+        if phone:
+            if phone != store.phone:
+                self.stats['phones_normalized'] += 1
+            store.phone = phone
+        elif store.phone:
+            self.stats['phones_invalid'] += 1
+            store.phone = _WHITESPACE.sub(' ', store.phone).strip()
+        address = canonicalize_address(store.address)
+        if address != store.address:
+            self.stats['addresses_changed'] += 1
+            store.address = address
+        return store
+
+    def _candidate_pairs(self, stores, keys, combined):
+        pairs = set()
+        blocks = defaultdict(list)
+        for index, store in enumerate(stores):
+            if store.url:
+                blocks['url', store.url].append(index)
+            if store.phone:
+                blocks['phone', store.phone].append(index)
+            signature = self.hasher.signature(combined[index])
+            for band in range(self.bands):
+                blocks['lsh', band, signature[band * self.rows:(band + 1) * self.rows]].append(index)
+        for key, members in blocks.items():
+            if len(members) < 2:
+                continue
+            if len(members) > self.max_block_size and key[0] != 'url':
+                # Sorted neighbourhood: only stores whose keys sort close together are compared
+                self.stats['blocks_windowed'] += 1
+                members = sorted(members, key=keys.__getitem__)
+                for i, first in enumerate(members):
+                    for second in members[i + 1:i + 1 + self.window]:
+                        pairs.add((min(first, second), max(first, second)))
+                continue
+            for i, first in enumerate(members):
+                for second in members[i + 1:]:
+                    pairs.add((first, second))
+        return pairs
+
+    def _match(self, a, b):
+        """Why the stores at indexes a and b are duplicates, or None"""
+        store_a, store_b = self._stores[a], self._stores[b]
+        if store_a.url and store_a.url == store_b.url:
+            return 'url'
+        names = jaccard(self._names[a], self._names[b])
+        if names >= self.field_threshold and jaccard(self._combined[a], self._combined[b]) >= self.threshold:
+            reason = 'similar'
+        elif store_a.phone and store_a.phone == store_b.phone and (
+                names >= self.field_threshold
+                or jaccard(self._addresses[a], self._addresses[b]) >= self.field_threshold):
+            reason = 'phone'
+        else:
+            return None
+        # Different street, shop or branch numbers mean different stores, however alike the rest is
+        return reason if numbers_agree(self._numbers[a], self._numbers[b]) else None
+
+    def run(self, records):
+        """Return the normalized, deduplicated stores as StoreRecords, in first-seen order"""
+        start = time.perf_counter()
+        self.stats = {
+            'input': 0, 'output': 0, 'duplicates': 0, 'clusters_merged': 0, 'candidate_pairs': 0,
+            'blocks_windowed': 0, 'phones_normalized': 0, 'phones_invalid': 0, 'addresses_changed': 0,
+            'merged_by': Counter()
+        }
+        stores = [self.normalize(record) for record in records]
+        self.stats['input'] = len(stores)
+
+        keys = [(name_key(store.name), address_key(store.address)) for store in stores]
+        self._stores = stores
+        self._names = [shingles(name, prefix='n') for name, _ in keys]
+        self._addresses = [shingles(address, prefix='a') for _, address in keys]
+        self._combined = [names | addresses for names, addresses in zip(self._names, self._addresses)]
+        # Kept with repeats, so a postal code that is also another store's street number does not match it
+        self._numbers = [tuple(sorted(_NUMBER.findall(f'{name} {address}'))) for name, address in keys]
+
+        parent = list(range(len(stores)))
+
+        def find(index):
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+            return index
+
+        pairs = self._candidate_pairs(stores, keys, self._combined)
+        self.stats['candidate_pairs'] = len(pairs)
+        for first, second in sorted(pairs):
+            root_first, root_second = find(first), find(second)
+            if root_first == root_second:
+                continue
+            reason = self._match(first, second)
+            if reason is not None:
+                parent[max(root_first, root_second)] = min(root_first, root_second)
+                self.stats['merged_by'][reason] += 1
+        self._stores = self._names = self._addresses = self._combined = self._numbers = None
+        self.hasher.clear()
+
+        clusters = defaultdict(list)
+        for index in range(len(stores)):
+            clusters[find(index)].append(stores[index])
+        merged = [merge_stores(members) for _, members in sorted(clusters.items())]
+
+        self.stats['output'] = len(merged)
+        self.stats['duplicates'] = len(stores) - len(merged)
+        self.stats['clusters_merged'] = sum(1 for members in clusters.values() if len(members) > 1)
+        self.stats['merged_by'] = dict(self.stats['merged_by'])
+        self.stats['seconds'] = round(time.perf_counter() - start, 3)
+        METRICS.inc('stores_deduplicated', self.stats['duplicates'])
+        self.log_stats()
+        return merged
+
+    def log_stats(self):
+        stats = self.stats
+        merged_by = ', '.join(f"{reason}: {count}" for reason, count in sorted(stats['merged_by'].items()))
+        logging.info(f"Store pipeline: {stats['input']} stores in, {stats['output']} out; "
+                     f"merged {stats['duplicates']} duplicates into {stats['clusters_merged']} stores "
+                     f"({merged_by or 'none'}) from {stats['candidate_pairs']} candidate pairs, "
+                     f"{stats['blocks_windowed']} oversized blocks compared in sorted windows")
+        logging.info(f"Store pipeline: normalized {stats['phones_normalized']} phone numbers "
+                     f"({stats['phones_invalid']} not valid), rewrote {stats['addresses_changed']} addresses "
+                     f"in {stats['seconds']}s")
+
+
+def _completeness(store):
+    return sum(1 for value in store.values() if value)
+
+
+def merge_stores(stores):
+    """Merge duplicates into the most complete record, filling its empty fields from the others"""
+    if len(stores) == 1:
+        return stores[0]
+    best = max(stores, key=_completeness)  # max keeps the first of equally complete records
+    merged = StoreRecord.from_dict(best)
+    for store in stores:
+        for field in RECORD_FIELDS:
+            if not merged[field] and store[field]:
+                setattr(merged, field, store[field])
+    links = []
+    for store in [best] + stores:
+        for link in (store.social_media or '').split(','):
+            link = link.strip()
+            if link and link not in links:
+                links.append(link)
+    merged.social_media = ', '.join(links)
+    return merged
+
+
+def load_records(path):
+    """Read store records and their field names from a JSON, JSONL or CSV result file"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.endswith('.csv'):
+            reader = csv.DictReader(f)
+            records = list(reader)
+            fieldnames = reader.fieldnames or []
+        elif path.endswith('.jsonl'):
+            records = [json.loads(line) for line in f if line.strip()]
+            fieldnames = list(records[0]) if records else []
+        else:
+            records = json.load(f)
+            fieldnames = list(records[0]) if records else []
+    return records, [field for field in fieldnames if field in RECORD_FIELDS]
+
+
+def streaming_formats(formats):
+    """Formats to stream a crawl to so that normalize_result_files() can read it back"""
+    return list(formats) if 'jsonl' in formats else list(formats) + ['jsonl']
+
+
+def normalize_result_files(base_path, formats, fieldnames, pipeline=None):
+    """Rewrite the finalized result files under base_path with normalized, deduplicated stores
+
+    The stores are read back from <base_path>.jsonl, which is removed
+    afterwards when 'jsonl' is not one of formats. Returns the pipeline stats.
+    """
+    pipeline = pipeline or StorePipeline()
+    source = f'{base_path}.jsonl'
+    with open(source, 'r', encoding='utf-8') as f:
+        stores = pipeline.run(json.loads(line) for line in f if line.strip())
+    sink = open_sinks(base_path, formats, fieldnames)
+    for store in stores:
+        sink.write(store)
+    sink.finalize()
+    if 'jsonl' not in formats:
+        os.remove(source)
+    return pipeline.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalize and deduplicate scraped stores")
+    parser.add_argument('input', help='result file to clean (.json, .jsonl or .csv)')
+    parser.add_argument('--output', default='stores_clean', help='base path of the cleaned result files')
+    parser.add_argument('--formats', nargs='+', default=['csv', 'json'], help='formats to write')
+    parser.add_argument('--threshold', type=float, default=0.7, help='name and address similarity to merge')
+    parser.add_argument('--stats', help='write the merge statistics as JSON to this file')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    records, fieldnames = load_records(args.input)
+    pipeline = StorePipeline(threshold=args.threshold)
+    sink = open_sinks(args.output, args.formats, fieldnames or list(RECORD_FIELDS))
+    for store in pipeline.run(records):
+        sink.write(store)
+    sink.finalize()
+    if args.stats:
+        with open(args.stats, 'w') as f:
+            json.dump(pipeline.stats, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import sys
+from operator import attrgetter
+
+# Every field either scraper collects; each scraper's STORE_FIELDS picks the columns it writes
+RECORD_FIELDS = ('name', 'address', 'phone', 'website', 'social_media', 'additional_info', 'url')
+
+# Fields whose values repeat across stores (chains share websites, social pages and boilerplate),
+# so equal values are kept as one string. Names, addresses, phones and URLs are unique per store.
+INTERNED_FIELDS = ('website', 'social_media', 'additional_info')
+
+_FIELD_SET = frozenset(RECORD_FIELDS)
+_values = attrgetter(*RECORD_FIELDS)
+
+
+class StoreRecord:
+    """One scraped store, with a slot per field instead of a per-record dict
+
+    Fields missing from the source default to ''. Records can be read like
+    a dict (record['name'], record.get('url'), dict(record)) so code that
+    handled the old store dicts keeps working.
+    """
+
+    __slots__ = RECORD_FIELDS
+
+    def __init__(self, name='', address='', phone='', website='', social_media='', additional_info='', url=''):
+        self.name = name
+        self.address = address
+        self.phone = phone
+        self.website = _intern(website)
+        self.social_media = _intern(social_media)
+        self.additional_info = _intern(additional_info)
+        self.url = url
+
+    @classmethod
+    def from_dict(cls, data, **overrides):
+        """Build a record from a store dict, ignoring keys that are not store fields"""
+        values = dict(data, **overrides)
+        return cls(*[values.get(field, '') for field in RECORD_FIELDS])
+
+    def values(self):
+        """Field values in RECORD_FIELDS order"""
+        return _values(self)
+
+    def keys(self):
+        return RECORD_FIELDS
+
+    def to_dict(self):
+        return dict(zip(RECORD_FIELDS, _values(self)))
+
+    def __getitem__(self, field):
+        if field not in _FIELD_SET:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def get(self, field, default=None):
+        return getattr(self, field) if field in _FIELD_SET else default
+
+    def __eq__(self, other):
+        if not isinstance(other, StoreRecord):
+            return NotImplemented
+        return _values(self) == _values(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"StoreRecord(name={self.name!r}, url={self.url!r})"
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
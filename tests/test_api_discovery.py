@@ -0,0 +1,127 @@
+import json
+
+from api_discovery import (discover_endpoints, load_endpoints, map_fields, page_url, read_json_requests,
+                           replay_endpoint, save_endpoints)
+
+SITE = 'https://askmaryj.com/en-za/listings/cannabis'
+API = 'https://api.askmaryj.com/v1/listings?region=za&page=1'
+
+
+def api_page(page, per_page=2, total=5):
+    first = (page - 1) * per_page
+    return {'meta': {'page': page}, 'data': {'listings': [
+        {'id': i, 'title': f'Store {i}', 'slug': f'/en-za/listing/store-{i}',
+         'contact': {'phone': f'021 555 000{i}', 'address': f'{i} Long Street'}}
+        for i in range(first, min(first + per_page, total))
+    ]}}
+
+
+CARDS = [
+    {'name': 'Store 0', 'address': '0 Long Street', 'phone': '021 555 0000',
+     'url': 'https://askmaryj.com/en-za/listing/store-0'},
+    {'name': 'Store 1', 'address': '1 Long Street', 'phone': '021 555 0001',
+     'url': 'https://askmaryj.com/en-za/listing/store-1'},
+]
+
+
+def log_entry(method, params):
+    return {'message': json.dumps({'message': {'method': method, 'params': params}})}
+
+
+class FakeDriver:
+    """Serves a performance log with one JSON XHR and one image, and their bodies over CDP"""
+
+    def get_log(self, kind):
+        assert kind == 'performance'
+        return [
+            log_entry('Network.requestWillBeSent', {'requestId': '1', 'request': {
+                'url': API, 'method': 'GET', 'headers': {'Accept': 'application/json', 'Cookie': 'secret'}}}),
+            log_entry('Network.responseReceived', {'requestId': '1', 'type': 'XHR', 'response': {
+                'status': 200, 'mimeType': 'application/json'}}),
+            log_entry('Network.requestWillBeSent', {'requestId': '2', 'request': {
+                'url': 'https://askmaryj.com/logo.png', 'method': 'GET', 'headers': {}}}),
+            log_entry('Network.responseReceived', {'requestId': '2', 'type': 'Image', 'response': {
+                'status': 200, 'mimeType': 'image/png'}}),
+            {'message': 'not json'},
+        ]
+
+    def execute_cdp_cmd(self, command, params):
+        assert params['requestId'] == '1'
+        return {'body': json.dumps(api_page(1))}
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class FakeSession:
+    def __init__(self, pages):
+        self.pages = pages
+        self.urls = []
+
+    def request(self, method, url, headers=None, data=None, timeout=None):
+        self.urls.append(url)
+        return Response(self.pages(int(url.rsplit('page=', 1)[1])))
+
+
+def test_read_json_requests_keeps_json_xhr_and_replayable_headers():
+    assert read_json_requests(FakeDriver()) == {
+        '1': {'url': API, 'method': 'GET', 'headers': {'Accept': 'application/json'}, 'post_data': None,
+              'status': 200}
+    }
+
+
+def test_fields_are_mapped_by_card_values():
+    records = api_page(1)['data']['listings']
+    assert map_fields(records, CARDS) == {
+        'name': 'title', 'address': 'contact.address', 'phone': 'contact.phone', 'url': 'slug'
+    }
+
+
+def test_fields_are_mapped_by_key_names_without_cards():
+    assert map_fields(api_page(1)['data']['listings'])['name'] == 'title'
+
+
+def test_discover_endpoints():
+    endpoints = discover_endpoints(FakeDriver(), CARDS)
+    assert len(endpoints) == 1
+    assert endpoints[0]['url'] == API
+    assert endpoints[0]['records_path'] == ['data', 'listings']
+    assert endpoints[0]['score'] == 2
+
+
+def test_page_url():
+    assert page_url(API, 3) == 'https://api.askmaryj.com/v1/listings?region=za&page=3'
+    assert page_url('https://api.askmaryj.com/v1/listings?region=za', 3) is None
+
+
+def test_replay_pages_until_an_empty_page():
+    endpoint = discover_endpoints(FakeDriver(), CARDS)[0]
+    session = FakeSession(api_page)
+    stores = list(replay_endpoint(session, endpoint, SITE))
+    assert [store['name'] for store in stores] == [f'Store {i}' for i in range(5)]
+    assert stores[0] == {'name': 'Store 0', 'address': '0 Long Street', 'phone': '021 555 0000',
+                         'url': 'https://askmaryj.com/en-za/listing/store-0'}
+    assert len(session.urls) == 4
+
+
+def test_replay_stops_when_a_page_repeats():
+    endpoint = discover_endpoints(FakeDriver(), CARDS)[0]
+    # An API that ignores the page parameter returns page 1 every time
+    session = FakeSession(lambda page: api_page(1))
+    assert len(list(replay_endpoint(session, endpoint, SITE))) == 2
+    assert len(session.urls) == 2
+
+
+def test_endpoints_round_trip(tmp_path):
+    path = str(tmp_path / 'api_endpoints.json')
+    endpoints = discover_endpoints(FakeDriver(), CARDS)
+    save_endpoints(path, endpoints, {'cf_clearance': 'token'})
+    assert load_endpoints(path) == (endpoints, {'cf_clearance': 'token'})
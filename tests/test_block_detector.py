@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+import block_detector
+from conftest import ROOT
+from mock_server import CHALLENGE_PAGE, MockSite
+
+
+def read_page(*path):
+    with open(os.path.join(ROOT, *path), 'rb') as f:
+        return f.read()
+
+
+def test_cloudflare_interstitial_is_a_challenge():
+    assert block_detector.classify(200, read_page('page_content.html')) == block_detector.CHALLENGE
+    assert block_detector.classify(403, read_page('page_content.html')) == block_detector.CHALLENGE
+
+
+def test_store_page_is_ok():
+    assert block_detector.classify(200, read_page('benchmarks', 'fixtures', 'store_page.html')) == block_detector.OK
+    assert block_detector.classify(200, MockSite().store_page(3)) == block_detector.OK
+
+
+def test_mock_challenge_page_is_a_challenge():
+    assert block_detector.classify(200, CHALLENGE_PAGE) == block_detector.CHALLENGE
+
+
+@pytest.mark.parametrize('status, content, kind', [
+    (429, b'', block_detector.RATE_LIMIT),
+    (200, b'<html><body>error code: 1015 You are being rate limited</body></html>', block_detector.RATE_LIMIT),
+    (403, b'<html><title>Access denied</title></html>', block_detector.BLOCKED),
+    (403, b'', block_detector.BLOCKED),
+    (200, b'<html><title>Attention Required!</title><div class="h-captcha"></div></html>', block_detector.CAPTCHA),
+    (200, b"<title>Just a moment...</title><script>window._cf_chl_opt={cType: 'interactive'}</script>",
+     block_detector.CAPTCHA),
+    (200, b'   ', block_detector.EMPTY),
+    (304, b'', block_detector.OK),
+    (404, b'<h1>Not found</h1>', block_detector.OK),
+])
+def test_classify(status, content, kind):
+    assert block_detector.classify(status, content) == kind
+
+
+def test_route_escalates_unless_already_rendered():
+    assert block_detector.route(block_detector.CHALLENGE) == block_detector.BROWSER
+    assert block_detector.route(block_detector.CHALLENGE, rendered=True) == block_detector.SKIP
+    assert block_detector.route(block_detector.RATE_LIMIT, rendered=True) == block_detector.RETRY
+    assert block_detector.route(block_detector.OK) == block_detector.PARSE
+
+
+def test_check_response_raises_for_blocks():
+    class Response:
+        status_code = 200
+        content = read_page('page_content.html')
+
+    with pytest.raises(block_detector.PageBlocked) as excinfo:
+        block_detector.check_response('https://example.com/store', Response())
+    assert excinfo.value.kind == block_detector.CHALLENGE
+    assert excinfo.value.action == block_detector.BROWSER
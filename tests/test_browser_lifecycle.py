@@ -0,0 +1,124 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import browser_lifecycle
+from browser_lifecycle import BrowserLifecycle, process_start_time, reap_orphaned_drivers
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith('linux'), reason='reads processes from /proc')
+
+
+class FakeService:
+    def __init__(self, process):
+        self.process = process
+
+
+class FakeDriver:
+    """Stands in for a Selenium driver whose chromedriver is a sleeping child process"""
+
+    def __init__(self):
+        self.process = subprocess.Popen(['sleep', '60'])
+        self.service = FakeService(self.process)
+        self.window_handles = ['main']
+
+    def quit(self):
+        self.process.kill()
+        self.process.wait()
+
+
+@pytest.fixture(autouse=True)
+def pidfile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(browser_lifecycle, 'PIDFILE_DIR', str(tmp_path / 'browsers'))
+    return tmp_path / 'browsers'
+
+
+@pytest.fixture
+def sleeper():
+    process = subprocess.Popen(['sleep', '60'])
+    yield process
+    process.kill()
+    process.wait()
+
+
+def running(process):
+    return process.poll() is None
+
+
+def write_pidfile(directory, owner, owner_started, browsers):
+    directory.mkdir(exist_ok=True)
+    with open(directory / f'{owner}.json', 'w') as f:
+        json.dump({'owner': owner, 'owner_started': owner_started,
+                   'browsers': {str(pid): started for pid, started in browsers.items()}}, f)
+
+
+def dead_pid():
+    process = subprocess.Popen(['true'])
+    process.wait()
+    return process.pid
+
+
+def test_launch_records_the_driver_and_close_forgets_it(pidfile_dir):
+    browser = BrowserLifecycle(FakeDriver)
+    driver = browser.driver
+    with open(pidfile_dir / f'{os.getpid()}.json') as f:
+        assert str(driver.process.pid) in json.load(f)['browsers']
+    browser.close()
+    assert not (pidfile_dir / f'{os.getpid()}.json').exists()
+
+
+def test_live_browsers_are_not_reaped():
+    browser = BrowserLifecycle(FakeDriver)
+    driver = browser.driver
+    assert reap_orphaned_drivers() == 0
+    assert running(driver.process)
+    browser.close()
+
+
+def test_unrecorded_processes_are_never_reaped(sleeper):
+    assert reap_orphaned_drivers() == 0
+    assert running(sleeper)
+
+
+def test_browsers_of_a_running_scraper_are_left_alone(pidfile_dir, sleeper):
+    owner = os.getppid()
+    write_pidfile(pidfile_dir, owner, process_start_time(owner), {sleeper.pid: process_start_time(sleeper.pid)})
+    assert reap_orphaned_drivers() == 0
+    assert running(sleeper)
+
+
+def test_browsers_of_an_exited_scraper_are_reaped(pidfile_dir, sleeper):
+    owner = dead_pid()
+    write_pidfile(pidfile_dir, owner, 1.0, {sleeper.pid: process_start_time(sleeper.pid)})
+    assert reap_orphaned_drivers() == 1
+    sleeper.wait(timeout=5)
+    assert not (pidfile_dir / f'{owner}.json').exists()
+
+
+def test_reused_pids_are_not_reaped(pidfile_dir, sleeper):
+    write_pidfile(pidfile_dir, dead_pid(), 1.0, {sleeper.pid: process_start_time(sleeper.pid) - 1})
+    assert reap_orphaned_drivers() == 0
+    assert running(sleeper)
+
+
+def test_leaked_driver_of_this_process_is_reaped(pidfile_dir):
+    browser = BrowserLifecycle(FakeDriver)
+    driver = browser.driver
+    # Dropped without close(), so no live lifecycle owns its processes any more
+    browser_lifecycle._live.discard(browser)
+    assert reap_orphaned_drivers() == 1
+    driver.process.wait(timeout=5)
+    assert not (pidfile_dir / f'{os.getpid()}.json').exists()
+
+
+def test_recycle_replaces_the_driver_after_max_pages():
+    browser = BrowserLifecycle(FakeDriver, max_pages=2)
+    first = browser.driver
+    browser.page_loaded(2)
+    second = browser.recycle_if_needed()
+    assert second is not first
+    assert not running(first.process)
+    assert browser.stats()['recycles'] == 1
+    browser.close()
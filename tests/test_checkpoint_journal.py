@@ -0,0 +1,77 @@
+import os
+
+from checkpoint_journal import CheckpointJournal
+
+
+def test_new_journal_is_empty(tmp_path):
+    assert CheckpointJournal(str(tmp_path), 'stores').load() == ([], None)
+
+
+def test_replay_after_torn_write(tmp_path):
+    journal = CheckpointJournal(str(tmp_path), 'stores', fsync_every=2)
+    journal.append({'url': 'a'})
+    journal.append({'url': 'b'}, state={'last_index': 1})
+    journal.append({'url': 'c'}, state={'last_index': 2})
+    journal._file.flush()
+    committed = journal._read_meta()['offset']
+    # A crash halfway through writing a record
+    journal._file.write('{"url": "d", "na')
+    journal._file.flush()
+
+    resumed = CheckpointJournal(str(tmp_path), 'stores')
+    records, state = resumed.load()
+    assert records == [{'url': 'a'}, {'url': 'b'}]
+    assert state == {'last_index': 1}
+    assert os.path.getsize(resumed.journal_path) == committed
+
+    resumed.append({'url': 'c'}, state={'last_index': 2})
+    resumed.close()
+    records, state = CheckpointJournal(str(tmp_path), 'stores').load()
+    assert records == [{'url': 'a'}, {'url': 'b'}, {'url': 'c'}]
+    assert state == {'last_index': 2}
+
+
+def test_reset_discards_the_previous_run(tmp_path):
+    journal = CheckpointJournal(str(tmp_path), 'stores')
+    journal.append({'url': 'a'})
+    journal.commit(state={'complete': True})
+    journal.reset()
+    assert CheckpointJournal(str(tmp_path), 'stores').load() == ([], None)
+
+
+def test_compaction_keeps_the_latest_record_per_key(tmp_path):
+    journal = CheckpointJournal(str(tmp_path), 'stores', compact_every=0, key=lambda record: record['url'])
+    journal.append({'url': 'a', 'name': 'old'})
+    journal.append({'url': 'b', 'name': 'b'})
+    journal.append({'url': 'a', 'name': 'new'})
+    journal.compact()
+    journal.close()
+    records, _ = CheckpointJournal(str(tmp_path), 'stores').load()
+    assert records == [{'url': 'a', 'name': 'new'}, {'url': 'b', 'name': 'b'}]
+
+
+def test_compaction_without_duplicates_leaves_the_journal_alone(tmp_path):
+    journal = CheckpointJournal(str(tmp_path), 'stores', compact_every=0, key=lambda record: record['url'])
+    journal.append({'url': 'a'})
+    journal.append({'url': 'b'})
+    journal.commit()
+    before = os.stat(journal.journal_path).st_ino
+    journal.compact()
+    assert os.stat(journal.journal_path).st_ino == before
+    journal.append({'url': 'c'})
+    journal.close()
+    records, _ = CheckpointJournal(str(tmp_path), 'stores').load()
+    assert [record['url'] for record in records] == ['a', 'b', 'c']
+
+
+def test_scraper_journal_collapses_stores_by_url(tmp_path, monkeypatch):
+    import cannabis_scraper
+    monkeypatch.setattr(cannabis_scraper, 'CHECKPOINT_DIR', str(tmp_path))
+    journal = cannabis_scraper.open_checkpoint_journal()
+    journal.append({'index': 0, 'url': 'a', 'store': {'name': 'old'}, 'status': 'new'})
+    journal.append({'index': 1, 'url': 'b', 'store': {'name': 'b'}, 'status': 'new'})
+    journal.append({'index': 2, 'url': 'a', 'store': {'name': 'new'}, 'status': 'changed'})
+    journal.compact()
+    journal.close()
+    records, _ = cannabis_scraper.open_checkpoint_journal().load()
+    assert [(record['url'], record['store']['name']) for record in records] == [('a', 'new'), ('b', 'b')]
@@ -0,0 +1,107 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+from clearance import CLEARANCE_COOKIE, Clearance, ClearanceBroker
+
+
+class FakePage:
+    def goto(self, url, timeout=None):
+        pass
+
+    def wait_for_timeout(self, ms):
+        time.sleep(ms / 1000)
+
+    def evaluate(self, script):
+        return 'Mozilla/5.0 (test)'
+
+    def close(self):
+        pass
+
+
+class FakeContext:
+    def __init__(self, cookie_expires):
+        self.cookie_expires = cookie_expires
+
+    def new_page(self):
+        return FakePage()
+
+    def cookies(self, url):
+        return [{'name': CLEARANCE_COOKIE, 'value': 'token', 'domain': 'example.com', 'path': '/',
+                 'expires': self.cookie_expires}]
+
+
+class FakeSlot:
+    def __init__(self, context):
+        self.context = context
+
+    def submit(self, fn):
+        return fn(self.context)
+
+
+class FakePool:
+    """Stands in for the Playwright BrowserPool; counts how often a browser is leased"""
+
+    def __init__(self, cookie_expires=-1, delay=0.0):
+        self.context = FakeContext(cookie_expires)
+        self.delay = delay
+        self.leases = 0
+
+    @contextmanager
+    def lease(self):
+        self.leases += 1
+        time.sleep(self.delay)
+        yield FakeSlot(self.context)
+
+
+def test_solve_exports_cookies_and_user_agent():
+    broker = ClearanceBroker(FakePool(), 'https://example.com/', max_age=600)
+    assert broker.current() is None
+    clearance = broker.refresh()
+    assert clearance.user_agent == 'Mozilla/5.0 (test)'
+    assert 590 < clearance.expires_at - time.time() <= 600
+    assert broker.current() is clearance
+
+
+def test_cookie_expiry_caps_the_clearance():
+    expires = time.time() + 120
+    clearance = ClearanceBroker(FakePool(cookie_expires=expires), 'https://example.com/').refresh()
+    assert clearance.expires_at == expires
+
+
+def test_expired_clearance_is_not_current():
+    broker = ClearanceBroker(FakePool(cookie_expires=time.time() + 10), 'https://example.com/')
+    broker.refresh()
+    assert broker.current() is None
+
+
+def test_concurrent_refreshes_solve_once():
+    pool = FakePool(delay=0.05)
+    broker = ClearanceBroker(pool, 'https://example.com/')
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(broker.refresh())) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert pool.leases == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_refresh_of_a_stale_clearance_solves_again():
+    pool = FakePool()
+    broker = ClearanceBroker(pool, 'https://example.com/')
+    first = broker.refresh()
+    assert broker.refresh(stale=None) is first
+    second = broker.refresh(stale=first)
+    assert second is not first
+    assert pool.leases == 2
+
+
+def test_apply_installs_the_cookies():
+    session = requests.Session()
+    Clearance([{'name': CLEARANCE_COOKIE, 'value': 'token', 'domain': 'example.com'}], 'UA',
+              time.time() + 60).apply(session)
+    assert session.cookies.get(CLEARANCE_COOKIE, domain='example.com') == 'token'
@@ -0,0 +1,75 @@
+import pytest
+
+from crawl_scheduler import DAY, CrawlBudgetExceeded, CrawlScheduler
+
+NOW = 100 * DAY
+
+
+class FakeClock:
+    def __init__(self, now=NOW):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeMetadata:
+    def __init__(self, history):
+        self._history = history
+
+    def history(self):
+        return self._history
+
+
+def history(checked_days_ago, changes, observed_days=30):
+    checked_at = NOW - checked_days_ago * DAY
+    return {'checked_at': checked_at, 'changed_at': None, 'first_seen_at': checked_at - observed_days * DAY,
+            'checks': observed_days, 'changes': changes}
+
+
+def test_plan_puts_new_urls_first_then_the_likeliest_to_have_changed():
+    metadata = FakeMetadata({
+        'quiet': history(checked_days_ago=2, changes=0),
+        'busy': history(checked_days_ago=2, changes=30),
+        'stale': history(checked_days_ago=10, changes=0),
+    })
+    scheduler = CrawlScheduler(metadata, clock=FakeClock())
+    due, deferred = scheduler.plan(['quiet', 'busy', 'new-1', 'stale', 'new-2'])
+    assert due == ['new-1', 'new-2', 'busy', 'stale']
+    assert deferred == ['quiet']
+    assert scheduler.stats == {'new': 2, 'due': 2, 'deferred': 1}
+
+
+def test_plan_without_metadata_keeps_the_given_order():
+    due, deferred = CrawlScheduler(clock=FakeClock()).plan(['b', 'a', 'c'])
+    assert due == ['b', 'a', 'c']
+    assert deferred == []
+
+
+def test_change_probability_grows_with_time_since_the_last_check():
+    scheduler = CrawlScheduler(clock=FakeClock())
+    probabilities = [scheduler.change_probability(history(days, changes=3)) for days in (0, 1, 7, 30)]
+    assert probabilities[0] == 0
+    assert probabilities == sorted(probabilities)
+    assert probabilities[-1] < 1
+
+
+def test_budget_runs_out():
+    clock = FakeClock()
+    scheduler = CrawlScheduler(budget_seconds=60, clock=clock)
+    scheduler.check_budget('a')
+    clock.now += 30
+    assert scheduler.remaining() == 30
+    assert not scheduler.expired()
+    clock.now += 30
+    assert scheduler.expired()
+    with pytest.raises(CrawlBudgetExceeded):
+        scheduler.check_budget('b')
+
+
+def test_no_budget_never_expires():
+    clock = FakeClock()
+    scheduler = CrawlScheduler(clock=clock)
+    clock.now += 365 * DAY
+    assert scheduler.remaining() is None
+    assert not scheduler.expired()
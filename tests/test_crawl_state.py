@@ -0,0 +1,41 @@
+from checkpoint_journal import CheckpointJournal
+from crawl_state import PendingMetadataUpdates, UrlMetadataStore, change_status, content_fingerprint
+
+
+def test_fingerprint_ignores_scripts_and_whitespace():
+    a = b'<html><head></head><body> <h1>Store</h1><script>var nonce = 1;</script></body></html>'
+    b = b'<html><head></head><body>\n  <h1>Store</h1><script>var nonce = 2;</script></body></html>'
+    assert content_fingerprint(a) == content_fingerprint(b)
+    assert content_fingerprint(a) != content_fingerprint(a.replace(b'Store', b'Shop'))
+
+
+def test_update_reports_new_changed_and_unchanged(tmp_path):
+    store = UrlMetadataStore(str(tmp_path / 'crawl_state.db'))
+    assert store.update('a', 'hash-1', {'name': 'A'}, etag='"1"') == 'new'
+    assert store.update('a', 'hash-1', {'name': 'A'}, etag='"1"') == 'unchanged'
+    assert store.update('a', 'hash-2', {'name': 'A2'}, etag='"2"') == 'changed'
+    assert store.conditional_headers(store.get('a')) == {'If-None-Match': '"2"'}
+    assert store.history()['a']['changes'] == 1
+    assert change_status(None, 'hash') == 'new'
+    store.close()
+
+
+def test_pending_updates_wait_for_the_journal_commit(tmp_path):
+    store = UrlMetadataStore(str(tmp_path / 'crawl_state.db'))
+    pending = PendingMetadataUpdates(store)
+    journal = CheckpointJournal(str(tmp_path), 'stores', fsync_every=2, on_commit=pending.flush)
+
+    pending.update('a', 'hash-a', {'name': 'A'}, etag='"a"')
+    journal.append({'url': 'a'})
+    # A crash here must not leave a validator for a store the journal never committed
+    assert store.get('a') is None
+
+    pending.update('b', 'hash-b', {'name': 'B'})
+    journal.append({'url': 'b'})
+    assert store.get('a')['etag'] == '"a"'
+    assert store.get('b')['record'] == {'name': 'B'}
+
+    pending.mark_unchanged('a')
+    journal.close()
+    assert store.history()['a']['checks'] == 2
+    store.close()
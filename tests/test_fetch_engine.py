@@ -0,0 +1,63 @@
+import threading
+import time
+
+from fetch_engine import ConcurrentFetcher
+
+
+class ConcurrencyProbe:
+    """fetch() that records how many calls run at once, overall and per host"""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.active = {}
+        self.peak = {}
+        self.peak_total = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, url):
+        host = url.split('/')[2]
+        with self._lock:
+            self.active[host] = self.active.get(host, 0) + 1
+            self.peak[host] = max(self.peak.get(host, 0), self.active[host])
+            self.peak_total = max(self.peak_total, sum(self.active.values()))
+        time.sleep(self.delay)
+        with self._lock:
+            self.active[host] -= 1
+        return url.upper()
+
+
+def test_results_come_back_in_input_order():
+    delays = {f'https://example.com/{i}': (5 - i) * 0.01 for i in range(5)}
+
+    def fetch(url):
+        time.sleep(delays[url])
+        return url[-1]
+
+    results = list(ConcurrentFetcher(5, 5).fetch_ordered(list(delays), fetch))
+    assert [(index, result, error) for index, _, result, error in results] == [
+        (i, str(i), None) for i in range(5)
+    ]
+
+
+def test_errors_are_yielded_in_place():
+    def fetch(url):
+        if url.endswith('1'):
+            raise ValueError('bad page')
+        return url
+
+    results = list(ConcurrentFetcher(2, 2).fetch_ordered(['https://a/0', 'https://a/1', 'https://a/2'], fetch))
+    assert [result for _, _, result, _ in results] == ['https://a/0', None, 'https://a/2']
+    assert isinstance(results[1][3], ValueError)
+
+
+def test_per_host_and_global_limits():
+    probe = ConcurrencyProbe()
+    urls = [f'https://{host}.example.com/{i}' for i in range(6) for host in ('a', 'b', 'c')]
+    list(ConcurrentFetcher(4, 2).fetch_ordered(urls, probe))
+    assert max(probe.peak.values()) <= 2
+    assert probe.peak_total <= 4
+    assert probe.peak_total > 1
+
+
+def test_no_urls():
+    assert list(ConcurrentFetcher(4, 2).fetch_ordered([], lambda url: url)) == []
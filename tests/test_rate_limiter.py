@@ -0,0 +1,60 @@
+import time
+
+from rate_limiter import AdaptiveRateLimiter
+
+
+class Response:
+    def __init__(self, status_code, content=b'<html><body>' + b'store page ' * 20 + b'</body></html>', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+
+URL = 'https://example.com/store'
+
+
+def test_classify():
+    limiter = AdaptiveRateLimiter(slow_seconds=3.0)
+    assert limiter.classify(None, 0.1) == 'error'
+    assert limiter.classify(Response(429), 0.1) == 'blocked'
+    assert limiter.classify(Response(200, b'<title>Just a moment...</title>'), 0.1) == 'blocked'
+    assert limiter.classify(Response(200), 5.0) == 'slow'
+    assert limiter.classify(Response(200), 0.1) == 'ok'
+    assert limiter.classify(Response(404), 0.1) == 'error'
+
+
+def test_429_halves_the_rate_and_pauses_the_host():
+    limiter = AdaptiveRateLimiter(initial_rate=4.0, min_rate=0.5, cooldown=30.0)
+    started = limiter.acquire(URL)
+    assert limiter.release(URL, started, Response(429, b'', {'Retry-After': '120'})) == 'blocked'
+
+    controller = limiter._controller(URL)
+    assert controller.rate == 2.0
+    assert controller.paused_until - time.monotonic() > 100
+    assert limiter.metrics()['example.com']['blocks'] == 1
+
+    # Blocks from requests already in flight during the pause are not counted again
+    controller.in_flight += 1
+    limiter.release(URL, started, Response(429))
+    assert controller.rate == 2.0
+    assert controller.blocks == 1
+
+
+def test_rate_never_drops_below_min_rate():
+    limiter = AdaptiveRateLimiter(initial_rate=1.0, min_rate=0.4, cooldown=0.0)
+    controller = limiter._controller(URL)
+    for _ in range(5):
+        controller.in_flight += 1
+        controller.release('blocked')
+    assert controller.rate == 0.4
+    assert controller.concurrency == 1.0
+
+
+def test_successes_raise_rate_and_concurrency():
+    limiter = AdaptiveRateLimiter(initial_rate=100.0, max_rate=200.0, max_concurrency=4)
+    for _ in range(10):
+        limiter.release(URL, limiter.acquire(URL), Response(200))
+    metrics = limiter.metrics()['example.com']
+    assert metrics['rate'] > 100.0
+    assert metrics['concurrency'] == 4
+    assert metrics['requests'] == 10
@@ -0,0 +1,67 @@
+import os
+
+import response_cache
+from response_cache import ResponseCache
+
+
+class Response:
+    def __init__(self, content, status_code=200, headers=None):
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers or {'Content-Type': 'text/html'}
+
+
+def set_last_used(cache, url, when):
+    os.utime(cache._path(url), (when, when))
+
+
+def test_round_trip(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.put('https://example.com/a', Response(b'<html>a</html>', headers={'ETag': '"1"'}))
+    cached = cache.get('https://example.com/a')
+    assert (cached.content, cached.status_code, cached.headers, cached.from_cache) == (
+        b'<html>a</html>', 200, {'ETag': '"1"'}, True)
+    assert cache.get('https://example.com/b') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_only_successful_responses_are_stored(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.put('https://example.com/a', Response(b'blocked', status_code=403))
+    assert cache.get('https://example.com/a') is None
+
+
+def test_expired_entries_are_misses_unless_replaying(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, 'time', lambda: now[0])
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    cache.put('https://example.com/a', Response(b'a'))
+    now[0] += 30
+    assert cache.get('https://example.com/a') is not None
+    now[0] += 60
+    assert cache.get('https://example.com/a') is None
+    assert ResponseCache(str(tmp_path), ttl=60, replay_only=True).get('https://example.com/a').content == b'a'
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    urls = [f'https://example.com/{i}' for i in range(4)]
+    cache = ResponseCache(str(tmp_path), max_bytes=10 ** 6)
+    for i, url in enumerate(urls):
+        # Random bytes do not compress, so each entry is a little over 100 kB on disk
+        cache.put(url, Response(os.urandom(100000)))
+        set_last_used(cache, url, 1000 + i)
+    # Reading the oldest entry makes it the most recently used
+    assert cache.get(urls[0]) is not None
+    set_last_used(cache, urls[0], 2000)
+
+    cache.max_bytes = 350000
+    cache.put('https://example.com/new', Response(os.urandom(100000)))
+    assert cache._total_bytes <= 350000 * 0.9
+    assert [cache.get(url) is not None for url in urls] == [True, False, False, True]
+    assert cache.get('https://example.com/new') is not None
+
+
+def test_size_is_recounted_on_open(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.put('https://example.com/a', Response(os.urandom(5000)))
+    assert ResponseCache(str(tmp_path))._total_bytes == cache._total_bytes > 5000
@@ -0,0 +1,86 @@
+import csv
+import json
+import os
+
+import pytest
+
+from result_sinks import open_sinks
+
+FIELDS = ('name', 'phone', 'url')
+STORES = [
+    {'name': 'Green Leaf', 'phone': '+27215550142', 'url': 'https://example.com/a'},
+    {'name': 'Café "Kush"', 'phone': None, 'url': 'https://example.com/b', 'extra': 'dropped'},
+]
+
+
+def test_records_stream_to_part_files_until_finalized(tmp_path):
+    base = str(tmp_path / 'stores')
+    sink = open_sinks(base, ['json', 'jsonl', 'csv'], FIELDS, buffer_size=1)
+    for store in STORES:
+        sink.write(store)
+    for fmt in ('json', 'jsonl', 'csv'):
+        assert os.path.exists(f'{base}.{fmt}.part')
+        assert not os.path.exists(f'{base}.{fmt}')
+    # Flushed records are already on disk before the run finishes
+    with open(f'{base}.jsonl.part', encoding='utf-8') as f:
+        assert len(f.readlines()) == 2
+
+    sink.finalize()
+    for fmt in ('json', 'jsonl', 'csv'):
+        assert os.path.exists(f'{base}.{fmt}')
+        assert not os.path.exists(f'{base}.{fmt}.part')
+
+
+def test_output_matches_the_standard_library(tmp_path):
+    base = str(tmp_path / 'stores')
+    sink = open_sinks(base, ['json', 'jsonl', 'csv'], FIELDS)
+    for store in STORES:
+        sink.write(store)
+    sink.finalize()
+
+    expected = [{field: store.get(field) for field in FIELDS} for store in STORES]
+    with open(f'{base}.json', encoding='utf-8') as f:
+        text = f.read()
+    assert text == json.dumps(expected, indent=2)
+    with open(f'{base}.jsonl', encoding='utf-8') as f:
+        assert [json.loads(line) for line in f] == expected
+    with open(f'{base}.csv', newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    assert rows == [list(FIELDS)] + [[store[field] or '' for field in FIELDS] for store in expected]
+
+
+def test_empty_json_is_an_empty_array(tmp_path):
+    base = str(tmp_path / 'stores')
+    sink = open_sinks(base, ['json'], FIELDS)
+    sink.finalize()
+    with open(f'{base}.json', encoding='utf-8') as f:
+        assert json.load(f) == []
+
+
+def test_close_keeps_the_part_file(tmp_path):
+    base = str(tmp_path / 'stores')
+    sink = open_sinks(base, ['jsonl'], FIELDS)
+    sink.write(STORES[0])
+    sink.close()
+    assert not os.path.exists(f'{base}.jsonl')
+    with open(f'{base}.jsonl.part', encoding='utf-8') as f:
+        assert json.loads(f.read())['name'] == 'Green Leaf'
+
+
+def test_finalize_replaces_an_earlier_file(tmp_path):
+    base = str(tmp_path / 'stores')
+    with open(f'{base}.jsonl', 'w') as f:
+        f.write('old\n')
+    sink = open_sinks(base, ['jsonl'], FIELDS)
+    sink.write(STORES[0])
+    # Until finalize, readers still see the complete earlier file
+    with open(f'{base}.jsonl') as f:
+        assert f.read() == 'old\n'
+    sink.finalize()
+    with open(f'{base}.jsonl', encoding='utf-8') as f:
+        assert json.loads(f.read())['url'] == 'https://example.com/a'
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        open_sinks(str(tmp_path / 'stores'), ['xml'], FIELDS)
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+from shard_coordinator import IncompleteCrawl, WorkQueue, merge_results, seed_queue
+
+
+@pytest.fixture
+def queue_path(tmp_path):
+    return str(tmp_path / 'work_queue.db')
+
+
+def store(url, name):
+    return {'name': name, 'address': '', 'phone': '', 'social_media': '', 'additional_info': '', 'url': url}
+
+
+def test_pages_are_claimed_once_in_order(queue_path):
+    seed_queue(queue_path, pages=3)
+    work = WorkQueue(queue_path)
+    assert [work.claim('a'), work.claim('b'), work.claim('c'), work.claim('d')] == [1, 2, 3, None]
+    work.close()
+
+
+def test_expired_lease_is_claimed_again(queue_path):
+    seed_queue(queue_path, pages=1)
+    work = WorkQueue(queue_path, lease_timeout=-1)
+    assert work.claim('a') == 1
+    assert work.claim('b') == 1
+    work.close()
+
+
+def test_failed_page_is_retried_until_max_attempts(queue_path):
+    seed_queue(queue_path, pages=1)
+    work = WorkQueue(queue_path, max_attempts=2)
+    work.fail(work.claim('a'), 'timeout')
+    work.fail(work.claim('a'), 'timeout')
+    assert work.claim('a') is None
+    assert work.status()['failed'] == 1
+    work.close()
+
+
+def test_complete_keeps_each_url_once_from_the_earliest_page(queue_path):
+    seed_queue(queue_path, pages=2)
+    work = WorkQueue(queue_path)
+    work.complete(2, [store('u1', 'late'), store('u2', 'two')])
+    work.complete(1, [store('u1', 'early')])
+    assert [record['name'] for record in work.results()] == ['early', 'two']
+    assert work.status()['duplicates'] == 1
+    work.close()
+
+
+def test_new_crawl_clears_the_previous_one(queue_path):
+    seed_queue(queue_path, pages=2)
+    work = WorkQueue(queue_path)
+    work.complete(work.claim('a'), [store('u1', 'one')])
+    work.close()
+
+    seed_queue(queue_path, pages=2)
+    work = WorkQueue(queue_path)
+    assert work.status() == {'pending': 2, 'stores': 0, 'duplicates': 0}
+    work.close()
+
+
+def test_resume_requeues_interrupted_and_failed_pages(queue_path):
+    seed_queue(queue_path, pages=3)
+    work = WorkQueue(queue_path, max_attempts=1)
+    work.complete(work.claim('a'), [store('u1', 'one')])
+    work.fail(work.claim('a'), 'blocked')
+    work.claim('crashed')  # The worker holding page 3 dies
+    work.close()
+
+    seed_queue(queue_path, pages=3, resume=True)
+    work = WorkQueue(queue_path)
+    assert [work.claim('b'), work.claim('b'), work.claim('b')] == [2, 3, None]
+    assert [record['name'] for record in work.results()] == ['one']
+    work.close()
+
+
+def test_merge_refuses_an_unfinished_crawl(queue_path, tmp_path):
+    seed_queue(queue_path, pages=2)
+    work = WorkQueue(queue_path)
+    work.complete(work.claim('a'), [store('u1', 'one')])
+    work.close()
+    output = str(tmp_path / 'stores')
+
+    with pytest.raises(IncompleteCrawl):
+        merge_results(queue_path, output, formats=('json',), normalize=False)
+
+    merge_results(queue_path, output, formats=('json',), normalize=False, partial=True)
+    with open(output + '.json', 'r', encoding='utf-8') as f:
+        assert [record['url'] for record in json.load(f)] == ['u1']
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+import store_parser
+from conftest import ROOT
+from mock_server import MockSite
+
+ENGINES = store_parser.available_engines()
+
+
+def read_fixture():
+    with open(os.path.join(ROOT, 'benchmarks', 'fixtures', 'store_page.html'), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_parse_store(engine):
+    assert store_parser.parse_store(read_fixture(), engine) == {
+        'name': 'Green Leaf Dispensary',
+        'address': '12 Long Street, Cape Town City Centre, Cape Town, 8001',
+        'phone': '021 555 0142',
+        'website': 'https://greenleaf.example.co.za'
+    }
+
+
+def test_engines_agree():
+    site = MockSite(stores=12)
+    for index in range(site.stores):
+        page = site.store_page(index)
+        results = [store_parser.parse_store(page, engine) for engine in ENGINES]
+        assert all(result == results[0] for result in results)
+    listing = site.listing_page(1)
+    links = [store_parser.parse_store_links(listing, engine) for engine in ENGINES]
+    assert links[0] == [f'/en-za/listing/store-{index}' for index in range(12)]
+    assert all(result == links[0] for result in links)
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_missing_field_raises(engine):
+    with pytest.raises(ValueError):
+        store_parser.parse_store('<html><body><h1>Only a name</h1></body></html>', engine)
+
+
+def test_resolve_engine():
+    assert store_parser.resolve_engine('auto') == ENGINES[0]
+    assert store_parser.resolve_engine('bs4') == 'bs4'
+    with pytest.raises(ValueError):
+        store_parser.resolve_engine('regex')
+
+
+def test_bs4_fallback_warns_once(monkeypatch, caplog):
+    monkeypatch.setattr(store_parser, 'available_engines', lambda: ['bs4'])
+    monkeypatch.setattr(store_parser, '_warned_bs4_fallback', False)
+    assert store_parser.resolve_engine('auto') == 'bs4'
+    assert store_parser.resolve_engine('auto') == 'bs4'
+    assert len([record for record in caplog.records if 'parsing with bs4' in record.message]) == 1
@@ -0,0 +1,93 @@
+import json
+import os
+
+import pytest
+
+from result_sinks import open_sinks
+from store_pipeline import (StorePipeline, canonicalize_address, normalize_phone, normalize_result_files,
+                            streaming_formats)
+from store_record import RECORD_FIELDS
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('021 555 0142', '+27215550142'),
+    ('+27 (0)21 555 0142', '+27215550142'),
+    ('0027 21 555 0142', '+27215550142'),
+    ('27215550142', '+27215550142'),
+    ('021-555-0142 ext 12', '+27215550142'),
+    ('021 555 0142 / 082 555 0199', '+27215550142'),
+    ('+44 20 7946 0958', '+442079460958'),
+    ('555 0142', None),
+    ('', None),
+    (None, None),
+])
+def test_normalize_phone(raw, expected):
+    assert normalize_phone(raw) == expected
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('12 long st, cape town, wc, south africa', '12 Long Street, Cape Town, Western Cape'),
+    ('Cnr Main Rd & Oak Ave; Sea Point', 'Corner Main Road & Oak Avenue, Sea Point'),
+    ('St Georges Mall, Cape Town, Cape Town', 'St Georges Mall, Cape Town'),
+    ('', ''),
+])
+def test_canonicalize_address(raw, expected):
+    assert canonicalize_address(raw) == expected
+
+
+def test_duplicates_merge_into_the_most_complete_record():
+    records = [
+        {'name': 'Green Leaf Dispensary', 'address': '12 Long St, Cape Town', 'phone': '021 555 0142',
+         'social_media': 'https://www.instagram.com/greenleafct', 'url': 'https://example.com/a'},
+        {'name': 'Green Leaf Dispensary', 'address': '12 Long Street, Cape Town, 8001', 'phone': '',
+         'website': 'https://greenleaf.example.co.za', 'social_media': 'https://www.facebook.com/greenleafct',
+         'url': 'https://example.com/b'},
+        {'name': 'Blue Sky Cannabis Club', 'address': '40 Kloof Street, Gardens', 'phone': '021 555 0199',
+         'url': 'https://example.com/c'},
+    ]
+    pipeline = StorePipeline()
+    stores = pipeline.run(records)
+
+    assert [store.name for store in stores] == ['Green Leaf Dispensary', 'Blue Sky Cannabis Club']
+    merged = stores[0]
+    assert merged.phone == '+27215550142'
+    assert merged.website == 'https://greenleaf.example.co.za'
+    # Equally complete records keep the first one, with its empty fields filled from the other
+    assert merged.address == '12 Long Street, Cape Town'
+    assert merged.url == 'https://example.com/a'
+    assert merged.social_media == 'https://www.instagram.com/greenleafct, https://www.facebook.com/greenleafct'
+    assert pipeline.stats['duplicates'] == 1
+
+
+def test_different_street_numbers_are_not_merged():
+    records = [
+        {'name': 'Green Leaf Dispensary', 'address': '12 Long Street, Cape Town', 'url': 'https://example.com/a'},
+        {'name': 'Green Leaf Dispensary', 'address': '14 Long Street, Cape Town', 'url': 'https://example.com/b'},
+    ]
+    assert len(StorePipeline().run(records)) == 2
+
+
+def test_shared_url_always_merges():
+    records = [
+        {'name': 'Green Leaf', 'url': 'https://example.com/a'},
+        {'name': 'Something Else Entirely', 'phone': '021 555 0142', 'url': 'https://example.com/a'},
+    ]
+    stores = StorePipeline().run(records)
+    assert len(stores) == 1
+    assert stores[0].phone == '+27215550142'
+
+
+def test_normalize_result_files_rewrites_the_streamed_results(tmp_path):
+    base = str(tmp_path / 'stores')
+    sink = open_sinks(base, streaming_formats(['csv', 'json']), RECORD_FIELDS)
+    for store in ({'name': 'Green Leaf', 'phone': '021 555 0142', 'url': 'https://example.com/a'},
+                  {'name': 'Green Leaf', 'phone': '+27 21 555 0142', 'url': 'https://example.com/a'}):
+        sink.write(store)
+    sink.finalize()
+
+    stats = normalize_result_files(base, ['csv', 'json'], RECORD_FIELDS)
+    assert stats['duplicates'] == 1
+    with open(base + '.json', encoding='utf-8') as f:
+        assert [store['phone'] for store in json.load(f)] == ['+27215550142']
+    # The JSONL copy was only kept for the rewrite
+    assert not os.path.exists(base + '.jsonl')
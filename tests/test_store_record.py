@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from result_sinks import RecordSerializer
+from store_record import RECORD_FIELDS, StoreRecord
+
+STORE = {'name': 'Green Leaf', 'address': '12 Long Street', 'phone': '+27215550142',
+         'website': 'https://greenleaf.example.co.za', 'url': 'https://example.com/a'}
+
+
+def test_from_dict_fills_missing_fields_and_ignores_unknown_keys():
+    record = StoreRecord.from_dict(dict(STORE, rating='4.6'))
+    assert record.to_dict() == dict(STORE, social_media='', additional_info='')
+    assert list(record.keys()) == list(RECORD_FIELDS)
+
+
+def test_reads_like_a_dict():
+    record = StoreRecord.from_dict(STORE, url='https://example.com/b')
+    assert record['name'] == 'Green Leaf'
+    assert record.get('url') == 'https://example.com/b'
+    assert record.get('rating', 'none') == 'none'
+    assert dict(record) == record.to_dict()
+    with pytest.raises(KeyError):
+        record['rating']
+
+
+def test_equality_and_no_per_record_dict():
+    assert StoreRecord.from_dict(STORE) == StoreRecord.from_dict(dict(STORE))
+    assert StoreRecord.from_dict(STORE) != StoreRecord.from_dict(STORE, phone='')
+    assert not hasattr(StoreRecord.from_dict(STORE), '__dict__')
+
+
+def test_repeated_values_are_shared():
+    first = StoreRecord(website=''.join(['https://chain', '.example.co.za']))
+    second = StoreRecord(website=''.join(['https://chain.', 'example.co.za']))
+    assert first.website is second.website
+
+
+def test_serializer_matches_json_for_records_and_dicts():
+    serializer = RecordSerializer(RECORD_FIELDS)
+    record = StoreRecord.from_dict(dict(STORE, name='Café "Kush"'))
+    expected = {field: record[field] for field in RECORD_FIELDS}
+    assert serializer.to_json(record) == json.dumps(expected)
+    assert serializer.to_json(expected) == json.dumps(expected)
+    assert serializer.to_indented_json(record) == json.dumps([expected], indent=2)[2:-2]
+    assert serializer.values({'name': 'only'}) == ('only',) + (None,) * (len(RECORD_FIELDS) - 1)
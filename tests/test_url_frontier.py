@@ -0,0 +1,95 @@
+import pytest
+
+from url_frontier import BloomFilter, UrlFrontier
+
+
+@pytest.fixture
+def frontier(tmp_path):
+    frontier = UrlFrontier(str(tmp_path / 'frontier.db'), expected_urls=100)
+    yield frontier
+    frontier.close()
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    urls = [f'https://example.com/store-{i}' for i in range(1000)]
+    for url in urls:
+        bloom.add(url)
+    assert all(url in bloom for url in urls)
+
+
+def test_claim_only_hands_out_a_url_once(frontier):
+    assert frontier.add(['a', 'b']) == 2
+    assert frontier.add(['b', 'c']) == 1
+    assert frontier.claim('a')
+    assert not frontier.claim('a')
+    assert frontier.claim('new')
+    assert frontier.state('new') == 'in_flight'
+    assert frontier.pending() == ['b', 'c']
+
+    assert frontier.mark_done('a')
+    assert not frontier.mark_done('a')
+    assert not frontier.claim('a')
+
+
+def test_failed_urls_are_requeued_until_max_attempts(frontier):
+    frontier.add(['a', 'b'])
+    for url in ('a', 'b'):
+        frontier.claim(url)
+        frontier.mark_failed(url, 'timeout')
+    frontier.claim('b')
+    frontier.mark_failed('b', 'timeout')
+    assert not frontier.claim('a')
+
+    assert frontier.requeue_failed(max_attempts=2) == 1
+    assert frontier.state('a') == 'pending'
+    assert frontier.state('b') == 'failed'
+    assert frontier.claim('a')
+
+
+def test_in_flight_urls_are_requeued_on_reopen(tmp_path):
+    path = str(tmp_path / 'frontier.db')
+    frontier = UrlFrontier(path)
+    frontier.add(['a', 'b'])
+    frontier.claim('a')
+    frontier.mark_done('b')
+    frontier.close()
+
+    frontier = UrlFrontier(path)
+    assert frontier.counts() == {'pending': 1, 'in_flight': 0, 'done': 1, 'failed': 0}
+    assert 'a' in frontier and 'missing' not in frontier
+    frontier.close()
+
+
+def test_sync_done_matches_the_checkpoint(frontier):
+    frontier.add(['a', 'b', 'c'])
+    frontier.mark_done('a')
+    frontier.mark_done('b')
+    frontier.sync_done(['a', 'd'])
+    assert [frontier.state(url) for url in 'abcd'] == ['done', 'pending', 'pending', 'done']
+
+
+def test_scrape_all_stores_skips_urls_claimed_elsewhere(tmp_path, monkeypatch):
+    import cannabis_scraper
+    frontier_path = str(tmp_path / 'frontier.db')
+    fetched = []
+    monkeypatch.setattr(cannabis_scraper, 'CHECKPOINT_DIR', str(tmp_path / 'checkpoints'))
+    monkeypatch.setattr(cannabis_scraper, 'URL_FRONTIER_DB', frontier_path)
+    monkeypatch.setattr(cannabis_scraper, 'INCREMENTAL_CRAWL', False)
+    monkeypatch.setattr(cannabis_scraper, 'SCHEDULE_CRAWL', False)
+    monkeypatch.setattr(cannabis_scraper, 'get_store_links', lambda: ['https://example.com/a', 'https://example.com/b'])
+
+    def scrape_store(url):
+        fetched.append(url)
+        if url.endswith('/a'):
+            # Another process sharing the frontier takes b while a is being fetched
+            other = UrlFrontier(frontier_path)
+            other.claim('https://example.com/b')
+            other.close()
+        return {'name': url[-1], 'address': '', 'phone': ''}
+
+    monkeypatch.setattr(cannabis_scraper, 'scrape_store', scrape_store)
+    monkeypatch.setattr(cannabis_scraper, 'MAX_CONCURRENCY', 1)
+    stores = cannabis_scraper.scrape_all_stores()
+    assert fetched == ['https://example.com/a']
+    assert [store.name for store in stores] == ['a']
@@ -0,0 +1,228 @@
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+STATES = ('pending', 'in_flight', 'done', 'failed')
+
+
+class BloomFilter:
+    """In-memory Bloom filter over strings
+
+    Sized for capacity items at the given false positive rate; the k bit
+    positions come from double hashing a single blake2b digest.
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.001):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class UrlFrontier:
+    """Persistent per-URL crawl state: pending, in_flight, done or failed
+
+    Every URL is a row of an indexed SQLite table, so the state survives a
+    crash and a resumed crawl skips what is already done whatever order the
+    URLs are rediscovered in. A Bloom filter of all known URLs answers most
+    "never seen" lookups without touching the database. URLs left in_flight
+    by a crashed run go back to pending when the frontier is opened.
+    """
+
+    def __init__(self, path, expected_urls=100000, error_rate=0.001):
+        self.path = path
+        self.expected_urls = expected_urls
+        self.error_rate = error_rate
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS frontier ("
+            " url TEXT PRIMARY KEY,"
+            " state TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT,"
+            " added_at REAL,"
+            " updated_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS frontier_state ON frontier (state)")
+        requeued = self._conn.execute(
+            "UPDATE frontier SET state = 'pending' WHERE state = 'in_flight'"
+        ).rowcount
+        self._conn.commit()
+        if requeued:
+            logging.info(f"Requeued {requeued} URLs left in flight by the previous run")
+
+        known = self._conn.execute("SELECT COUNT(*) FROM frontier").fetchone()[0]
+        self._bloom = BloomFilter(max(expected_urls, 2 * known), error_rate)
+        for (url,) in self._conn.execute("SELECT url FROM frontier"):
+            self._bloom.add(url)
+
+    def _state(self, url):
+        if url not in self._bloom:
+            return None
+        row = self._conn.execute("SELECT state FROM frontier WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def state(self, url):
+        """Return the state of url, or None if it was never added"""
+        with self._lock:
+            return self._state(url)
+
+    def __contains__(self, url):
+        return self.state(url) is not None
+
+    def _insert(self, url, state, now):
+        self._conn.execute(
+            "INSERT INTO frontier (url, state, added_at, updated_at) VALUES (?, ?, ?, ?)",
+            (url, state, now, now)
+        )
+        self._bloom.add(url)
+
+    def add(self, urls):
+        """Add urls as pending, skipping known ones; returns how many were new"""
+        now = time.time()
+        added = 0
+        with self._lock:
+            for url in urls:
+                if self._state(url) is None:
+                    self._insert(url, 'pending', now)
+                    added += 1
+            self._conn.commit()
+        return added
+
+    def claim(self, url):
+        """Mark url in_flight if it is new or pending; False when it is done, failed or taken"""
+        now = time.time()
+        with self._lock:
+            state = self._state(url)
+            if state is None:
+                self._insert(url, 'in_flight', now)
+            elif state == 'pending':
+                self._conn.execute(
+                    "UPDATE frontier SET state = 'in_flight', updated_at = ? WHERE url = ?",
+                    (now, url)
+                )
+            else:
+                return False
+            self._conn.commit()
+        return True
+
+    def mark_done(self, url):
+        """Mark url done; returns False if it already was"""
+        now = time.time()
+        with self._lock:
+            state = self._state(url)
+            if state == 'done':
+                return False
+            if state is None:
+                self._insert(url, 'done', now)
+            else:
+                self._conn.execute(
+                    "UPDATE frontier SET state = 'done', error = NULL, updated_at = ? WHERE url = ?",
+                    (now, url)
+                )
+            self._conn.commit()
+        return True
+
+    def mark_failed(self, url, error=None):
+        now = time.time()
+        with self._lock:
+            if self._state(url) is None:
+                self._insert(url, 'failed', now)
+            self._conn.execute(
+                "UPDATE frontier SET state = 'failed', attempts = attempts + 1, error = ?, updated_at = ?"
+                " WHERE url = ?",
+                (str(error) if error is not None else None, now, url)
+            )
+            self._conn.commit()
+
+    def pending(self, limit=None):
+        """Return pending URLs in the order they were added"""
+        query = "SELECT url FROM frontier WHERE state = 'pending' ORDER BY rowid"
+        params = ()
+        if limit is not None:
+            query += " LIMIT ?"
+            params = (limit,)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(query, params)]
+
+    def requeue_failed(self, max_attempts=3):
+        """Put failed URLs with fewer than max_attempts attempts back to pending"""
+        with self._lock:
+            requeued = self._conn.execute(
+                "UPDATE frontier SET state = 'pending' WHERE state = 'failed' AND attempts < ?",
+                (max_attempts,)
+            ).rowcount
+            self._conn.commit()
+        return requeued
+
+    def sync_done(self, urls):
+        """Make exactly urls done, as recorded by a checkpoint
+
+        URLs marked done after the checkpoint's last commit were never saved,
+        so they go back to pending.
+        """
+        urls = set(urls)
+        now = time.time()
+        with self._lock:
+            done = [row[0] for row in self._conn.execute("SELECT url FROM frontier WHERE state = 'done'")]
+            lost = [url for url in done if url not in urls]
+            self._conn.executemany(
+                "UPDATE frontier SET state = 'pending', updated_at = ? WHERE url = ?",
+                [(now, url) for url in lost]
+            )
+            for url in urls:
+                if self._state(url) is None:
+                    self._insert(url, 'done', now)
+            self._conn.executemany(
+                "UPDATE frontier SET state = 'done', updated_at = ? WHERE url = ? AND state != 'done'",
+                [(now, url) for url in urls]
+            )
+            self._conn.commit()
+        if lost:
+            logging.info(f"Requeued {len(lost)} URLs done after the last checkpoint")
+
+    def reset(self):
+        """Forget every URL, for a crawl that starts from scratch"""
+        with self._lock:
+            self._conn.execute("DELETE FROM frontier")
+            self._conn.commit()
+            self._bloom = BloomFilter(self.expected_urls, self.error_rate)
+
+    def counts(self):
+        """Return {state: number of URLs} for every state"""
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM frontier GROUP BY state").fetchall()
+        counts = dict.fromkeys(STATES, 0)
+        counts.update(rows)
+        return counts
+
+    def log_stats(self):
+        counts = self.counts()
+        logging.info("URL frontier: " + ', '.join(f"{counts[state]} {state}" for state in STATES))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()